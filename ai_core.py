@@ -42,8 +42,10 @@ class AI_Analyzer:
             print(f"⚠️ [YOLO] 파일 없음: {self.model_path}")
             self.model = None
 
-    def predict(self, image):
+    def predict(self, image, out=None):
         """
+        out: 오버레이를 그릴 미리 할당된 배열 (image와 같은 크기, 버퍼 풀에서 빌린 것)
+             주어지면 새 배열을 만들지 않고 여기에 그리며, 검출이 없으면 원본을 그대로 돌려줍니다.
         Return:
           1. tag: 결과 태그 (모델 없으면 None)
           2. image: 박스나 글씨가 그려진 이미지
@@ -51,7 +53,11 @@ class AI_Analyzer:
         # [핵심 로직] 모델이 없을 때
         if self.model is None:
             # 1. 원본 복사
-            error_img = image.copy()
+            if out is not None:
+                np.copyto(out, image)
+                error_img = out
+            else:
+                error_img = image.copy()
             # 2. 이미지 중앙에 빨간색으로 에러 메시지 쓰기
             h, w = error_img.shape[:2]
             cv2.putText(error_img, "MODEL NOT FOUND", (int(w/4), int(h/2)), 
@@ -66,7 +72,10 @@ class AI_Analyzer:
             # 정상 추론 로직
             results = self.model(image, verbose=False, conf=0.8)
             result = results[0]
-            result_img = result.plot() # 박스 그려진 이미지
+            if out is not None:
+                result_img = self.draw_boxes(result, image, out)
+            else:
+                result_img = result.plot() # 박스 그려진 이미지
 
             tag = "OK"
 
@@ -74,4 +83,21 @@ class AI_Analyzer:
 
         except Exception as e:
             print(f"❌ [YOLO] 예측 에러: {e}")
-            return None, image # 에러 시에도 None 리턴
\ No newline at end of file
+            return None, image # 에러 시에도 None 리턴
+
+    @staticmethod
+    def draw_boxes(result, image, out):
+        """ 검출 박스를 out 배열에 직접 그림 (result.plot()은 내부에서 이미지를 복사하므로 사용 안 함) """
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return image  # 그릴 것이 없으면 복사도 안 함
+
+        np.copyto(out, image)
+        xyxy = boxes.xyxy.cpu().numpy().astype(int)
+        confs = boxes.conf.cpu().numpy()
+        classes = boxes.cls.cpu().numpy().astype(int)
+        for (x1, y1, x2, y2), conf, cls in zip(xyxy, confs, classes):
+            cv2.rectangle(out, (x1, y1), (x2, y2), (0, 0, 255), 2)
+            label = f"{result.names.get(cls, cls)} {conf:.2f}"
+            cv2.putText(out, label, (x1, max(y1 - 8, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        return out
\ No newline at end of file
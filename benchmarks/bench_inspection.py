@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import itertools
+
+import numpy as np
+import cv2
+
+# 저장소 루트에서 `python -m benchmarks.bench_inspection` 또는 `python benchmarks/bench_inspection.py`로 실행
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vali import config as cfg
+from vali.algo_core import NutInspector
+from vali.db_manager import DataManager
+from benchmarks.synthetic_nut import (render_nut, expected_shape_result, expected_hole_result, angle_error,
+                                      DEFECT_TYPES)
+
+# =========================================================
+# [검사 알고리즘 벤치마크]
+# 합성 너트(정답을 아는 이미지)로 vali 검사 단계별 소요 시간과 정확도를 잽니다.
+#   단계: load_and_calibrate -> analyze -> find_best_angle -> inspect -> save_result(DB INSERT)
+#   end_to_end = 위 단계 전체 (run_inspection.inspect_pair의 CV + DB 구간, AI 추론 제외)
+#
+# 사용 예:
+#   python -m benchmarks.bench_inspection                       # 기본 조합, results/에 JSON 저장
+#   python -m benchmarks.bench_inspection --sizes 1280x960 --rotations 0,30 --repeat 5
+#   python -m benchmarks.bench_inspection --baseline benchmarks/results/baseline.json
+#     -> 기준 결과 대비 단계별 p50이 --tolerance(기본 25%) 넘게 느려지거나
+#        판정 일치율이 떨어지면 종료 코드 1 (CI/배포 전 검사용)
+#
+# DB 저장은 임시 DB 파일에 합니다. (운영 data/factory.db는 건드리지 않음)
+# =========================================================
+
+STAGES = ("load_and_calibrate", "analyze", "find_best_angle", "inspect", "save_result", "end_to_end")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+NO_AI = {"found": False, "boxes": [], "conf": 0.0, "res": "OK"}
+
+
+def _parse_list(text, cast=float):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+def _parse_sizes(text):
+    sizes = []
+    for item in text.split(","):
+        w, h = item.lower().split("x")
+        sizes.append((int(w), int(h)))
+    return sizes
+
+
+def _parse_defects(text):
+    """ "none,bump:8,dent:3" -> [("none", 0), ("bump", 8.0), ("dent", 3.0)] """
+    defects = []
+    for item in text.split(","):
+        kind, _, size = item.partition(":")
+        if kind not in DEFECT_TYPES:
+            raise argparse.ArgumentTypeError(f"알 수 없는 불량 종류: {kind} ({', '.join(DEFECT_TYPES)})")
+        defects.append((kind, float(size) if size else 0.0))
+    return defects
+
+
+def _percentiles(values):
+    arr = np.asarray(values) * 1000
+    p50, p95 = np.percentile(arr, (50, 95))
+    return {"n": len(values), "mean_ms": round(float(arr.mean()), 3), "min_ms": round(float(arr.min()), 3),
+            "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3)}
+
+
+def run_case(inspector, db_mgr, work_dir, case, repeat, jpeg_quality):
+    """ 조합 1개: 이미지 생성 -> 파일 저장 -> 단계별 repeat회 측정 + 정답 비교 """
+    img, truth = render_nut(case["width"], case["height"], case["rotation"], case["hole_offset"],
+                            case["hole_direction"], case["defect"], case["noise"], case["seed"])
+    path = os.path.join(work_dir, f"case_{case['id']:04d}.jpg")
+    cv2.imwrite(path, img, [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality])
+
+    timings = {stage: [] for stage in STAGES}
+    res_cv = None
+    angle = None
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        t0 = t_start
+        img_calib = inspector.load_and_calibrate(path)
+        t1 = time.perf_counter()
+        data = inspector.analyze(img_calib)
+        t2 = time.perf_counter()
+        if data is None:
+            break
+        angle = inspector.find_best_angle(data)
+        t3 = time.perf_counter()
+        res_cv = inspector.inspect(data, angle)
+        res_cv["center"] = data["center"]
+        t4 = time.perf_counter()
+        db_mgr.save_result(res_cv, NO_AI, NO_AI, data["area"], path, "", time.strftime("%Y-%m-%d %H:%M:%S"))
+        t5 = time.perf_counter()
+        for stage, (a, b) in zip(STAGES, ((t0, t1), (t1, t2), (t2, t3), (t3, t4), (t4, t5), (t_start, t5))):
+            timings[stage].append(b - a)
+
+    result = {"case": case, "timings": timings}
+    if res_cv is None:
+        result.update({"detected": False, "shape_ok": False, "hole_ok": False})
+        return result
+
+    shape_expected = expected_shape_result(truth)
+    hole_expected = expected_hole_result(truth)
+    measured_offset = res_cv["hole"]["offset"] if res_cv["hole"]["found"] else None
+    result.update({
+        "detected": True,
+        "shape_expected": shape_expected,
+        "shape_measured": res_cv["shape"]["res"],
+        "shape_ok": shape_expected == res_cv["shape"]["res"],
+        "max_dist_px": float(res_cv["shape"]["max_dist"]),
+        "max_dist_err_px": abs(float(res_cv["shape"]["max_dist"]) - truth["defect_size"]),
+        "hole_expected": hole_expected,
+        "hole_measured": res_cv["hole"]["res"],
+        "hole_ok": hole_expected == res_cv["hole"]["res"],
+        "hole_offset_err_px": abs(measured_offset - truth["hole_offset"]) if measured_offset is not None else None,
+        "angle": float(angle),
+        "angle_err_deg": angle_error(angle, truth["rotation"]),
+    })
+    return result
+
+
+def summarize(cases):
+    timings = {stage: [t for c in cases for t in c["timings"][stage]] for stage in STAGES}
+    detected = [c for c in cases if c["detected"]]
+
+    def p95(values):
+        values = [v for v in values if v is not None]
+        return round(float(np.percentile(values, 95)), 3) if values else None
+
+    n = len(cases) or 1
+    return {
+        "stages": {stage: _percentiles(values) for stage, values in timings.items() if values},
+        "accuracy": {
+            "cases": len(cases),
+            "detected": len(detected) / n,
+            "shape_match": sum(c["shape_ok"] for c in cases) / n,
+            "hole_match": sum(c["hole_ok"] for c in cases) / n,
+            "max_dist_err_px_p95": p95([c["max_dist_err_px"] for c in detected]),
+            "hole_offset_err_px_p95": p95([c["hole_offset_err_px"] for c in detected]),
+            "angle_err_deg_p95": p95([c["angle_err_deg"] for c in detected]),
+        },
+        "mismatches": [
+            {"id": c["case"]["id"], "shape": [c.get("shape_expected"), c.get("shape_measured")],
+             "hole": [c.get("hole_expected"), c.get("hole_measured")]}
+            for c in cases if not (c["shape_ok"] and c["hole_ok"])
+        ],
+    }
+
+
+def compare(report, baseline, tolerance):
+    """ 기준 결과 대비 회귀 목록 (비어 있으면 통과) """
+    problems = []
+    for stage, cur in report["summary"]["stages"].items():
+        base = baseline["summary"]["stages"].get(stage)
+        if base and base["p50_ms"] > 0 and cur["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            problems.append(f"{stage}: p50 {base['p50_ms']:.2f}ms -> {cur['p50_ms']:.2f}ms "
+                            f"(+{(cur['p50_ms'] / base['p50_ms'] - 1) * 100:.0f}%)")
+    for key in ("detected", "shape_match", "hole_match"):
+        cur = report["summary"]["accuracy"][key]
+        base = baseline["summary"]["accuracy"].get(key)
+        if base is not None and cur < base:
+            problems.append(f"{key}: {base:.3f} -> {cur:.3f}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="vali 검사 알고리즘 벤치마크 (합성 너트)")
+    parser.add_argument("--sizes", type=_parse_sizes, default=_parse_sizes("640x480,1280x960"), help="해상도 목록 (예: 640x480,1280x960)")
+    parser.add_argument("--rotations", type=_parse_list, default=[0.0, 17.0, 45.0], help="회전 각도 목록(도)")
+    parser.add_argument("--noise", type=_parse_list, default=[0.0, 8.0], help="가우시안 노이즈 표준편차 목록")
+    parser.add_argument("--hole-offsets", type=_parse_list, default=[0.0, 3.0, 9.0], help="구멍 편심 목록(px)")
+    parser.add_argument("--defects", type=_parse_defects, default=_parse_defects("none,bump:9,dent:9"),
+                        help="형상 불량 목록 (none, bump:크기, dent:크기)")
+    parser.add_argument("--repeat", type=int, default=3, help="조합마다 반복 측정 횟수")
+    parser.add_argument("--jpeg-quality", type=int, default=95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="결과 JSON 경로 (기본: benchmarks/results/bench_<시각>.json)")
+    parser.add_argument("--baseline", help="비교할 기준 결과 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="p50 허용 증가율 (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="nut_bench_")
+    cfg.DB_FILE = os.path.join(work_dir, "bench.db")   # 운영 DB 대신 임시 DB
+    try:
+        inspector = NutInspector()
+        db_mgr = DataManager()
+
+        combos = itertools.product(args.sizes, args.rotations, args.noise, args.hole_offsets, args.defects)
+        cases = []
+        for i, ((w, h), rot, noise, offset, defect) in enumerate(combos):
+            case = {"id": i, "width": w, "height": h, "rotation": rot, "noise": noise, "hole_offset": offset,
+                    "hole_direction": (37.0 * i) % 360, "defect": defect, "seed": args.seed + i}
+            cases.append(run_case(inspector, db_mgr, work_dir, case, args.repeat, args.jpeg_quality))
+            print(f"\r⏱️ [Bench] {i + 1}개 조합 측정 중...", end="", flush=True)
+        print()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+            "config": {"CONTOUR_RESAMPLE_N": cfg.CONTOUR_RESAMPLE_N, "APPROX_EPSILON": cfg.APPROX_EPSILON,
+                       "LIMIT_WARNING": cfg.LIMIT_WARNING, "LIMIT_FAIL": cfg.LIMIT_FAIL, "TOL_HOLE": cfg.TOL_HOLE},
+        },
+        "summary": summarize(cases),
+        "cases": [{k: v for k, v in c.items() if k != "timings"} | {"p50_ms": {
+            stage: round(float(np.median(values)) * 1000, 3) for stage, values in c["timings"].items() if values}}
+            for c in cases],
+    }
+
+    out = args.out or os.path.join(RESULTS_DIR, f"bench_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    summary = report["summary"]
+    print(f"\n{'단계':<20}{'p50(ms)':>10}{'p95(ms)':>10}{'mean(ms)':>10}")
+    for stage, s in summary["stages"].items():
+        print(f"{stage:<20}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['mean_ms']:>10.2f}")
+    acc = summary["accuracy"]
+    print(f"\n🎯 [Bench] 판정 일치율: 형상 {acc['shape_match'] * 100:.1f}%, 구멍 {acc['hole_match'] * 100:.1f}% "
+          f"(조합 {acc['cases']}개, 검출 {acc['detected'] * 100:.1f}%)")
+    print(f"   편차 오차 p95 {acc['max_dist_err_px_p95']}px, 편심 오차 p95 {acc['hole_offset_err_px_p95']}px, "
+          f"각도 오차 p95 {acc['angle_err_deg_p95']}°")
+    print(f"💾 [Bench] 결과 저장: {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.tolerance)
+        if problems:
+            print("❌ [Bench] 기준 대비 회귀:")
+            for p in problems:
+                print(f"   - {p}")
+            return 1
+        print("✅ [Bench] 기준 대비 회귀 없음")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,490 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import datetime
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+import cv2
+import websockets
+
+# 저장소 루트에서 `python -m benchmarks.line_simulator` 또는 `python benchmarks/line_simulator.py`로 실행
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_protocol import pack_frame
+from stations import StationRegistry
+from benchmarks.synthetic_nut import render_nut, BACKGROUND
+from benchmarks.load_ws import start_server, _free_port, _get_json
+
+# =========================================================
+# [라인 하드웨어 시뮬레이터] 실제 라인 없이 검사 사이클 처리량을 측정합니다.
+# - 제품 투입: 명령 토픽(factory/command)으로 CHECK 발행
+# - 셔터: 셔터 토픽(factory/shutter/command)의 UP/DOWN을 받아 기계 동작 시간(+지터) 후 UP_DONE/DOWN_DONE 발행
+#         동작 중 + 정지 후 settle 시간 동안은 카메라 영상이 흔들림 (서버의 안정 프레임 감지가 실제처럼 기다림)
+# - 카메라: 스테이션별 상부/하부 카메라 소켓(/ws/source/{i})으로 현재 제품의 합성 이미지를 송출
+#           (제품마다 확률적으로 형상/구멍 불량 주입)
+# - 결과: 시간당 처리 수, 사이클 시간 분포, 잃어버린 검사(거부/촬영·계산 실패/멈춤) 수
+#
+# 투입 방식:
+#   --feed closed : 라인이 비면(서버가 하부 촬영 후 셔터 UP 명령) --feed-delay 뒤 다음 제품 (최대 처리량)
+#   --feed open   : --interval 초마다 투입 (--poisson 이면 지수분포 간격) -> 밀리면 거부/유실이 보임
+#
+# 사용 예:
+#   python -m benchmarks.line_simulator --embedded-broker --parts 50
+#   python -m benchmarks.line_simulator --feed open --interval 1.2 --duration 120 --up-delay 0.5 --jitter 0.1
+#   python -m benchmarks.line_simulator --broker localhost:1883 --url http://127.0.0.1:8000   # 이미 떠 있는 서버/브로커
+# =========================================================
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SAME_POSITION_DELAY = 0.02   # 이미 그 위치에 있는 셔터에 같은 명령이 오면 바로 완료
+VIBRATION_FRAMES = 6
+STATUS_POLL_INTERVAL = 1.0
+CHECK_ACCEPT_GRACE = 1.0     # 마지막 CHECK에 서버가 셔터 명령을 보내지 않으면 거부된 것으로 봄
+
+
+def _pct(values):
+    if not values:
+        return None
+    arr = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(arr, (50, 95, 99))
+    return {"n": len(values), "p50_ms": round(float(p50), 1), "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1), "max_ms": round(float(arr.max()), 1)}
+
+
+def _encode(img, quality=90):
+    return cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])[1].tobytes()
+
+
+def render_part_frames(width, height, part, rng):
+    """ 제품 1개 -> {"stable": JPEG, "shaking": [JPEG...]} (셔터 동작 중 흔들림 = 이동 + 밝기 변화) """
+    img, _ = render_nut(width, height, rotation=part["rotation"], hole_offset=part["hole_offset"],
+                        hole_direction=part["hole_direction"], defect=part["defect"], noise=2.0, seed=part["no"])
+    shaking = []
+    for _ in range(VIBRATION_FRAMES):
+        dx, dy = rng.integers(-12, 13, size=2)
+        m = np.float32([[1, 0, dx], [0, 1, dy]])
+        moved = cv2.warpAffine(img, m, (width, height), borderValue=(BACKGROUND,) * 3)
+        moved = cv2.convertScaleAbs(moved, alpha=1.0, beta=float(rng.integers(-20, 21)))
+        shaking.append(_encode(moved))
+    return {"stable": _encode(img), "shaking": shaking}
+
+
+class SimPart:
+    def __init__(self, no, station_id, args, rng):
+        self.no = no
+        self.station_id = station_id
+        defect = ("bump", 9.0) if rng.random() < args.defect_rate else ("none", 0.0)
+        hole_offset = 9.0 if rng.random() < args.hole_fail_rate else float(rng.uniform(0, 2))
+        self.spec = {"no": no, "rotation": float(rng.uniform(0, 60)), "hole_offset": hole_offset,
+                     "hole_direction": float(rng.uniform(0, 360)), "defect": defect}
+        self.expected = "NG" if defect[0] != "none" or hole_offset > 5.0 else "OK"
+        self.check_at = None
+        self.started_at = None       # 서버가 첫 UP 명령을 보낸 시각 (CHECK 수락)
+        self.down_cmd_at = None
+        self.release_cmd_at = None   # 하부 촬영 후 서버의 UP 명령
+        self.released_at = None      # 그 UP 동작 완료 = 라인이 다음 제품을 받을 수 있음
+        self.lost = None             # "stalled" (제한 시간 안에 사이클이 끝나지 않음)
+        self.frames = None
+
+
+class ShutterSim:
+    """ 스테이션 1개: 셔터 하드웨어 + 카메라 2대 + 제품 투입 """
+    def __init__(self, station, sim):
+        self.station = station
+        self.sim = sim
+        self.args = sim.args
+        self.position = "UP"
+        self.commands = asyncio.Queue()
+        self.shake_until = 0.0
+        self.empty = None             # 제품 없는 빈 화면
+        self.part = None              # 가장 최근에 투입한 제품
+        self.active = None            # 서버가 검사 중인 제품 (CHECK 수락 ~ 해제 UP 명령)
+        self.parts = []
+        self.released = asyncio.Event()
+
+    # --- MQTT (paho 스레드 -> 이벤트 루프) ---
+    def on_command(self, payload):
+        """ 서버의 셔터 명령을 검사 중인 제품의 단계에 맞춰 기록하고 셔터 동작 큐에 넣음 """
+        now = time.monotonic()
+        releasing = None
+        if self.active is None:
+            # 대기 중 첫 UP = 가장 최근 CHECK를 서버가 수락함
+            if payload == "UP" and self.part is not None and self.part.started_at is None and self.part.lost is None:
+                self.part.started_at = now
+                self.active = self.part
+        elif payload == "DOWN" and self.active.down_cmd_at is None:
+            self.active.down_cmd_at = now
+        elif payload == "UP" and self.active.down_cmd_at is not None:
+            releasing, self.active = self.active, None
+            releasing.release_cmd_at = now
+        self.commands.put_nowait((payload, releasing))
+
+    def give_up(self, part):
+        """ 사이클이 멈춘 제품 (서버가 촬영 실패로 UP 명령 없이 대기 상태로 돌아간 경우 등) """
+        part.lost = "stalled"
+        if self.active is part:
+            self.active = None
+        print(f"⚠️ [Sim {self.station.station_id}] 제품 #{part.no} {self.args.cycle_timeout}s 안에 사이클 미완료")
+
+    def _motion_time(self, base):
+        return max(0.0, random.gauss(base, self.args.jitter))
+
+    async def shutter_loop(self):
+        """ 명령을 순서대로 실행 (동작 중 들어온 명령은 대기) """
+        while True:
+            command, releasing = await self.commands.get()
+            if command not in ("UP", "DOWN"):
+                continue
+            if command == self.position:
+                await asyncio.sleep(SAME_POSITION_DELAY)
+            else:
+                delay = self._motion_time(self.args.up_delay if command == "UP" else self.args.down_delay)
+                self.shake_until = float("inf")
+                await asyncio.sleep(delay)
+                self.position = command
+            self.shake_until = time.monotonic() + self.args.settle
+            self.sim.publish(self.station.command_topic, f"{command}_DONE")
+            if releasing is not None:
+                releasing.released_at = time.monotonic()
+                self.released.set()
+
+    async def camera_loop(self, camera):
+        interval = 1.0 / self.args.fps
+        url = f"{self.sim.ws_url}/ws/source/{camera.index}"
+        async with websockets.connect(url, max_size=None, ping_interval=None) as ws:
+            seq = 0
+            next_at = time.monotonic()
+            while not self.sim.stopping:
+                now = time.monotonic()
+                if next_at > now:
+                    await asyncio.sleep(next_at - now)
+                next_at = max(next_at + interval, time.monotonic() - interval)
+                part = self.active or self.part
+                frames = part.frames if part is not None else None
+                if frames is None:
+                    data = self.empty
+                elif time.monotonic() < self.shake_until:
+                    data = frames["shaking"][seq % VIBRATION_FRAMES]
+                else:
+                    data = frames["stable"]
+                seq += 1
+                await ws.send(pack_frame(data, seq, time.monotonic(), self.args.width, self.args.height))
+
+    async def feed_loop(self, rng, deadline, max_parts):
+        """ 제품 투입 (closed: 라인이 비면 다음 제품 / open: 일정 간격) """
+        next_arrival = time.monotonic()
+        while len(self.parts) < max_parts and time.monotonic() < deadline and not self.sim.stopping:
+            if self.args.feed == "open":
+                await asyncio.sleep(max(0.0, next_arrival - time.monotonic()))
+                gap = rng.exponential(self.args.interval) if self.args.poisson else self.args.interval
+                next_arrival += gap
+
+            part = SimPart(len(self.parts) + 1, self.station.station_id, self.args, rng)
+            part.frames = await asyncio.to_thread(render_part_frames, self.args.width, self.args.height, part.spec, rng)
+            active = self.active
+            if active is not None and time.monotonic() - active.started_at > self.args.cycle_timeout:
+                self.give_up(active)
+            self.released.clear()
+            self.part = part
+            self.parts.append(part)
+            part.check_at = time.monotonic()
+            self.sim.publish(self.station.command_topic, "CHECK")
+
+            if self.args.feed == "closed":
+                try:
+                    await asyncio.wait_for(self.released.wait(), timeout=self.args.cycle_timeout)
+                except asyncio.TimeoutError:
+                    self.give_up(part)
+                await asyncio.sleep(self.args.feed_delay)
+
+        # 검사 중인 마지막 제품의 사이클이 끝날 때까지 대기
+        waited = time.monotonic()
+        while time.monotonic() - waited < self.args.cycle_timeout:
+            last_answered = (self.part is None or self.part.started_at is not None
+                             or time.monotonic() - self.part.check_at > CHECK_ACCEPT_GRACE)
+            if last_answered and all(p.released_at is not None or p.lost
+                                     for p in self.parts if p.started_at is not None):
+                break
+            await asyncio.sleep(0.1)
+        for part in self.parts:
+            if part.started_at is not None and part.released_at is None and part.lost is None:
+                self.give_up(part)
+
+
+class LineSimulator:
+    def __init__(self, args, base_url, registry):
+        self.args = args
+        self.base_url = base_url
+        self.ws_url = base_url.replace("http", "ws", 1)
+        self.loop = None
+        self.client = None
+        self.stopping = False
+        self.stations = {s.command_topic: ShutterSim(s, self) for s in registry}
+        self.by_shutter = {sim.station.shutter_topic: sim for sim in self.stations.values()}
+        self.results = {}   # (스테이션, 서버 part_id) -> 검사 결과
+
+    # --- MQTT ---
+    def connect_mqtt(self, host, port):
+        import paho.mqtt.client as mqtt
+        self.client = mqtt.Client(client_id=f"line_sim_{os.getpid()}")
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.connect(host, port, 60)
+        self.client.loop_start()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        client.subscribe([(topic, 1) for topic in self.by_shutter])
+
+    def _on_message(self, client, userdata, msg):
+        sim = self.by_shutter.get(msg.topic)
+        if sim is not None:
+            self.loop.call_soon_threadsafe(sim.on_command, msg.payload.decode().upper())
+
+    def publish(self, topic, payload):
+        self.client.publish(topic, payload, qos=1)
+
+    # --- 서버 결과 수집 ---
+    def _poll_status(self):
+        try:
+            for station in _get_json(f"{self.base_url}/api/inspection/status"):
+                for job in station["recent"]:
+                    self.results[(station["station_id"], job["part_id"])] = job
+        except Exception as e:
+            print(f"⚠️ [Sim] 검사 상태 조회 실패: {e}")
+
+    def _metric_totals(self):
+        """ /metrics -> {(이름, 라벨 문자열): 값} (검사 결과/거부 카운터만) """
+        totals = {}
+        try:
+            with urllib.request.urlopen(f"{self.base_url}/metrics", timeout=10) as resp:
+                text = resp.read().decode("utf-8")
+        except Exception:
+            return totals
+        for m in re.finditer(r"^(inspection_results_total|inspection_rejected_total)\{([^}]*)\} (\S+)$", text, re.M):
+            totals[(m.group(1), m.group(2))] = float(m.group(3))
+        return totals
+
+    async def poll_loop(self):
+        while not self.stopping:
+            await asyncio.to_thread(self._poll_status)
+            await asyncio.sleep(STATUS_POLL_INTERVAL)
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        host, _, port = self.args.broker.partition(":")
+        self.connect_mqtt(host, int(port or 1883))
+
+        rng = np.random.default_rng(self.args.seed)
+        random.seed(self.args.seed)
+        tasks = []
+        for sim in self.stations.values():
+            sim.empty = _encode(np.full((self.args.height, self.args.width, 3), BACKGROUND, np.uint8))
+            tasks.append(asyncio.create_task(sim.shutter_loop()))
+            for camera in sim.station.cameras.values():
+                tasks.append(asyncio.create_task(sim.camera_loop(camera)))
+        await asyncio.sleep(1.0)   # 카메라 송출/MQTT 구독이 먼저 붙도록
+
+        before = await asyncio.to_thread(self._metric_totals)
+        poller = asyncio.create_task(self.poll_loop())
+        started = time.monotonic()
+        deadline = started + self.args.duration if self.args.duration else float("inf")
+        max_parts = self.args.parts if self.args.parts else 10**9
+        await asyncio.gather(*(sim.feed_loop(rng, deadline, max_parts) for sim in self.stations.values()))
+        fed_until = time.monotonic()
+
+        # 계산 중인 제품 결과 대기
+        expected = sum(1 for sim in self.stations.values() for p in sim.parts if p.started_at is not None)
+        drain_deadline = time.monotonic() + self.args.drain
+        while time.monotonic() < drain_deadline:
+            await asyncio.to_thread(self._poll_status)
+            if len(self.results) >= expected:
+                break
+            await asyncio.sleep(0.5)
+        finished = time.monotonic()
+        after = await asyncio.to_thread(self._metric_totals)
+
+        self.stopping = True
+        poller.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, poller, return_exceptions=True)
+        self.client.loop_stop()
+        self.client.disconnect()
+        return await asyncio.to_thread(self.report, started, fed_until, finished, before, after)
+
+    def _trace_stages(self, measure_id):
+        try:
+            spans = _get_json(f"{self.base_url}/api/logs/{measure_id}/trace")["spans"]
+        except Exception:
+            return None
+        stages = {}
+        stack = list(spans)
+        while stack:
+            node = stack.pop()
+            stages[node["name"]] = node["duration_ms"] / 1000
+            stack.extend(node["children"])
+        return stages
+
+    def report(self, started, fed_until, finished, before, after):
+        parts = [p for sim in self.stations.values() for p in sim.parts]
+        accepted = [p for p in parts if p.started_at is not None]
+        released = [p for p in parts if p.released_at is not None]
+        jobs = list(self.results.values())
+        verdicts = [j for j in jobs if j.get("verdict")]
+        errors = [j for j in jobs if not j.get("verdict")]
+
+        # 서버 카운터 증가분 (거부된 CHECK, 알고리즘 오류)
+        delta = defaultdict(float)
+        for (name, labels), value in after.items():
+            result = re.search(r'result="(\w+)"', labels)
+            delta[result.group(1) if result else name] += value - before.get((name, labels), 0.0)
+
+        stages = defaultdict(list)
+        for job in verdicts:
+            traced = self._trace_stages(job["verdict"]["measure_id"])
+            for name in ("inspection", "mechanical", "queue", "compute"):
+                if traced and name in traced:
+                    stages[name].append(traced[name])
+
+        # 수락 순서 = 서버 part_id 순서 -> 주입한 불량과 판정 비교
+        mismatched = 0
+        for sim in self.stations.values():
+            done = [self.results[key] for key in sorted(k for k in self.results if k[0] == sim.station.station_id)]
+            mine = [p for p in sim.parts if p.release_cmd_at is not None]
+            for part, job in zip(mine, done):
+                if job.get("verdict") and job["verdict"]["result"] != part.expected:
+                    mismatched += 1
+
+        elapsed = (finished if verdicts else fed_until) - started
+        ng_expected = sum(1 for p in accepted if p.expected == "NG")
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "parts": {
+                "fed": len(parts),
+                "accepted": len(accepted),
+                "mechanical_done": len(released),
+                "completed": len(verdicts),
+                "ok": sum(1 for j in verdicts if j["verdict"]["result"] == "OK"),
+                "ng": sum(1 for j in verdicts if j["verdict"]["result"] == "NG"),
+                "ng_expected": ng_expected,
+                "verdict_mismatch": mismatched,
+            },
+            "lost": {
+                "total": len(parts) - len(verdicts),
+                "rejected": int(delta.get("inspection_rejected_total", 0)),
+                "not_accepted": len(parts) - len(accepted),
+                "stalled": sum(1 for p in parts if p.lost == "stalled"),
+                "algorithm_error": int(delta.get("ERROR", 0)) or len(errors),
+                "accepted_without_result": max(0, len(released) - len(jobs)),
+            },
+            "parts_per_hour": round(len(verdicts) / elapsed * 3600, 1) if elapsed > 0 else None,
+            "cycle": {
+                # 시뮬레이터 기준: CHECK ~ 하부 촬영 후 셔터 UP 완료 (라인이 다음 제품을 받을 수 있게 된 시점)
+                "line_cycle": _pct([p.released_at - p.check_at for p in released]),
+                "check_to_release_command": _pct([p.release_cmd_at - p.check_at for p in parts if p.release_cmd_at]),
+                "check_to_first_command": _pct([p.started_at - p.check_at for p in accepted]),
+                # 서버 타임라인 기준 (/api/logs/{mid}/trace): CHECK ~ 판정 저장
+                "server_total": _pct(stages["inspection"]),
+                "server_mechanical": _pct(stages["mechanical"]),
+                "server_queue": _pct(stages["queue"]),
+                "server_compute": _pct(stages["compute"]),
+            },
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="검사 라인 하드웨어 시뮬레이터 (셔터 + 카메라 + 제품 투입)")
+    parser.add_argument("--broker", default="localhost:1883", help="MQTT 브로커 host:port")
+    parser.add_argument("--embedded-broker", action="store_true", help="테스트용 내장 브로커 사용 (mosquitto 불필요)")
+    parser.add_argument("--url", help="외부 서버 주소 (없으면 같은 프로세스에서 서버 실행)")
+    parser.add_argument("--parts", type=int, default=30, help="스테이션별 투입 제품 수 (0 = --duration까지)")
+    parser.add_argument("--duration", type=float, default=0, help="투입 시간 제한(초, 0 = 제한 없음)")
+    parser.add_argument("--feed", choices=("closed", "open"), default="closed")
+    parser.add_argument("--feed-delay", type=float, default=0.2, help="closed: 라인 해제 ~ 다음 제품 CHECK(초)")
+    parser.add_argument("--interval", type=float, default=2.0, help="open: 투입 간격(초)")
+    parser.add_argument("--poisson", action="store_true", help="open: 지수분포 투입 간격")
+    parser.add_argument("--up-delay", type=float, default=0.4, help="셔터 UP 동작 시간(초)")
+    parser.add_argument("--down-delay", type=float, default=0.4, help="셔터 DOWN 동작 시간(초)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="동작 시간 표준편차(초)")
+    parser.add_argument("--settle", type=float, default=0.1, help="동작 완료 후 영상 흔들림 지속 시간(초)")
+    parser.add_argument("--fps", type=float, default=30.0, help="카메라 송출 fps")
+    parser.add_argument("--size", default="640x480", help="카메라 해상도")
+    parser.add_argument("--defect-rate", type=float, default=0.2, help="형상 불량 제품 비율")
+    parser.add_argument("--hole-fail-rate", type=float, default=0.1, help="구멍 편심 불량 제품 비율")
+    parser.add_argument("--cycle-timeout", type=float, default=10.0, help="사이클 멈춤 판정 시간(초)")
+    parser.add_argument("--drain", type=float, default=15.0, help="투입 종료 후 계산 결과 대기 최대 시간(초)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="결과 JSON 경로 (기본: benchmarks/results/line_<시각>.json)")
+    args = parser.parse_args(argv)
+    args.width, args.height = (int(v) for v in args.size.lower().split("x"))
+    if not args.parts and not args.duration:
+        parser.error("--parts 또는 --duration 중 하나는 0보다 커야 합니다.")
+
+    async def run():
+        broker = None
+        if args.embedded_broker:
+            from benchmarks.mini_broker import MiniBroker
+            host, _, port = args.broker.partition(":")
+            if not args.url and args.broker == parser.get_default("broker"):
+                port = str(_free_port())   # 프로세스 내 서버와 함께 쓸 때는 빈 포트 사용
+            args.broker = f"{host or '127.0.0.1'}:{port or 1883}"
+            broker = await MiniBroker().start("127.0.0.1" if host in ("", "localhost") else host, int(port or 1883))
+
+        server = None
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            host, _, port = args.broker.partition(":")
+            os.environ["MQTT_BROKER"] = host
+            os.environ["MQTT_PORT"] = port or "1883"
+            base_url, server = await asyncio.to_thread(start_server, 2)
+        registry = StationRegistry.from_config()
+
+        print(f"🏭 [Sim] 브로커 {args.broker}, 서버 {base_url}, 스테이션 {len(list(registry))}개, 투입 {args.feed}")
+        try:
+            return await LineSimulator(args, base_url, registry).run()
+        finally:
+            if server is not None:
+                server.should_exit = True
+            if broker is not None:
+                await broker.close()
+
+    result = asyncio.run(run())
+    report = {
+        "meta": {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out",)},
+        },
+        **result,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"line_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    parts, lost = result["parts"], result["lost"]
+    print(f"\n📦 [Sim] 투입 {parts['fed']} / 수락 {parts['accepted']} / 판정 {parts['completed']} "
+          f"(OK {parts['ok']}, NG {parts['ng']}, 불량 주입 {parts['ng_expected']}, 판정 불일치 {parts['verdict_mismatch']})")
+    print(f"🚀 [Sim] 처리량 {result['parts_per_hour']} 개/시간 ({result['elapsed_s']}s)")
+    print(f"❌ [Sim] 유실 {lost['total']} (거부 {lost['rejected']}, 미수락 {lost['not_accepted']}, "
+          f"멈춤 {lost['stalled']}, 계산 실패 {lost['algorithm_error']})")
+    print(f"\n{'구간':<24}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'n':>6}")
+    for name, stats in result["cycle"].items():
+        if stats:
+            print(f"{name:<24}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['n']:>6}")
+    print(f"💾 [Sim] 결과 저장: {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,402 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import datetime
+import tempfile
+import threading
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+import cv2
+
+# 저장소 루트에서 `python -m benchmarks.load_ws` 또는 `python benchmarks/load_ws.py`로 실행
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_protocol import pack_frame
+from benchmarks.synthetic_nut import render_nut
+
+# =========================================================
+# [웹소켓 부하 테스트] /ws/source/{i} 송출기 K개 + /api/view/{i} 시청자 M명
+# - 기본은 같은 프로세스 안에서 서버(uvicorn)를 띄워 로컬에서만 돌립니다. (--url 로 외부 서버 지정 가능)
+# - 송출 프레임 좌상단에 8비트 표식(+반전 8비트 검증)을 그려 두고,
+#   시청자가 받은 JPEG에서 표식을 읽어 '송출 직전 ~ 시청자 수신' 지연을 클라이언트 쪽에서 잽니다.
+#   (AI 오버레이 등으로 표식이 가려진 프레임은 unmarked로 세고 지연 계산에서 뺌)
+# - 서버 CPU/메모리: /proc 기준 (프로세스 내 서버면 부하 생성 스레드의 CPU를 빼고 계산, Linux 전용)
+#
+# 사용 예:
+#   python -m benchmarks.load_ws --sources 2 --viewers 8 --fps 30 --size 1280x960 --duration 20
+#   python -m benchmarks.load_ws --sources 4 --viewers 16 --tier low --out load.json
+#   python -m benchmarks.load_ws --url http://127.0.0.1:8000 --server-pid 1234
+# =========================================================
+
+MARK_BITS = 8
+MARK_CYCLE = 1 << MARK_BITS      # 표식 값은 seq % 256 (30fps 기준 8.5초마다 한 바퀴)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# --- 표식 (2줄 x 8칸: 윗줄 = 값 비트, 아랫줄 = 반전 비트) ---
+def _mark_block(width):
+    return max(8, width // 24)
+
+
+def draw_marker(img, value):
+    b = _mark_block(img.shape[1])
+    for i in range(MARK_BITS):
+        bit = (value >> i) & 1
+        img[0:b, i * b:(i + 1) * b] = 255 if bit else 0
+        img[b:2 * b, i * b:(i + 1) * b] = 0 if bit else 255
+
+
+def read_marker(gray, source_width):
+    """ 시청자가 받은 프레임(흑백) -> 표식 값 (검증 실패 시 None) """
+    scale = gray.shape[1] / source_width
+    b = _mark_block(source_width) * scale
+    if b < 2:
+        return None
+    value = 0
+    for i in range(MARK_BITS):
+        cx = int((i + 0.5) * b)
+        top = gray[int(0.5 * b), cx]
+        bottom = gray[int(1.5 * b), cx]
+        if abs(int(top) - int(bottom)) < 64:
+            return None
+        if top > bottom:
+            value |= 1 << i
+    return value
+
+
+def make_frames(width, height, quality):
+    """ 표식 0~255가 그려진 JPEG 256장 (송출 중 인코딩 비용을 없애기 위해 미리 만듦) """
+    base, _ = render_nut(width, height, rotation=17.0)
+    frames = []
+    for value in range(MARK_CYCLE):
+        img = base.copy()
+        draw_marker(img, value)
+        _, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        frames.append(buf.tobytes())
+    return frames
+
+
+# --- 서버 자원 사용량 (/proc) ---
+def _proc_cpu_seconds(path):
+    try:
+        with open(path) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLK_TCK   # utime + stime
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _proc_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class ResourceSampler:
+    """ 서버 CPU 시간 / RSS 샘플링 (프로세스 내 서버면 부하 생성 스레드 CPU를 뺌) """
+    def __init__(self, pid, exclude_tid=None):
+        self.pid = pid
+        self.exclude_tid = exclude_tid
+        self.rss = []
+
+    def cpu_seconds(self):
+        total = _proc_cpu_seconds(f"/proc/{self.pid}/stat")
+        if total is None:
+            return None
+        if self.exclude_tid is not None:
+            client = _proc_cpu_seconds(f"/proc/{self.pid}/task/{self.exclude_tid}/stat")
+            total -= client or 0.0
+        return total
+
+    def sample(self):
+        rss = _proc_rss_mb(self.pid)
+        if rss is not None:
+            self.rss.append(rss)
+
+
+# --- 프로세스 내 서버 ---
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _station_config(sources):
+    """ 송출기 K개에 맞춰 라인 설정 파일 생성 (라인당 카메라 2대) """
+    configs = []
+    for n in range((sources + 1) // 2):
+        configs.append({
+            "station_id": f"load{n + 1}", "top_camera": 2 * n + 1, "bottom_camera": 2 * n + 2,
+            "command_topic": f"loadtest/line{n + 1}/command", "shutter_topic": f"loadtest/line{n + 1}/shutter",
+        })
+    fd, path = tempfile.mkstemp(prefix="load_stations_", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(configs, f)
+    return path
+
+
+def start_server(sources):
+    """ 같은 프로세스에서 uvicorn 실행 (별도 스레드) -> (base_url, server) """
+    if sources > 2 and "STATION_CONFIG" not in os.environ:
+        os.environ["STATION_CONFIG"] = _station_config(sources)
+    import uvicorn
+    import main as server_app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(server_app.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    deadline = time.monotonic() + 60
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("서버가 60초 안에 시작되지 않았습니다.")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+
+def _get_json(url):
+    with urllib.request.urlopen(url, timeout=10) as resp:
+        return json.loads(resp.read())
+
+
+# --- 부하 생성 ---
+class LoadRun:
+    def __init__(self, args, base_url, frames):
+        self.args = args
+        self.base_url = base_url
+        self.ws_url = base_url.replace("http", "ws", 1)
+        self.frames = frames
+        self.cameras = list(range(1, args.sources + 1))
+        self.sent_at = {cam: [0.0] * MARK_CYCLE for cam in self.cameras}
+        self.sent = defaultdict(int)
+        self.late = defaultdict(int)
+        self.received = defaultdict(int)
+        self.unmarked = defaultdict(int)
+        self.latency = defaultdict(list)
+        self.measuring = False
+        self.stopping = False
+
+    async def source(self, cam):
+        import websockets
+        interval = 1.0 / self.args.fps
+        async with websockets.connect(f"{self.ws_url}/ws/source/{cam}", max_size=None, ping_interval=None) as ws:
+            seq = 0
+            next_at = time.monotonic()
+            while not self.stopping:
+                now = time.monotonic()
+                if next_at > now:
+                    await asyncio.sleep(next_at - now)
+                elif now - next_at > interval:
+                    # 서버가 못 받아줘서 송출 일정보다 한 프레임 이상 밀림 -> 일정 재설정
+                    if self.measuring:
+                        self.late[cam] += 1
+                    next_at = now
+                next_at += interval
+
+                seq += 1
+                value = seq % MARK_CYCLE
+                captured = time.monotonic()
+                self.sent_at[cam][value] = captured
+                await ws.send(pack_frame(self.frames[value], seq, captured, self.args.width, self.args.height))
+                if self.measuring:
+                    self.sent[cam] += 1
+
+    async def viewer(self, vid, cam):
+        import websockets
+        query = f"tier={self.args.tier}&adaptive={int(self.args.adaptive)}"
+        async with websockets.connect(f"{self.ws_url}/api/view/{cam}?{query}", max_size=None, ping_interval=None) as ws:
+            while not self.stopping:
+                try:
+                    data = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                arrived = time.monotonic()
+                if not self.measuring:
+                    continue
+                self.received[vid] += 1
+                gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+                value = read_marker(gray, self.args.width) if gray is not None else None
+                if value is None:
+                    self.unmarked[vid] += 1
+                    continue
+                self.latency[vid].append(arrived - self.sent_at[cam][value])
+
+    async def run(self, sampler):
+        tasks = [asyncio.create_task(self.source(cam)) for cam in self.cameras]
+        await asyncio.sleep(0.5)   # 송출이 먼저 붙도록
+        viewers = {vid: self.cameras[vid % len(self.cameras)] for vid in range(self.args.viewers)}
+        tasks += [asyncio.create_task(self.viewer(vid, cam)) for vid, cam in viewers.items()]
+
+        await asyncio.sleep(self.args.warmup)
+        before = await asyncio.to_thread(self._server_stats)
+        cpu_start = sampler.cpu_seconds() if sampler else None
+        started = time.monotonic()
+        self.measuring = True
+        while time.monotonic() - started < self.args.duration:
+            await asyncio.sleep(0.5)
+            if sampler:
+                sampler.sample()
+            failed = [t for t in tasks if t.done() and t.exception() is not None]
+            if failed:
+                raise failed[0].exception()
+        self.measuring = False
+        elapsed = time.monotonic() - started
+        cpu_end = sampler.cpu_seconds() if sampler else None
+        after = await asyncio.to_thread(self._server_stats)
+
+        self.stopping = True
+        await asyncio.gather(*tasks, return_exceptions=True)
+        cpu = (cpu_end - cpu_start) if cpu_start is not None and cpu_end is not None else None
+        return self.report(viewers, elapsed, before, after, cpu, sampler)
+
+    def _server_stats(self):
+        try:
+            sources = {s["camera"]: s for s in _get_json(f"{self.base_url}/api/sources")}
+            views = _get_json(f"{self.base_url}/api/view/stats")
+        except Exception as e:
+            print(f"⚠️ [Load] 서버 통계 조회 실패: {e}")
+            return None
+        return {"sources": sources, "views": views}
+
+    def report(self, viewers, elapsed, before, after, cpu, sampler):
+        def pct(values):
+            if not values:
+                return None
+            arr = np.asarray(values) * 1000
+            p50, p95, p99 = np.percentile(arr, (50, 95, 99))
+            return {"n": len(values), "p50_ms": round(float(p50), 1), "p95_ms": round(float(p95), 1),
+                    "p99_ms": round(float(p99), 1), "max_ms": round(float(arr.max()), 1)}
+
+        sources = []
+        for cam in self.cameras:
+            entry = {"camera": cam, "target_fps": self.args.fps, "sent_fps": round(self.sent[cam] / elapsed, 2),
+                     "late_frames": self.late[cam]}
+            if before and after and cam in before["sources"] and cam in after["sources"]:
+                got = after["sources"][cam]["received"] - before["sources"][cam]["received"]
+                entry["server_fps"] = round(got / elapsed, 2)
+                entry["server_lost"] = after["sources"][cam]["lost"] - before["sources"][cam]["lost"]
+            sources.append(entry)
+
+        viewer_rows = []
+        for vid, cam in viewers.items():
+            expected = self.sent[cam]
+            viewer_rows.append({
+                "viewer": vid, "camera": cam, "tier": self.args.tier,
+                "delivered_fps": round(self.received[vid] / elapsed, 2),
+                "frames": self.received[vid], "unmarked": self.unmarked[vid],
+                "skipped_ratio": round(max(0.0, 1 - self.received[vid] / expected), 4) if expected else None,
+                "latency": pct(self.latency[vid]),
+            })
+
+        all_latency = [v for values in self.latency.values() for v in values]
+        server_dropped = None
+        if before is not None and after is not None:
+            # 서버가 시청자별로 건너뛴 프레임 수 (느린 시청자에게는 최신 프레임만 보냄)
+            dropped_before = {v["client"]: v["dropped"] for v in before["views"]}
+            server_dropped = sum(v["dropped"] - dropped_before.get(v["client"], 0) for v in after["views"])
+        return {
+            "duration_s": round(elapsed, 2),
+            "sources": sources,
+            "viewers": viewer_rows,
+            "latency": pct(all_latency),
+            "latency_by_camera": {str(cam): pct([v for vid, c in viewers.items() if c == cam for v in self.latency[vid]])
+                                  for cam in self.cameras},
+            "server_dropped_total": server_dropped,
+            "server": {
+                "cpu_percent": round(cpu / elapsed * 100, 1) if cpu is not None else None,
+                "rss_mb_max": round(max(sampler.rss), 1) if sampler and sampler.rss else None,
+                "rss_mb_mean": round(float(np.mean(sampler.rss)), 1) if sampler and sampler.rss else None,
+            },
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="카메라 송출/시청자 웹소켓 부하 테스트")
+    parser.add_argument("--sources", type=int, default=2, help="송출 카메라 수 K (카메라 1~K)")
+    parser.add_argument("--viewers", type=int, default=4, help="시청자 수 M (카메라에 고르게 배분)")
+    parser.add_argument("--fps", type=float, default=30.0, help="카메라별 송출 fps")
+    parser.add_argument("--size", default="1280x960", help="송출 해상도 (예: 1280x960)")
+    parser.add_argument("--jpeg-quality", type=int, default=85)
+    parser.add_argument("--tier", default="standard", help="시청 화질 단계 (low/standard/high/full)")
+    parser.add_argument("--adaptive", type=int, default=0, help="1이면 적응형 화질 (기본 0 = 고정 화질로 용량 측정)")
+    parser.add_argument("--warmup", type=float, default=3.0, help="측정 전 워밍업(초)")
+    parser.add_argument("--duration", type=float, default=15.0, help="측정 시간(초)")
+    parser.add_argument("--url", help="외부 서버 주소 (없으면 같은 프로세스에서 서버 실행)")
+    parser.add_argument("--server-pid", type=int, help="외부 서버 PID (CPU/메모리 측정용)")
+    parser.add_argument("--out", help="결과 JSON 경로 (기본: benchmarks/results/load_<시각>.json)")
+    args = parser.parse_args(argv)
+    args.width, args.height = (int(v) for v in args.size.lower().split("x"))
+
+    print(f"🧪 [Load] 프레임 준비 중 ({args.size}, {MARK_CYCLE}장)")
+    frames = make_frames(args.width, args.height, args.jpeg_quality)
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+        pid = args.server_pid
+    else:
+        base_url, server = start_server(args.sources)
+        pid = os.getpid()
+    in_process = server is not None
+    sampler = None
+    if pid is not None and os.path.exists(f"/proc/{pid}/stat"):
+        sampler = ResourceSampler(pid, threading.get_native_id() if in_process else None)
+
+    print(f"🚀 [Load] {base_url} 송출 {args.sources}개 x {args.fps}fps, 시청자 {args.viewers}명 ({args.tier}), "
+          f"워밍업 {args.warmup}s + 측정 {args.duration}s")
+    try:
+        result = asyncio.run(LoadRun(args, base_url, frames).run(sampler))
+    finally:
+        if server is not None:
+            server.should_exit = True
+
+    report = {
+        "meta": {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "in_process_server": in_process,
+            "args": {k: v for k, v in vars(args).items() if k not in ("out",)},
+        },
+        **result,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"load_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n{'카메라':<8}{'목표fps':>8}{'송출fps':>9}{'서버fps':>9}{'밀림':>6}")
+    for s in result["sources"]:
+        print(f"{s['camera']:<8}{s['target_fps']:>8.1f}{s['sent_fps']:>9.2f}{s.get('server_fps', float('nan')):>9.2f}"
+              f"{s['late_frames']:>6}")
+    print(f"\n{'시청자':<8}{'카메라':>6}{'수신fps':>9}{'건너뜀':>8}{'p50ms':>8}{'p95ms':>8}{'p99ms':>8}")
+    for v in result["viewers"]:
+        lat = v["latency"] or {}
+        skipped = v["skipped_ratio"] if v["skipped_ratio"] is not None else float("nan")
+        print(f"{v['viewer']:<8}{v['camera']:>6}{v['delivered_fps']:>9.2f}{skipped * 100:>7.1f}%"
+              f"{lat.get('p50_ms', float('nan')):>8.1f}{lat.get('p95_ms', float('nan')):>8.1f}{lat.get('p99_ms', float('nan')):>8.1f}")
+    lat = result["latency"] or {}
+    srv = result["server"]
+    print(f"\n⏱️ [Load] 전체 지연 p50 {lat.get('p50_ms')}ms / p95 {lat.get('p95_ms')}ms / p99 {lat.get('p99_ms')}ms "
+          f"(표식 없는 프레임 {sum(v['unmarked'] for v in result['viewers'])}장)")
+    print(f"🖥️ [Load] 서버 CPU {srv['cpu_percent']}% (코어 1개 = 100%), RSS 최대 {srv['rss_mb_max']}MB")
+    print(f"💾 [Load] 결과 저장: {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
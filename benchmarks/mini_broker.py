@@ -0,0 +1,187 @@
+import sys
+import struct
+import asyncio
+import argparse
+
+# =========================================================
+# [테스트용 최소 MQTT 브로커] (MQTT 3.1.1, asyncio)
+# mosquitto 없이 라인 시뮬레이터/서버를 로컬에서 돌리기 위한 대역입니다. 운영에는 쓰지 마세요.
+# - 지원: CONNECT, PUBLISH(QoS 0/1/2 수신), SUBSCRIBE(+, # 와일드카드), UNSUBSCRIBE, PING, DISCONNECT
+# - 전달은 최대 QoS 1 (구독자 PUBACK은 받기만 하고 재전송 안 함)
+# - 미지원: retain 저장, will 메시지, 세션 유지, 인증
+#
+# 단독 실행: python -m benchmarks.mini_broker --port 1883
+# =========================================================
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def topic_matches(pattern, topic):
+    """ 구독 필터(+, # 와일드카드)와 토픽 비교 """
+    p_parts = pattern.split("/")
+    t_parts = topic.split("/")
+    for i, part in enumerate(p_parts):
+        if part == "#":
+            return True
+        if i >= len(t_parts):
+            return False
+        if part != "+" and part != t_parts[i]:
+            return False
+    return len(p_parts) == len(t_parts)
+
+
+def _encode_length(n):
+    out = bytearray()
+    while True:
+        byte = n % 128
+        n //= 128
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def _packet(ptype, flags, body):
+    return bytes(((ptype << 4) | flags,)) + _encode_length(len(body)) + body
+
+
+def _string(data, off):
+    size = struct.unpack_from("!H", data, off)[0]
+    return data[off + 2:off + 2 + size].decode("utf-8"), off + 2 + size
+
+
+class _Session:
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.subscriptions = {}   # 필터 -> QoS
+        self._next_id = 0
+        self.client_id = ""
+
+    def next_packet_id(self):
+        self._next_id = self._next_id % 65535 + 1
+        return self._next_id
+
+    def send(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    async def read_packet(self):
+        first = await self.reader.readexactly(1)
+        length, shift = 0, 0
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        body = await self.reader.readexactly(length) if length else b""
+        return first[0] >> 4, first[0] & 0x0F, body
+
+    async def run(self):
+        try:
+            while True:
+                ptype, flags, body = await self.read_packet()
+                if ptype == CONNECT:
+                    _, off = _string(body, 0)          # 프로토콜 이름
+                    off += 4                           # 버전, 플래그, keepalive
+                    self.client_id, _ = _string(body, off)
+                    self.send(_packet(CONNACK, 0, b"\x00\x00"))
+                elif ptype == PUBLISH:
+                    qos = (flags >> 1) & 0x03
+                    topic, off = _string(body, 0)
+                    if qos:
+                        pid = struct.unpack_from("!H", body, off)[0]
+                        off += 2
+                        self.send(_packet(PUBACK if qos == 1 else PUBREC, 0, struct.pack("!H", pid)))
+                    self.broker.route(topic, body[off:], qos)
+                elif ptype == PUBREL:
+                    self.send(_packet(PUBCOMP, 0, body[:2]))
+                elif ptype == SUBSCRIBE:
+                    pid = body[:2]
+                    off, granted = 2, bytearray()
+                    while off < len(body):
+                        pattern, off = _string(body, off)
+                        qos = min(body[off], 1)
+                        off += 1
+                        self.subscriptions[pattern] = qos
+                        granted.append(qos)
+                    self.send(_packet(SUBACK, 0, pid + bytes(granted)))
+                elif ptype == UNSUBSCRIBE:
+                    off = 2
+                    while off < len(body):
+                        pattern, off = _string(body, off)
+                        self.subscriptions.pop(pattern, None)
+                    self.send(_packet(UNSUBACK, 0, body[:2]))
+                elif ptype == PINGREQ:
+                    self.send(_packet(PINGRESP, 0, b""))
+                elif ptype == DISCONNECT:
+                    break
+                # PUBACK/PUBREC/PUBCOMP (구독자 응답)은 무시
+                await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass   # 연결 끊김 / 브로커 종료
+        finally:
+            self.broker.sessions.discard(self)
+            self.writer.close()
+
+    def deliver(self, topic, payload, qos):
+        granted = max((q for pattern, q in self.subscriptions.items() if topic_matches(pattern, topic)), default=None)
+        if granted is None:
+            return
+        qos = min(qos, granted)
+        header = struct.pack("!H", len(topic.encode("utf-8"))) + topic.encode("utf-8")
+        if qos:
+            header += struct.pack("!H", self.next_packet_id())
+        self.send(_packet(PUBLISH, qos << 1, header + payload))
+
+
+class MiniBroker:
+    def __init__(self):
+        self.sessions = set()
+        self.server = None
+        self.messages = 0
+
+    async def start(self, host="127.0.0.1", port=1883):
+        self.server = await asyncio.start_server(self._on_client, host, port)
+        print(f"📡 [MiniBroker] {host}:{port} 대기 중 (테스트용)")
+        return self
+
+    async def _on_client(self, reader, writer):
+        session = _Session(self, reader, writer)
+        self.sessions.add(session)
+        await session.run()
+
+    def route(self, topic, payload, qos):
+        self.messages += 1
+        for session in list(self.sessions):
+            session.deliver(topic, payload, qos)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for session in list(self.sessions):
+            session.writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="테스트용 최소 MQTT 브로커")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args(argv)
+
+    async def serve():
+        broker = await MiniBroker().start(args.host, args.port)
+        await broker.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
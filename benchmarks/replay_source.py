@@ -0,0 +1,188 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+
+import numpy as np
+import websockets
+
+# 저장소 루트에서 `python -m benchmarks.replay_source` 또는 `python benchmarks/replay_source.py`로 실행
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_protocol import parse_frame, pack_frame
+from frame_recorder import RECORD_DIR, list_segments, read_recording
+
+# =========================================================
+# [녹화 재생 송출기] frame_recorder가 남긴 녹화를 /ws/source/{번호}로 다시 보냅니다.
+# - 기본: 녹화된 바이트를 그대로, 서버가 받았던 간격 그대로 (실시간, --speed 1)
+#   --speed 2 = 2배속, --speed 0 = 최대 속도 (대기 없이 연속 송출)
+# - 여러 카메라를 같이 재생하면 같은 시간축으로 맞춰 보냄 (한 라인의 상부/하부 동기 재생)
+# - --loop 또는 --restamp: 송출 헤더의 순번/촬영 시각을 이어지게 다시 씀
+#   (반복 재생 시 순번이 되돌아가 '순서 뒤바뀜'으로 집계되는 것을 막음, 간격은 원본 유지)
+#
+# 사용 예:
+#   python -m benchmarks.replay_source --camera 1 --camera 2
+#   python -m benchmarks.replay_source --camera 1 --to 3 --speed 0 --url ws://127.0.0.1:8000
+#   python -m benchmarks.replay_source --camera 1 --start "2026-10-19 09:00" --end "2026-10-19 09:05"
+# =========================================================
+
+LATE_REPORT_THRESHOLD = 0.05   # 실시간 재생에서 예정보다 이만큼(초) 늦게 보낸 프레임은 '지연'으로 집계
+
+
+def _parse_time(text):
+    """ "2026-10-19 09:00[:00]" / ISO 형식 / 유닉스 시각(초) -> time.time 기준 초 """
+    if text is None:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def _restamp(raw, seq, capture_ts):
+    """ 송출 헤더의 순번/촬영 시각 교체 (헤더 없는 JPEG는 그대로) """
+    header, payload = parse_frame(raw)
+    if header is None:
+        return raw
+    return pack_frame(bytes(payload), seq, capture_ts, header["width"], header["height"])
+
+
+class CameraReplay:
+    def __init__(self, args, camera, target):
+        self.args = args
+        self.camera = camera
+        self.target = target
+        self.sent = 0
+        self.bytes = 0
+        self.late = []          # 예정 시각 대비 송출 지연(초)
+        self.first_ts = None
+        self.last_ts = None
+
+    def first_timestamp(self):
+        for frame in read_recording(self.args.dir, self.camera, self.args.start, self.args.end):
+            return frame.received_ts
+        return None
+
+    async def run(self, t0_recorded, t0_wall):
+        """ t0_recorded(녹화 시간축) = t0_wall(재생 시작 monotonic) 로 맞춰 송출 """
+        args = self.args
+        url = f"{args.url.rstrip('/')}/ws/source/{self.target}"
+        speed = args.speed
+        async with websockets.connect(url, max_size=None, ping_interval=None) as ws:
+            loops = 0
+            shift = 0.0          # 반복 재생 시 녹화 시간축/촬영 시각을 뒤로 미는 양(초)
+            seq_offset = 0
+            while True:
+                loop_first = loop_last = first_seq = last_seq = None
+                loop_frames = 0
+                for frame in read_recording(args.dir, self.camera, args.start, args.end):
+                    if speed > 0:
+                        due = t0_wall + (frame.received_ts + shift - t0_recorded) / speed
+                        wait = due - time.monotonic()
+                        if wait > 0:
+                            await asyncio.sleep(wait)
+                        self.late.append(max(0.0, time.monotonic() - due))
+
+                    raw = frame.raw
+                    if (args.restamp or args.loop) and frame.seq is not None:
+                        first_seq = frame.seq if first_seq is None else first_seq
+                        last_seq = frame.seq + seq_offset
+                        raw = _restamp(raw, last_seq, frame.capture_ts + shift)
+                    await ws.send(raw)
+                    self.sent += 1
+                    self.bytes += len(raw)
+                    loop_frames += 1
+                    loop_first = frame.received_ts if loop_first is None else loop_first
+                    loop_last = frame.received_ts
+                    self.first_ts = loop_first if self.first_ts is None else self.first_ts
+                    self.last_ts = loop_last + shift
+                    if args.max_frames and self.sent >= args.max_frames:
+                        return
+
+                loops += 1
+                if not args.loop or loop_frames == 0 or (args.loops and loops >= args.loops):
+                    return
+                # 다음 반복은 마지막 프레임 다음 간격(평균 프레임 간격)부터 이어서
+                interval = (loop_last - loop_first) / max(1, loop_frames - 1)
+                shift += (loop_last - loop_first) + interval
+                if last_seq is not None:
+                    seq_offset = last_seq + 1 - first_seq
+
+    def report(self, elapsed):
+        late = np.asarray(self.late) * 1000 if self.late else np.zeros(1)
+        recorded = (self.last_ts - self.first_ts) if self.sent > 1 else 0.0
+        return {
+            "camera": self.camera,
+            "target": self.target,
+            "frames": self.sent,
+            "mbytes": round(self.bytes / 1e6, 2),
+            "fps": round(self.sent / elapsed, 1) if elapsed > 0 else None,
+            "recorded_s": round(recorded, 2),
+            "late_p50_ms": round(float(np.percentile(late, 50)), 1),
+            "late_p99_ms": round(float(np.percentile(late, 99)), 1),
+            "late_frames": int((late > LATE_REPORT_THRESHOLD * 1000).sum()),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="송출 녹화 재생 (/ws/source로 다시 보내기)")
+    parser.add_argument("--dir", default=RECORD_DIR, help="녹화 폴더 (기본: RECORD_DIR)")
+    parser.add_argument("--camera", type=int, action="append", required=True, help="재생할 녹화 카메라 번호 (여러 번 지정 가능)")
+    parser.add_argument("--to", type=int, action="append", help="보낼 서버 카메라 번호 (--camera 순서대로, 기본: 같은 번호)")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000", help="서버 웹소켓 주소")
+    parser.add_argument("--speed", type=float, default=1.0, help="재생 배속 (1 = 실시간, 0 = 최대 속도)")
+    parser.add_argument("--start", help="재생 시작 시각 (예: \"2026-10-19 09:00\", 유닉스 시각)")
+    parser.add_argument("--end", help="재생 종료 시각")
+    parser.add_argument("--loop", action="store_true", help="끝나면 처음부터 반복 (순번/촬영 시각 이어서 다시 씀)")
+    parser.add_argument("--loops", type=int, default=0, help="--loop 반복 횟수 (0 = 무한)")
+    parser.add_argument("--restamp", action="store_true", help="순번/촬영 시각을 다시 씀 (반복이 아니어도)")
+    parser.add_argument("--max-frames", type=int, default=0, help="카메라별 최대 송출 프레임 수")
+    args = parser.parse_args(argv)
+    args.start = _parse_time(args.start)
+    args.end = _parse_time(args.end)
+    if args.to and len(args.to) != len(args.camera):
+        parser.error("--to 는 --camera 와 같은 개수로 지정해야 합니다.")
+    if args.url.startswith("http"):
+        args.url = args.url.replace("http", "ws", 1)
+
+    targets = args.to or args.camera
+    replays = []
+    for camera, target in zip(args.camera, targets):
+        if not list_segments(args.dir, camera):
+            parser.error(f"카메라 {camera} 녹화가 없습니다: {args.dir}")
+        replays.append(CameraReplay(args, camera, target))
+
+    firsts = [ts for ts in (r.first_timestamp() for r in replays) if ts is not None]
+    if not firsts:
+        parser.error("지정한 구간에 녹화된 프레임이 없습니다.")
+    t0_recorded = min(firsts)
+    mode = "최대 속도" if args.speed <= 0 else f"{args.speed:g}배속"
+    print(f"▶️ [Replay] 카메라 {args.camera} -> {targets} ({mode}, "
+          f"{datetime.datetime.fromtimestamp(t0_recorded):%Y-%m-%d %H:%M:%S} 부터)")
+
+    async def run():
+        t0_wall = time.monotonic()
+        results = await asyncio.gather(*(r.run(t0_recorded, t0_wall) for r in replays), return_exceptions=True)
+        for replay, result in zip(replays, results):
+            if isinstance(result, Exception):
+                print(f"❌ [Replay] 카메라 {replay.camera} 송출 중단: {result}")
+        return time.monotonic() - t0_wall
+
+    try:
+        elapsed = asyncio.run(run())
+    except KeyboardInterrupt:
+        return 130
+
+    print(f"\n{'녹화':>4} {'->':>3} {'프레임':>8} {'MB':>8} {'fps':>7} {'녹화(s)':>8} {'지연p50':>8} {'지연p99':>8} {'지연수':>6}")
+    for replay in replays:
+        r = replay.report(elapsed)
+        print(f"{r['camera']:>4} {r['target']:>3} {r['frames']:>8} {r['mbytes']:>8} {r['fps']:>7} {r['recorded_s']:>8} "
+              f"{r['late_p50_ms']:>8} {r['late_p99_ms']:>8} {r['late_frames']:>6}")
+    print(f"⏱️ [Replay] 재생 시간 {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import numpy as np
+import cv2
+
+from vali import config as cfg
+
+# =========================================================
+# [합성 너트 이미지] 벤치마크/정확도 검증용
+# cfg.TEMPLATE_X/Y(정답 육각형, 픽셀 단위)를 그대로 그려서 정답(ground truth)을 알고 있는 이미지를 만듭니다.
+#   - rotation    : 회전 각도(도, 반시계 방향)
+#   - hole_offset : 구멍 중심과 너트 중심 사이 거리(px)
+#   - defect      : ("bump" | "dent", 크기 px) - 변 중앙에 튀어나온/파인 형상 불량
+#   - noise       : 가우시안 노이즈 표준편차 (0~255 밝기 단위)
+# =========================================================
+
+BACKGROUND = 230
+BODY = 40
+HOLE_RADIUS = 22
+DEFECT_TYPES = ("none", "bump", "dent")
+
+
+def _rotate(x, y, degrees):
+    rad = np.radians(degrees)
+    c, s = np.cos(rad), np.sin(rad)
+    return x * c - y * s, x * s + y * c
+
+
+def render_nut(width=640, height=480, rotation=0.0, hole_offset=0.0, hole_direction=0.0,
+               defect=("none", 0.0), noise=0.0, seed=0):
+    """
+    합성 너트 이미지 1장 -> (BGR 이미지, 정답 dict)
+    정답: 너트 중심(이미지 좌표), 회전 각도, 구멍 편심(px), 불량 종류/크기
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), BACKGROUND, np.uint8)
+    cx, cy = width / 2.0, height / 2.0
+
+    # 템플릿은 수학 좌표(Y 위쪽 +) -> 회전 후 이미지 좌표(Y 아래쪽 +)로 변환
+    tx, ty = _rotate(cfg.TEMPLATE_X.astype(np.float64), cfg.TEMPLATE_Y.astype(np.float64), rotation)
+    pts = np.column_stack((cx + tx, cy - ty))
+    # 1/16 px 정밀도로 그려서 반올림 오차를 줄임
+    shift = 4
+    cv2.fillPoly(img, [np.rint(pts * (1 << shift)).astype(np.int32)], (BODY,) * 3, cv2.LINE_AA, shift)
+
+    kind, size = defect
+    if kind != "none" and size > 0:
+        # 첫 번째 변(0번 -> 1번 꼭짓점) 중앙에 원을 그려 형상 불량을 만듦
+        mid = (pts[0] + pts[1]) / 2.0
+        center = tuple(np.rint(mid * (1 << shift)).astype(int).tolist())
+        color = (BODY,) * 3 if kind == "bump" else (BACKGROUND,) * 3
+        cv2.circle(img, center, int(round(size * (1 << shift))), color, -1, cv2.LINE_AA, shift)
+
+    hx = cx + hole_offset * np.cos(np.radians(hole_direction))
+    hy = cy - hole_offset * np.sin(np.radians(hole_direction))
+    cv2.circle(img, (int(round(hx * (1 << shift))), int(round(hy * (1 << shift)))),
+               HOLE_RADIUS << shift, (BACKGROUND,) * 3, -1, cv2.LINE_AA, shift)
+
+    if noise > 0:
+        noisy = img.astype(np.float32) + rng.normal(0.0, noise, img.shape).astype(np.float32)
+        img = np.clip(noisy, 0, 255).astype(np.uint8)
+
+    truth = {
+        "center": (cx, cy),
+        "rotation": float(rotation),
+        "hole_offset": float(hole_offset),
+        "defect": kind if size > 0 else "none",
+        "defect_size": float(size) if kind != "none" else 0.0,
+    }
+    return img, truth
+
+
+def expected_shape_result(truth):
+    """ 정답 불량 크기 -> inspect()가 내야 할 형상 판정 (OK/WARN/FAIL) """
+    size = truth["defect_size"]
+    if size > cfg.LIMIT_FAIL:
+        return "FAIL"
+    if size > cfg.LIMIT_WARNING:
+        return "WARN"
+    return "OK"
+
+
+def expected_hole_result(truth):
+    return "OK" if truth["hole_offset"] <= cfg.TOL_HOLE else "FAIL"
+
+
+def angle_error(measured, truth_rotation):
+    """
+    측정 보정 각도와 정답 회전 각도의 차이(도)
+    find_best_angle은 중심에서 가장 먼 꼭짓점을 12시로 보내는 각도를 주므로 (측정 + 회전)이 0이어야 하지만,
+    육각형이라 어느 꼭짓점을 기준으로 잡았는지에 따라 60도 단위로 달라질 수 있어 60도 단위 차이는 같은 자세로 봅니다.
+    """
+    diff = (measured + truth_rotation) % 60.0
+    return min(diff, 60.0 - diff)
@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+import numpy as np
+
+from metrics import REGISTRY
+
+# =========================================================
+# [프레임 버퍼 풀] 카메라별 재사용 ndarray (AI 오버레이 캔버스용)
+# - 매 프레임 image.copy()/result.plot()로 새 배열을 만드는 대신 미리 만들어 둔 배열에 그림
+# - 빌려간(lease) 버퍼는 반납 전까지 절대 다른 요청에 내주지 않음
+# - 디코딩된 원본 프레임(검사 촬영/링버퍼용)은 풀에 넣지 않음 -> 검사 중 덮어써질 일 없음
+#   (Python cv2.imdecode는 출력 배열을 받지 않으므로 디코딩 결과는 항상 새 배열)
+# =========================================================
+
+POOL_MAX_FREE = 2   # 크기(shape)별로 보관할 여분 버퍼 수
+
+
+class BufferLease:
+    __slots__ = ("pool", "array", "released")
+
+    def __init__(self, pool, array):
+        self.pool = pool
+        self.array = array
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.pool._give_back(self.array)
+
+    def __enter__(self):
+        return self.array
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FrameBufferPool:
+    def __init__(self, name, max_free=POOL_MAX_FREE):
+        self.name = name
+        self.max_free = max_free
+        self.free = defaultdict(list)   # (shape, dtype) -> 반납된 배열들
+        self.leased = 0
+        self.allocs = REGISTRY.counter("frame_pool_alloc_total", "풀에 여분이 없어 새로 할당한 버퍼 수", pool=name)
+        self.reuses = REGISTRY.counter("frame_pool_reuse_total", "재사용한 버퍼 수", pool=name)
+
+    def lease(self, shape, dtype=np.uint8):
+        """ shape 크기 버퍼를 빌림 (with 블록 또는 release()로 반납) """
+        key = (tuple(shape), np.dtype(dtype).str)
+        bucket = self.free[key]
+        if bucket:
+            array = bucket.pop()
+            self.reuses.inc()
+        else:
+            array = np.empty(shape, dtype)
+            self.allocs.inc()
+        self.leased += 1
+        return BufferLease(self, array)
+
+    def _give_back(self, array):
+        self.leased -= 1
+        bucket = self.free[(array.shape, array.dtype.str)]
+        if len(bucket) < self.max_free:
+            bucket.append(array)
+
+    def stats(self):
+        return {
+            "leased": self.leased,
+            "free": sum(len(b) for b in self.free.values()),
+            "allocs": self.allocs.value,
+            "reuses": self.reuses.value,
+        }
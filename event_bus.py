@@ -0,0 +1,117 @@
+import asyncio
+import time
+from enum import Enum
+from dataclasses import dataclass, field
+
+from metrics import REGISTRY
+
+# =========================================================
+# [MQTT 이벤트 버스]
+# paho 네트워크 스레드에서 받은 메시지를 서버 이벤트 루프의 큐로 넘기고,
+# 이벤트 루프 위에서 핸들러(코루틴)를 실행합니다.
+# - paho 스레드에서는 call_soon_threadsafe 한 번만 호출 (루프 조회/판단 없음 -> 이벤트 유실 없음)
+# - 이벤트마다 수신 시각을 기록하고 '수신 -> 핸들러 시작', '핸들러 실행' 시간을 히스토그램으로 남김
+# =========================================================
+
+class EventType(str, Enum):
+    CHECK = "CHECK"          # 제품 도착 -> 검사 시작
+    UP_DONE = "UP_DONE"      # 셔터 UP 완료
+    DOWN_DONE = "DOWN_DONE"  # 셔터 DOWN 완료
+    UNKNOWN = "UNKNOWN"
+
+
+@dataclass
+class MQTTEvent:
+    type: EventType
+    topic: str
+    payload: str
+    received_at: float = field(default_factory=time.monotonic)  # 수신 시각 (time.monotonic 기준)
+
+
+class MQTTEventBus:
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.loop = None
+        self.queue = None
+        self.handlers = {}   # EventType -> [async handler(event)]
+        self._tasks = set()  # 실행 중인 핸들러 태스크 (GC 방지용 참조)
+
+        # 이벤트 타입별 메트릭은 미리 만들어 둡니다. (수신 경로에서 추가 할당 없음)
+        self.dispatch_latency = {
+            t: REGISTRY.histogram("mqtt_event_dispatch_seconds", "MQTT 수신 ~ 핸들러 시작 지연", event=t.value)
+            for t in EventType
+        }
+        self.handler_latency = {
+            t: REGISTRY.histogram("mqtt_event_handler_seconds", "MQTT 이벤트 핸들러 실행 시간", event=t.value)
+            for t in EventType
+        }
+        self.received = {t: REGISTRY.counter("mqtt_event_total", "MQTT 이벤트 수신 수", event=t.value) for t in EventType}
+        self.dropped = REGISTRY.counter("mqtt_event_dropped_total", "큐 초과/루프 미연결로 버려진 MQTT 이벤트 수")
+        self.queue_depth = REGISTRY.gauge("mqtt_event_queue_depth", "처리 대기 중인 MQTT 이벤트 수")
+
+    def bind(self, loop):
+        """ 서버 이벤트 루프에 연결 (startup 이벤트에서 호출) """
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+
+    def subscribe(self, event_type, handler):
+        self.handlers.setdefault(event_type, []).append(handler)
+
+    # --- paho 네트워크 스레드에서 호출 ---
+    def post_threadsafe(self, topic, payload):
+        try:
+            event_type = EventType(payload)
+        except ValueError:
+            event_type = EventType.UNKNOWN
+        event = MQTTEvent(event_type, topic, payload)
+
+        if self.loop is None or self.loop.is_closed():
+            self.dropped.inc()
+            print(f"⚠️ [EventBus] 이벤트 루프 미연결 - 이벤트 버림: {payload}")
+            return
+        self.loop.call_soon_threadsafe(self._enqueue, event)
+
+    # --- 이벤트 루프에서 실행 ---
+    def _enqueue(self, event):
+        try:
+            self.queue.put_nowait(event)
+            self.queue_depth.set(self.queue.qsize())
+        except asyncio.QueueFull:
+            self.dropped.inc()
+            print(f"⚠️ [EventBus] 큐 가득 참 - 이벤트 버림: {event.payload}")
+
+    async def run(self):
+        """ 이벤트 디스패처 (startup에서 태스크로 실행) """
+        while True:
+            event = await self.queue.get()
+            self.queue_depth.set(self.queue.qsize())
+            self.received[event.type].inc()
+
+            for handler in self.handlers.get(event.type, ()):
+                # 핸들러는 각각 태스크로 실행 -> 오래 걸리는 핸들러가 다음 이벤트를 막지 않음
+                task = asyncio.create_task(self._run_handler(handler, event))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run_handler(self, handler, event):
+        started = time.monotonic()
+        self.dispatch_latency[event.type].observe(started - event.received_at)
+        try:
+            await handler(event)
+        except Exception as e:
+            print(f"❌ [EventBus] {event.type.value} 핸들러 에러: {e}")
+        finally:
+            self.handler_latency[event.type].observe(time.monotonic() - started)
+
+    def stats(self):
+        return {
+            t.value: {
+                "received": self.received[t].value,
+                "dispatch": self.dispatch_latency[t].snapshot(),
+                "handler": self.handler_latency[t].snapshot(),
+            }
+            for t in EventType
+        } | {"dropped": self.dropped.value, "queue_depth": self.queue.qsize() if self.queue else 0}
+
+
+event_bus = MQTTEventBus()
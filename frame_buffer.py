@@ -0,0 +1,97 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# --- [프레임 안정화(Settle) 감지 설정] ---
+FRAME_RING_SIZE = 8          # 카메라별로 보관할 최근 프레임 수
+SETTLE_THUMB_SIZE = (64, 48) # 프레임 간 차이 계산용 축소 크기 (흑백)
+SETTLE_DIFF_THRESHOLD = 2.0  # 평균 밝기 차이(0~255)가 이 값 미만이면 '정지' 프레임
+SETTLE_STABLE_FRAMES = 2     # 연속으로 정지 판정을 받아야 하는 프레임 수
+SETTLE_TIMEOUT = 1.0         # DONE 이후 안정 프레임을 기다리는 최대 시간(초)
+
+
+@dataclass
+class TimedFrame:
+    seq: int            # 카메라별 수신 순번
+    ts: float           # 수신 시각 (time.monotonic, MQTT 이벤트 수신 시각과 같은 기준)
+    frame: Optional[np.ndarray]  # 원본 프레임 (OpenCV BGR, 공유 메모리 모드에서는 None)
+    thumb: np.ndarray   # 차이 계산용 축소 흑백 이미지
+    diff: float         # 직전 프레임과의 평균 밝기 차이 (첫 프레임은 inf)
+    stable_run: int     # 직전까지 연속 '정지' 판정 횟수
+    jpeg: Optional[bytes] = None  # 원본 JPEG (공유 메모리 모드: 디코딩 없이 그대로 촬영 파일로 저장)
+    meta: Optional[dict] = None   # 송출 헤더 정보 (송출 순번, 촬영 시각, 해상도, 코덱) -> 검사 촬영 근거
+
+
+def make_settle_thumb(frame):
+    """ 프레임 -> 차이 계산용 축소 흑백 이미지 (디코딩과 함께 실행기에서 호출) """
+    small = cv2.resize(frame, SETTLE_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+class FrameRing:
+    """
+    [프레임 링버퍼] 카메라별 최근 프레임을 수신 시각과 함께 보관하고,
+    '이벤트 이후 처음으로 흔들림이 멈춘 프레임'을 기다려 돌려줍니다.
+    (고정 sleep 대신 실제 영상이 안정되는 즉시 촬영)
+    """
+    def __init__(self, size=FRAME_RING_SIZE):
+        self.frames = deque(maxlen=size)
+        self.seq = 0
+        self._new_frame = asyncio.Event()
+
+    def push(self, frame, thumb=None, ts=None, jpeg=None, meta=None):
+        """ 새 프레임 추가 (이벤트 루프에서 호출, 공유 메모리 모드는 frame 대신 jpeg+thumb) """
+        if thumb is None:
+            thumb = make_settle_thumb(frame)
+        ts = ts if ts is not None else time.monotonic()
+
+        prev = self.frames[-1] if self.frames else None
+        if prev is not None and prev.thumb.shape == thumb.shape:
+            diff = float(cv2.absdiff(prev.thumb, thumb).mean())
+        else:
+            diff = float("inf")
+        stable_run = (prev.stable_run + 1) if (prev is not None and diff < SETTLE_DIFF_THRESHOLD) else 0
+
+        self.seq += 1
+        self.frames.append(TimedFrame(self.seq, ts, frame, thumb, diff, stable_run, jpeg, meta))
+
+        # 대기 중인 wait_stable()들을 깨우고 다음 프레임용 이벤트로 교체
+        self._new_frame.set()
+        self._new_frame = asyncio.Event()
+
+    def latest(self):
+        return self.frames[-1] if self.frames else None
+
+    async def wait_stable(self, after_ts, timeout=SETTLE_TIMEOUT):
+        """
+        after_ts(이벤트 수신 시각) 이후에 들어온 프레임 중 처음으로 안정된 프레임을 반환합니다.
+        timeout 안에 안정되지 않으면 이벤트 이후의 가장 최신 프레임을, 그것도 없으면 None을 반환합니다.
+        반환값: (TimedFrame 또는 None, 안정 여부)
+        """
+        deadline = time.monotonic() + timeout
+        checked_seq = 0
+        while True:
+            for tf in self.frames:
+                if tf.seq <= checked_seq or tf.ts <= after_ts:
+                    continue
+                checked_seq = tf.seq
+                if tf.stable_run >= SETTLE_STABLE_FRAMES:
+                    return tf, True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._new_frame.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        fresh = self.latest()
+        if fresh is not None and fresh.ts > after_ts:
+            return fresh, False
+        return None, False
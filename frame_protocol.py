@@ -0,0 +1,161 @@
+import time
+import struct
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from metrics import REGISTRY
+
+# =========================================================
+# [카메라 송출 프레임 형식] /ws/source/{camera_index}
+#
+# 헤더(리틀엔디언, 26바이트) + 페이로드(JPEG)
+#   magic     2s  b"FH"
+#   version   B   1
+#   codec     B   1=JPEG
+#   hdr_len   H   헤더 길이 (다음 버전에서 필드가 늘어나도 옛 서버가 페이로드 위치를 찾을 수 있음)
+#   seq       Q   송출 순번 (카메라별 1씩 증가)
+#   capture   d   촬영 시각(초, 송출 PC의 시계 - time.time() 또는 monotonic 무엇이든 일관되기만 하면 됨)
+#   width     H   원본 해상도
+#   height    H
+#
+# 헤더 없이 JPEG만 보내는 기존 송출기(FF D8로 시작)도 그대로 받습니다. (seq/촬영 시각 없음)
+# =========================================================
+
+FRAME_MAGIC = b"FH"
+FRAME_VERSION = 1
+CODEC_JPEG = 1
+CODEC_NAMES = {CODEC_JPEG: "jpeg"}
+
+_HEADER = struct.Struct("<2sBBHQdHH")
+HEADER_SIZE = _HEADER.size
+
+CLOCK_WINDOW = 300        # 시계 차이 추정에 쓰는 최근 프레임 수 (30fps 기준 10초)
+
+
+@dataclass
+class FrameMeta:
+    seq: Optional[int]          # 송출 순번 (헤더 없는 JPEG면 None)
+    capture_ts: Optional[float] # 송출 PC 시계 기준 촬영 시각
+    width: int
+    height: int
+    codec: str
+    version: int                # 0 = 헤더 없는 JPEG
+    received_at: float          # 서버 수신 시각 (time.monotonic)
+    server_capture_ts: float    # 촬영 시각을 서버 시계로 환산 (헤더 없으면 수신 시각)
+
+    def describe(self):
+        return {
+            "seq": self.seq,
+            "capture_ts": self.capture_ts,
+            "width": self.width,
+            "height": self.height,
+            "codec": self.codec,
+            "version": self.version,
+        }
+
+
+def pack_frame(payload, seq, capture_ts, width, height, codec=CODEC_JPEG):
+    """ 송출기용: 헤더 + JPEG """
+    return _HEADER.pack(FRAME_MAGIC, FRAME_VERSION, codec, HEADER_SIZE, seq, capture_ts, width, height) + payload
+
+
+def parse_frame(data):
+    """
+    수신 데이터 -> (헤더 dict 또는 None, 페이로드 memoryview)
+    헤더가 없으면(기존 송출기) None, 알 수 없는 형식이면 ValueError
+    """
+    if data[:2] == FRAME_MAGIC:
+        if len(data) < HEADER_SIZE:
+            raise ValueError("헤더가 잘렸습니다.")
+        magic, version, codec, hdr_len, seq, capture_ts, width, height = _HEADER.unpack_from(data, 0)
+        if codec not in CODEC_NAMES:
+            raise ValueError(f"지원하지 않는 코덱: {codec}")
+        header = {"version": version, "codec": CODEC_NAMES[codec], "seq": seq,
+                  "capture_ts": capture_ts, "width": width, "height": height}
+        return header, memoryview(data)[max(hdr_len, HEADER_SIZE):]
+    if data[:2] == b"\xff\xd8":
+        return None, memoryview(data)
+    raise ValueError("알 수 없는 프레임 형식")
+
+
+class SourceTracker:
+    """
+    [카메라 송출 상태] 누락/순서 뒤바뀜 집계 + 송출 PC와 서버의 시계 차이 추정
+    시계 차이 = 최근 CLOCK_WINDOW 프레임 중 (수신 시각 - 촬영 시각)의 최솟값
+      -> 가장 빨리 도착한 프레임의 전송 시간을 0으로 보는 추정이므로,
+         이를 기준으로 한 지연값은 '최소 전송 시간을 뺀' 하한값입니다.
+    """
+    def __init__(self, camera_index):
+        self.camera_index = camera_index
+        self.last_seq = None
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.legacy = 0
+        self.last_meta = None
+        self._deltas = deque(maxlen=CLOCK_WINDOW)
+        self._min_delta = None
+
+        labels = {"camera": str(camera_index)}
+        self.m_frames = REGISTRY.counter("source_frames_total", "카메라 송출 프레임 수신 수", **labels)
+        self.m_lost = REGISTRY.counter("source_frames_lost_total", "순번 누락으로 판단한 프레임 수", **labels)
+        self.m_transit = REGISTRY.histogram("source_transit_seconds", "촬영 ~ 서버 수신 (최소 전송 시간 제외)", **labels)
+        # 시청자 세션이 전송 완료 시점에 같은 히스토그램(이름+라벨)에 기록
+        self.m_e2e = REGISTRY.histogram("frame_e2e_seconds", "촬영 ~ 시청자 전송 완료 (최소 전송 시간 제외)", **labels)
+
+    def reset(self):
+        """ 송출기 재접속: 순번/시계가 새로 시작될 수 있음 """
+        self.last_seq = None
+        self._deltas.clear()
+        self._min_delta = None
+
+    def accept(self, data, received_at=None):
+        """ 수신 데이터 -> (FrameMeta, JPEG 페이로드) """
+        received_at = received_at if received_at is not None else time.monotonic()
+        header, payload = parse_frame(data)
+        self.received += 1
+        self.m_frames.inc()
+
+        if header is None:
+            self.legacy += 1
+            meta = FrameMeta(None, None, 0, 0, "jpeg", 0, received_at, received_at)
+            self.last_meta = meta
+            return meta, payload
+
+        seq = header["seq"]
+        if self.last_seq is not None:
+            gap = seq - self.last_seq
+            if gap > 1:
+                self.lost += gap - 1
+                self.m_lost.inc(gap - 1)
+            elif gap <= 0:
+                self.reordered += 1
+        if self.last_seq is None or seq > self.last_seq:
+            self.last_seq = seq
+
+        delta = received_at - header["capture_ts"]
+        self._deltas.append(delta)
+        if self._min_delta is None or delta < self._min_delta or len(self._deltas) == self._deltas.maxlen:
+            self._min_delta = min(self._deltas)
+        self.m_transit.observe(delta - self._min_delta)
+
+        meta = FrameMeta(seq, header["capture_ts"], header["width"], header["height"], header["codec"],
+                         header["version"], received_at, header["capture_ts"] + self._min_delta)
+        self.last_meta = meta
+        return meta, payload
+
+    def stats(self):
+        expected = self.received - self.legacy + self.lost
+        return {
+            "camera": self.camera_index,
+            "received": self.received,
+            "legacy_frames": self.legacy,
+            "lost": self.lost,
+            "loss_ratio": round(self.lost / expected, 4) if expected else 0.0,
+            "reordered": self.reordered,
+            "clock_offset": self._min_delta,
+            "transit": self.m_transit.snapshot(),
+            "e2e": self.m_e2e.snapshot(),
+            "last_frame": self.last_meta.describe() if self.last_meta else None,
+        }
@@ -0,0 +1,378 @@
+import os
+import re
+import time
+import math
+import queue
+import struct
+import bisect
+import threading
+from typing import Dict, Iterable, Optional
+
+from metrics import REGISTRY
+
+# =========================================================
+# [카메라 송출 녹화] 실제 라인 영상으로 지연 문제 재현 / 미리보기·추론 변경 벤치마크용
+# - 켜기: RECORD_CAMERAS="all" 또는 "1,2" (기본: 꺼짐)
+# - /ws/source로 받은 데이터를 헤더 포함 그대로(바이트 단위 동일) 카메라별 세그먼트 파일에 이어 씀
+#   -> benchmarks/replay_source.py로 같은 바이트를 같은 간격으로 다시 송출 (결정적 재생)
+# - 기록은 전용 스레드 1개가 담당 (송출 루프는 큐에 넣기만 함, 큐가 차면 녹화 프레임만 버림)
+# - 멀티 워커 모드: 카메라 폴더는 그 카메라의 수집 담당 워커만 씀 (attach ~ detach 사이)
+#   -> 모든 워커가 같은 폴더를 동시에 정리하거나 세그먼트 번호가 어긋나지 않음
+#      (생성 시에는 디스크/스레드를 건드리지 않음 - 수집을 시작할 때 기록 스레드 시작)
+#
+# 파일 구조: RECORD_DIR/cam{번호}/{시작시각}_{번호}.seg (+ .idx)
+#   .seg = 세그먼트 헤더 + [레코드 헤더 + 수신 데이터] ...
+#       세그먼트 헤더 <4sBBHd>  magic b"FREC", version 1, 예약, 카메라 번호, 시작 시각(time.time)
+#       레코드 헤더   <IQdd>    데이터 길이, 송출 순번(헤더 없는 JPEG면 NO_SEQ), 수신 시각(time.time),
+#                               송출 촬영 시각(없으면 NaN)
+#   .idx = 프레임마다 <QdQ> (.seg 안 위치, 수신 시각, 송출 순번) -> 시각으로 바로 찾아가기
+# - 추가만 하는 파일이라 서버가 죽어도 마지막 레코드만 잘림 (읽을 때 잘린 레코드는 무시,
+#   .idx가 없거나 짧으면 .seg를 처음부터 읽음)
+# - 회전: RECORD_SEGMENT_MB 또는 RECORD_SEGMENT_SECONDS를 넘으면 새 세그먼트
+# - 보관: 회전할 때마다 카메라별로 RECORD_RETENTION_HOURS보다 오래됐거나 RECORD_MAX_GB를 넘는
+#         오래된 세그먼트부터 삭제
+# =========================================================
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RECORD_CAMERAS = os.getenv("RECORD_CAMERAS", "")
+RECORD_DIR = os.getenv("RECORD_DIR", os.path.join(BASE_DIR, "recordings"))
+RECORD_SEGMENT_MB = float(os.getenv("RECORD_SEGMENT_MB", 256))
+RECORD_SEGMENT_SECONDS = float(os.getenv("RECORD_SEGMENT_SECONDS", 300))
+RECORD_RETENTION_HOURS = float(os.getenv("RECORD_RETENTION_HOURS", 24))
+RECORD_MAX_GB = float(os.getenv("RECORD_MAX_GB", 20))     # 카메라당 최대 용량
+RECORD_QUEUE_SIZE = 600                                    # 기록 대기 최대 프레임 수 (카메라 전체)
+RECORD_FLUSH_SECONDS = 1.0                                 # 이 간격으로 디스크에 flush
+
+SEGMENT_MAGIC = b"FREC"
+SEGMENT_VERSION = 1
+NO_SEQ = 0xFFFFFFFFFFFFFFFF
+
+_SEGMENT_HEADER = struct.Struct("<4sBBHd")
+_RECORD = struct.Struct("<IQdd")
+_INDEX = struct.Struct("<QdQ")
+_SEGMENT_NAME = re.compile(r"^(\d{8}_\d{6})_(\d{6})\.seg$")
+
+
+def parse_cameras(spec, available):
+    """ "all" / "1,2" -> 녹화할 카메라 번호 목록 (등록되지 않은 번호는 무시) """
+    spec = (spec or "").strip().lower()
+    if not spec or spec in ("0", "off", "none"):
+        return []
+    if spec == "all":
+        return sorted(available)
+    wanted = {int(part) for part in spec.split(",") if part.strip()}
+    return sorted(wanted & set(available))
+
+
+def camera_dir(directory, camera_index):
+    return os.path.join(directory, f"cam{camera_index}")
+
+
+def _file_size(path):
+    """ 파일 크기 (그 사이 지워졌으면 None) """
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return None
+
+
+def list_segments(directory, camera_index):
+    """ 카메라의 세그먼트 파일 경로 목록 (오래된 순) """
+    path = camera_dir(directory, camera_index)
+    if not os.path.isdir(path):
+        return []
+    names = sorted(name for name in os.listdir(path) if _SEGMENT_NAME.match(name))
+    return [os.path.join(path, name) for name in names]
+
+
+class _SegmentWriter:
+    """ 카메라 1대의 현재 세그먼트 (기록 스레드에서만 사용) """
+    def __init__(self, directory, camera_index, max_bytes, max_seconds, retention_seconds, max_total_bytes):
+        self.camera_index = camera_index
+        self.directory = camera_dir(directory, camera_index)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.retention_seconds = retention_seconds
+        self.max_total_bytes = max_total_bytes
+        self.seg = None
+        self.idx = None
+        self.path = None
+        self.size = 0
+        self.opened_at = 0.0
+        self.frames = 0
+        self.segments_written = 0
+        self.deleted = 0
+
+        labels = {"camera": str(camera_index)}
+        self.m_frames = REGISTRY.counter("recorder_frames_total", "녹화한 송출 프레임 수", **labels)
+        self.m_bytes = REGISTRY.counter("recorder_bytes_total", "녹화한 데이터 크기(바이트)", **labels)
+        self.m_disk = REGISTRY.gauge("recorder_disk_bytes", "카메라별 녹화 파일 전체 크기(바이트)", **labels)
+        os.makedirs(self.directory, exist_ok=True)
+        existing = list_segments(os.path.dirname(self.directory), camera_index)
+        self.m_disk.set(sum(_file_size(p) or 0 for p in existing))
+        # 세그먼트 번호는 재시작해도 이어서 (같은 초에 다시 켜도 파일 이름이 겹치지 않음)
+        if existing:
+            self.segments_written = int(_SEGMENT_NAME.match(os.path.basename(existing[-1])).group(2))
+
+    def _open(self, now):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(now))
+        self.segments_written += 1
+        self.path = os.path.join(self.directory, f"{stamp}_{self.segments_written:06d}.seg")
+        self.seg = open(self.path, "xb")
+        self.idx = open(self.path[:-4] + ".idx", "wb")
+        self.seg.write(_SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, 0, self.camera_index, now))
+        self.size = _SEGMENT_HEADER.size
+        self.opened_at = now
+        self.m_disk.inc(_SEGMENT_HEADER.size)
+        print(f"🎬 [Recorder] 카메라 {self.camera_index} 새 세그먼트: {os.path.basename(self.path)}")
+
+    def close(self):
+        if self.seg is not None:
+            self.seg.close()
+            self.idx.close()
+            self.seg = self.idx = None
+
+    def write(self, raw, seq, capture_ts, received_ts):
+        if self.seg is not None and (self.size >= self.max_bytes or received_ts - self.opened_at >= self.max_seconds):
+            self.close()
+            self.apply_retention()
+        if self.seg is None:
+            self._open(received_ts)
+
+        offset = self.size
+        self.seg.write(_RECORD.pack(len(raw), NO_SEQ if seq is None else seq, received_ts,
+                                    math.nan if capture_ts is None else capture_ts))
+        self.seg.write(raw)
+        self.idx.write(_INDEX.pack(offset, received_ts, NO_SEQ if seq is None else seq))
+        written = _RECORD.size + len(raw)
+        self.size += written
+        self.frames += 1
+        self.m_frames.inc()
+        self.m_bytes.inc(written)
+        self.m_disk.inc(written)
+
+    def flush(self):
+        if self.seg is not None:
+            self.seg.flush()
+            self.idx.flush()
+
+    def apply_retention(self, now=None):
+        """ 오래된 세그먼트 삭제 (보관 시간 초과 또는 카메라별 용량 초과) - 기록 중인 세그먼트는 제외 """
+        now = now if now is not None else time.time()
+        current = self.path if self.seg is not None else None
+        segments = [p for p in list_segments(os.path.dirname(self.directory), self.camera_index) if p != current]
+        # 목록을 만든 뒤 지워진 파일은 건너뜀 (수동 정리 등)
+        sizes = {p: _file_size(p) for p in segments}
+        segments = [p for p in segments if sizes[p] is not None]
+        total = sum(sizes[p] for p in segments) + (self.size if current else 0)
+        for path in segments:
+            try:
+                expired = now - os.path.getmtime(path) > self.retention_seconds
+            except FileNotFoundError:
+                total -= sizes[path]
+                continue
+            if not expired and total <= self.max_total_bytes:
+                break
+            for victim in (path, path[:-4] + ".idx"):
+                try:
+                    os.remove(victim)
+                except FileNotFoundError:
+                    pass
+            total -= sizes[path]
+            self.deleted += 1
+            print(f"🧹 [Recorder] 카메라 {self.camera_index} 세그먼트 삭제: {os.path.basename(path)}")
+        self.m_disk.set(total)
+
+    def stats(self):
+        return {
+            "camera": self.camera_index,
+            "frames": self.frames,
+            "current_segment": os.path.basename(self.path) if self.seg is not None else None,
+            "current_bytes": self.size if self.seg is not None else 0,
+            "disk_bytes": self.m_disk.value,
+            "segments": len(list_segments(os.path.dirname(self.directory), self.camera_index)),
+            "deleted_segments": self.deleted,
+        }
+
+
+class FrameRecorder:
+    """
+    송출 프레임 녹화기 (여러 카메라, 기록 스레드 1개)
+    append()는 송출 루프(이벤트 루프)에서 호출 -> 큐에 넣기만 하고 바로 반환
+    attach()/detach()로 이 워커가 수집 중인 카메라만 기록 (카메라별 기록기는 기록 스레드에서 생성)
+    """
+    def __init__(self, cameras: Iterable[int], directory=RECORD_DIR, segment_mb=RECORD_SEGMENT_MB,
+                 segment_seconds=RECORD_SEGMENT_SECONDS, retention_hours=RECORD_RETENTION_HOURS,
+                 max_gb=RECORD_MAX_GB, queue_size=RECORD_QUEUE_SIZE):
+        self.directory = directory
+        self.cameras = set(cameras)                     # 녹화 대상 카메라
+        self.ingesting = set()                          # 이 워커가 수집 중인 녹화 대상 카메라
+        self._writer_args = (int(segment_mb * 1024 * 1024), segment_seconds,
+                             retention_hours * 3600, int(max_gb * 1024 ** 3))
+        self.writers: Dict[int, _SegmentWriter] = {}    # 기록 스레드에서만 추가/제거
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.m_dropped = {idx: REGISTRY.counter("recorder_dropped_total", "기록이 밀려 버린 녹화 프레임 수",
+                                                camera=str(idx))
+                          for idx in self.cameras}
+        self.thread = None
+
+    @classmethod
+    def from_env(cls, available) -> Optional["FrameRecorder"]:
+        """ RECORD_CAMERAS 설정이 없으면 None (녹화 꺼짐) """
+        cameras = parse_cameras(RECORD_CAMERAS, available)
+        return cls(cameras) if cameras else None
+
+    def attach(self, camera_index):
+        """ 이 워커가 카메라 수집을 시작함 (수집 담당 락을 잡은 뒤 호출) """
+        if camera_index not in self.cameras:
+            return
+        self.ingesting.add(camera_index)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+            self.thread.start()
+            print(f"🎬 [Recorder] 녹화 시작 (PID {os.getpid()}) -> {self.directory}")
+
+    def detach(self, camera_index):
+        """ 수집 종료 -> 남은 프레임까지 쓰고 세그먼트를 닫음 (다른 워커가 이어받아도 파일이 겹치지 않음) """
+        if camera_index not in self.ingesting:
+            return
+        self.ingesting.discard(camera_index)
+        self.queue.put((camera_index, None))   # 기록 스레드가 순서대로 처리 (대기열이 차 있으면 잠깐 기다림)
+
+    def _writer(self, camera_index):
+        writer = self.writers.get(camera_index)
+        if writer is None:
+            writer = _SegmentWriter(self.directory, camera_index, *self._writer_args)
+            writer.apply_retention()
+            self.writers[camera_index] = writer
+        return writer
+
+    def append(self, camera_index, raw, meta):
+        """ 수신 데이터(헤더 포함 원본)와 FrameMeta를 기록 대기열에 넣음 """
+        if camera_index not in self.ingesting:
+            return
+        try:
+            self.queue.put_nowait((camera_index, bytes(raw), meta.seq, meta.capture_ts, time.time()))
+        except queue.Full:
+            self.m_dropped[camera_index].inc()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=RECORD_FLUSH_SECONDS)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if len(item) == 2:
+                writer = self.writers.pop(item[0], None)
+                if writer is not None:
+                    writer.close()
+            elif item:
+                camera_index, raw, seq, capture_ts, received_ts = item
+                try:
+                    self._writer(camera_index).write(raw, seq, capture_ts, received_ts)
+                except OSError as e:
+                    self.m_dropped[camera_index].inc()
+                    print(f"❌ [Recorder] 카메라 {camera_index} 기록 실패: {e}")
+            if time.monotonic() - last_flush >= RECORD_FLUSH_SECONDS:
+                for writer in list(self.writers.values()):
+                    writer.flush()
+                last_flush = time.monotonic()
+        for writer in self.writers.values():
+            writer.close()
+
+    def close(self):
+        """ 대기열에 남은 프레임까지 기록하고 종료 """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join(timeout=10)
+        print("🎬 [Recorder] 녹화 종료")
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "directory": self.directory,
+            "queued": self.queue.qsize(),
+            "ingesting": sorted(self.ingesting),
+            "cameras": [dict(writer.stats(), dropped=self.m_dropped[idx].value)
+                        for idx, writer in list(self.writers.items())],
+        }
+
+
+# --- [녹화 읽기] ---
+
+class RecordedFrame:
+    __slots__ = ("raw", "seq", "capture_ts", "received_ts")
+
+    def __init__(self, raw, seq, capture_ts, received_ts):
+        self.raw = raw                  # /ws/source로 받은 그대로의 데이터 (헤더 포함)
+        self.seq = seq                  # 송출 순번 (헤더 없는 JPEG면 None)
+        self.capture_ts = capture_ts    # 송출 촬영 시각 (없으면 None)
+        self.received_ts = received_ts  # 서버 수신 시각 (time.time)
+
+
+def read_index(seg_path):
+    """ .idx -> [(위치, 수신 시각, 순번)] (없으면 빈 목록) """
+    idx_path = seg_path[:-4] + ".idx"
+    if not os.path.exists(idx_path):
+        return []
+    with open(idx_path, "rb") as f:
+        data = f.read()
+    usable = len(data) - len(data) % _INDEX.size
+    return list(_INDEX.iter_unpack(data[:usable]))
+
+
+def read_segment(seg_path, start=None, end=None):
+    """ 세그먼트 1개의 프레임을 순서대로 (start/end = 수신 시각 범위, time.time 기준) """
+    with open(seg_path, "rb") as f:
+        header = f.read(_SEGMENT_HEADER.size)
+        if len(header) < _SEGMENT_HEADER.size:
+            return
+        magic, version, _, _, _ = _SEGMENT_HEADER.unpack(header)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            raise ValueError(f"녹화 세그먼트 형식이 아닙니다: {seg_path}")
+
+        if start is not None:
+            # 인덱스로 시작 위치까지 바로 이동 (인덱스가 없으면 처음부터 읽으며 건너뜀)
+            index = read_index(seg_path)
+            pos = bisect.bisect_left([entry[1] for entry in index], start)
+            if pos > 0:
+                f.seek(index[min(pos, len(index) - 1)][0])
+
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                return
+            length, seq, received_ts, capture_ts = _RECORD.unpack(head)
+            raw = f.read(length)
+            if len(raw) < length:
+                return   # 기록 중 종료로 잘린 마지막 레코드
+            if start is not None and received_ts < start:
+                continue
+            if end is not None and received_ts > end:
+                return
+            yield RecordedFrame(raw, None if seq == NO_SEQ else seq,
+                                None if math.isnan(capture_ts) else capture_ts, received_ts)
+
+
+def read_recording(directory, camera_index, start=None, end=None):
+    """ 카메라의 전체 녹화(세그먼트 순서대로)에서 [start, end] 구간 프레임 """
+    segments = list_segments(directory, camera_index)
+    for i, path in enumerate(segments):
+        if start is not None and i + 1 < len(segments):
+            # 다음 세그먼트가 start 이전에 시작하면 이 세그먼트는 통째로 건너뜀
+            with open(segments[i + 1], "rb") as f:
+                head = f.read(_SEGMENT_HEADER.size)
+            if len(head) == _SEGMENT_HEADER.size and _SEGMENT_HEADER.unpack(head)[4] <= start:
+                continue
+        for frame in read_segment(path, start, end):
+            yield frame
+        if end is not None and segments[i + 1:]:
+            with open(segments[i + 1], "rb") as f:
+                head = f.read(_SEGMENT_HEADER.size)
+            if len(head) == _SEGMENT_HEADER.size and _SEGMENT_HEADER.unpack(head)[4] > end:
+                return
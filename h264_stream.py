@@ -0,0 +1,208 @@
+import os
+import time
+import asyncio
+import itertools
+from collections import deque
+from fractions import Fraction
+
+import cv2
+
+from metrics import REGISTRY
+from view_tiers import VIEW_TIERS
+
+# PyAV(libx264)는 선택 설치 (없으면 H.264 시청 모드만 비활성화, JPEG 모드는 그대로 동작)
+try:
+    import av
+except ImportError:
+    av = None
+
+# =========================================================
+# [H.264 시청 모드] /api/view/{camera_index}?codec=h264
+# - 카메라당 1번만 인코딩 (libx264, zerolatency -> B프레임/룩어헤드 없음)
+# - 웹소켓 메시지 1개 = H.264 Annex-B 액세스 유닛 1개 (프레임 1장)
+#   키프레임마다 SPS/PPS 포함 -> 브라우저는 WebCodecs(VideoDecoder) 또는 jmuxer로 바로 재생
+# - 새 시청자가 들어오면 다음 프레임을 키프레임으로 강제, 시청자는 키프레임부터 받음
+# - JPEG와 달리 중간 프레임을 버리면 화면이 깨지므로, 밀리면 다음 키프레임까지 건너뜀
+# =========================================================
+
+H264_AVAILABLE = av is not None
+H264_TIER = os.getenv("H264_TIER", "high")          # 해상도는 이 화질 단계의 배율을 따름
+H264_FPS = 30
+H264_BITRATE = int(os.getenv("H264_BITRATE", 1_500_000))
+H264_GOP = 60                                        # 키프레임 간격(프레임) -> 최대 재동기 대기 시간
+H264_PRESET = os.getenv("H264_PRESET", "ultrafast")
+H264_QUEUE_SIZE = 15                                 # 시청자별 전송 대기 최대 프레임 수
+
+_viewer_ids = itertools.count(1)
+
+
+class H264Encoder:
+    """ 카메라 1대분 H.264 인코더 (송출 루프에서 순서대로 호출) """
+    def __init__(self, camera_index):
+        self.camera_index = camera_index
+        self.ctx = None
+        self.size = None
+        self.pts = 0
+        self.seq = 0
+        self.force_key = True
+        self.encode_time = REGISTRY.histogram("h264_encode_seconds", "H.264 프레임 인코딩 시간", camera=str(camera_index))
+
+    def _open(self, width, height):
+        ctx = av.CodecContext.create("libx264", "w")
+        ctx.width = width
+        ctx.height = height
+        ctx.pix_fmt = "yuv420p"
+        ctx.time_base = Fraction(1, H264_FPS)
+        ctx.framerate = Fraction(H264_FPS, 1)
+        ctx.bit_rate = H264_BITRATE
+        ctx.gop_size = H264_GOP
+        ctx.max_b_frames = 0
+        ctx.options = {
+            "preset": H264_PRESET,
+            "tune": "zerolatency",
+            "x264-params": "repeat-headers=1:scenecut=0",
+        }
+        ctx.open()
+        self.ctx = ctx
+        self.size = (width, height)
+        self.pts = 0
+        self.force_key = True
+        print(f"🎞️ [H264] 카메라 {self.camera_index} 인코더 시작 ({width}x{height}, {H264_BITRATE // 1000}kbps)")
+
+    def request_keyframe(self):
+        self.force_key = True
+
+    def encode(self, img, source_scale):
+        """ 프레임(디코딩 배율 source_scale) -> [(seq, Annex-B 바이트, 키프레임 여부)] """
+        started = time.perf_counter()
+        h, w = img.shape[:2]
+        factor = VIEW_TIERS[H264_TIER]["scale"] / source_scale
+        # 카메라 원본 기준 고정 해상도 (디코딩 배율이 바뀌어도 스트림 해상도는 그대로), 짝수 크기
+        width = max(2, int(w * factor) // 2 * 2)
+        height = max(2, int(h * factor) // 2 * 2)
+        if (width, height) != (w, h):
+            img = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+        if self.size != (width, height):
+            self._open(width, height)
+
+        frame = av.VideoFrame.from_ndarray(img, format="bgr24")
+        frame.pts = self.pts
+        self.pts += 1
+        if self.force_key:
+            frame.pict_type = av.video.frame.PictureType.I
+            self.force_key = False
+
+        out = []
+        for packet in self.ctx.encode(frame):
+            self.seq += 1
+            out.append((self.seq, bytes(packet), packet.is_keyframe))
+        self.encode_time.observe(time.perf_counter() - started)
+        return out
+
+
+class H264ViewerSession:
+    """ H.264 시청자 1명: 순서 보장 큐 + 끊기면 다음 키프레임부터 재개 """
+    tier = "h264"
+    adaptive = False
+
+    def __init__(self, websocket, camera_index, on_need_keyframe=None):
+        self.websocket = websocket
+        self.camera_index = camera_index
+        self.client_id = f"cam{camera_index}-h{next(_viewer_ids)}"
+        self.on_need_keyframe = on_need_keyframe
+        self.queue = deque()
+        self._ready = asyncio.Event()
+        self._task = None
+        self.waiting_key = True
+        self.last_seq = None
+        self.closed = False   # 전송 실패 (viewer_endpoint 정리 대기)
+        self.lag = 0.0        # EWMA, 큐에 들어온 때 ~ 전송 완료(초)
+        self.sent = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.m_lag = REGISTRY.gauge("viewer_lag_seconds", "시청자별 평균 전송 지연",
+                                    client=self.client_id, camera=str(camera_index))
+        self.m_dropped = REGISTRY.counter("viewer_dropped_frames_total", "전송이 밀려 건너뛴 프레임 수",
+                                          client=self.client_id, camera=str(camera_index))
+        self.m_e2e = REGISTRY.histogram("frame_e2e_seconds", "촬영 ~ 시청자 전송 완료 (최소 전송 시간 제외)",
+                                        camera=str(camera_index))
+        self.m_sent = REGISTRY.counter("viewer_frames_sent_total", "시청자에게 보낸 프레임 수 (카메라별 합계)",
+                                       camera=str(camera_index))
+
+    def _resync(self):
+        """ 프레임이 빠졌으면 다음 키프레임까지 버림 """
+        self.waiting_key = True
+        self.queue.clear()
+        self.resyncs += 1
+        if self.on_need_keyframe is not None:
+            self.on_need_keyframe()
+
+    def offer(self, seq, data, is_key, queued_at, capture_ts=None):
+        """ queued_at: 서버가 송출 큐에 넣은 시각 (지연 기준), capture_ts: 촬영 시각 (e2e 지표 전용) """
+        if self.closed:
+            return
+        if self.last_seq is not None and seq != self.last_seq + 1 and not self.waiting_key:
+            self._resync()
+        self.last_seq = seq
+        if self.waiting_key and not is_key:
+            self.dropped += 1
+            self.m_dropped.inc()
+            return
+        self.waiting_key = False
+        if len(self.queue) >= H264_QUEUE_SIZE:
+            self.dropped += len(self.queue) + 1
+            self.m_dropped.inc(len(self.queue) + 1)
+            self._resync()
+            return
+        self.queue.append((data, queued_at, capture_ts))
+        self._ready.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._send_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        REGISTRY.remove(self.m_lag)
+        REGISTRY.remove(self.m_dropped)
+
+    async def _send_loop(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self.queue:
+                data, queued_at, capture_ts = self.queue.popleft()
+                try:
+                    await self.websocket.send_bytes(data)
+                except Exception as e:
+                    # 더 받지 않고 웹소켓을 닫음 (receive가 끝나면서 viewer_endpoint가 disconnect 처리)
+                    self.closed = True
+                    self.queue.clear()
+                    print(f"⚠️ [View {self.client_id}] 전송 실패로 세션 종료: {e!r}")
+                    try:
+                        await self.websocket.close(code=1011)
+                    except Exception:
+                        pass
+                    return
+                done = time.monotonic()
+                self.sent += 1
+                self.m_sent.inc()
+                lag = done - queued_at
+                self.lag = lag if self.sent == 1 else 0.8 * self.lag + 0.2 * lag
+                self.m_lag.set(self.lag)
+                if capture_ts is not None:
+                    self.m_e2e.observe(max(0.0, done - capture_ts))
+
+    def stats(self):
+        return {
+            "client": self.client_id,
+            "camera": self.camera_index,
+            "tier": self.tier,
+            "codec": "h264",
+            "lag_ms": round(self.lag * 1000, 1),
+            "queued": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "resyncs": self.resyncs,
+            "closed": self.closed,
+        }
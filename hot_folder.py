@@ -0,0 +1,299 @@
+import os
+import re
+import time
+import errno
+import ctypes
+import ctypes.util
+import shutil
+import struct
+import asyncio
+import datetime
+from collections import deque
+
+from metrics import REGISTRY
+from resource_scheduler import scheduler, INSPECTION_WORKERS
+from vali import config as cfg
+from vali.run_inspection import inspect_pair
+
+# =========================================================
+# [핫 폴더 검사] 자체 촬영 프로그램이 있는 라인은 웹소켓 대신 폴더에 사진을 떨어뜨려 검사를 요청합니다.
+# - 켜기: HOT_FOLDER=1 (기본 꺼짐), 폴더는 vali/config.py의 WATCH_DIR / PROCESSED_DIR
+# - 파일 이름 규칙: {제품키}_top.jpg + {제품키}_bottom.jpg (HOT_FOLDER_PATTERN 정규식으로 변경 가능,
+#   그룹 part = 제품키, role = top/bottom)
+# - 감시: 리눅스 inotify (IN_CLOSE_WRITE, IN_MOVED_TO) -> 다 쓰인 파일만 이벤트로 받음 (주기적 목록 조회 없음)
+#   촬영 프로그램은 파일을 다 쓰고 닫거나, 임시 이름으로 쓴 뒤 rename 하면 됨
+#   서버 시작 시 / 커널 이벤트 큐가 넘쳤을 때만 폴더를 한 번 훑어서 놓친 파일을 줍습니다.
+# - 짝이 맞으면 검사 대기열 -> HOT_FOLDER_WORKERS개가 전용 검사 실행기에서 동시에 처리 (나머지는 대기)
+#   대기열은 HOT_FOLDER_QUEUE개까지: 가득 차면 감시 쪽이 멈춰서 기다림 (이벤트는 커널 큐에, 파일은 폴더에 남음
+#   -> 커널 큐가 넘치면 나중에 폴더를 다시 훑음, 밀린 파일이 아무리 많아도 서버 메모리는 일정)
+# - 판정 행(Measurements)에는 part_id = 제품키, station_id = HOT_FOLDER_STATION 으로 저장
+#   -> /api/hotfolder 최근 목록의 measure_id / 옮긴 파일 경로와 함께 DB 행 <-> 사진 파일을 추적
+# - 끝난 사진은 PROCESSED_DIR/{날짜}/ 로 이동 (같은 파일시스템이면 rename = 원자적)
+#   검사 실패는 PROCESSED_DIR/failed/, HOT_FOLDER_PAIR_TIMEOUT 안에 짝이 안 오면 PROCESSED_DIR/unpaired/
+# =========================================================
+
+HOT_FOLDER_ENABLED = os.getenv("HOT_FOLDER", "0") == "1"
+HOT_FOLDER_PATTERN = os.getenv("HOT_FOLDER_PATTERN", r"^(?P<part>.+)_(?P<role>top|bottom)\.(?:jpe?g|png|bmp)$")
+HOT_FOLDER_WORKERS = int(os.getenv("HOT_FOLDER_WORKERS", INSPECTION_WORKERS))
+HOT_FOLDER_STATION = os.getenv("HOT_FOLDER_STATION", "hotfolder")            # 판정 행의 station_id
+HOT_FOLDER_QUEUE = int(os.getenv("HOT_FOLDER_QUEUE", 32))                      # 검사 대기열 최대 제품 수
+HOT_FOLDER_PAIR_TIMEOUT = float(os.getenv("HOT_FOLDER_PAIR_TIMEOUT", 60))   # 짝 대기 최대 시간(초)
+HOT_FOLDER_RECENT = 100
+
+# --- [inotify] (linux/inotify.h) ---
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")   # wd, mask, cookie, len (+ 이름 len 바이트)
+
+
+class Inotify:
+    """ 폴더 1개 inotify 감시 (표준 라이브러리 ctypes로 libc 직접 호출 -> 추가 패키지 없음) """
+    def __init__(self, path, mask=IN_CLOSE_WRITE | IN_MOVED_TO):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify를 지원하지 않는 운영체제입니다.")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 실패")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch 실패: {path}")
+
+    def read(self):
+        """ 쌓인 이벤트 -> [(mask, 파일 이름)] (없으면 빈 목록) """
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events, pos = [], 0
+        while pos + _EVENT.size <= len(data):
+            _, mask, _, size = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = data[pos:pos + size].rstrip(b"\0")
+            pos += size
+            events.append((mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def move_atomic(src, dest_dir):
+    """ src -> dest_dir (같은 이름이 있으면 번호를 붙임), 다른 파일시스템이면 복사 후 rename -> 최종 경로 """
+    os.makedirs(dest_dir, exist_ok=True)
+    name, ext = os.path.splitext(os.path.basename(src))
+    dest = os.path.join(dest_dir, name + ext)
+    n = 1
+    while os.path.exists(dest):
+        dest = os.path.join(dest_dir, f"{name}.{n}{ext}")
+        n += 1
+    try:
+        os.replace(src, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # 다른 디스크: 대상 폴더에 임시 이름으로 복사 -> rename (반쯤 복사된 파일이 보이지 않음)
+        tmp = dest + ".part"
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dest)
+        os.remove(src)
+    return dest
+
+
+class HotFolderWatcher:
+    def __init__(self, watch_dir=cfg.WATCH_DIR, processed_dir=cfg.PROCESSED_DIR, pattern=HOT_FOLDER_PATTERN,
+                 workers=HOT_FOLDER_WORKERS, pair_timeout=HOT_FOLDER_PAIR_TIMEOUT, queue_size=HOT_FOLDER_QUEUE,
+                 station_id=HOT_FOLDER_STATION):
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.processed_dir = os.path.abspath(processed_dir)
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.workers = max(1, workers)
+        self.pair_timeout = pair_timeout
+        self.station_id = station_id
+        self.inotify = None
+        self.loop = None
+        self.pending = {}          # 제품키 -> {"top": 경로, "bottom": 경로, "since": 처음 본 시각}
+        self.claimed = set()       # 검사 대기/진행 중인 경로 (중복 이벤트 무시)
+        self.queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.stalled = False       # 대기열이 가득 차 감시가 멈춘 상태 (짝 대기 시간 계산도 멈춤)
+        self._readable = asyncio.Event()
+        self.inflight = 0
+        self.recent = deque(maxlen=HOT_FOLDER_RECENT)
+        self.tasks = []
+
+        self.m_files = REGISTRY.counter("hotfolder_files_total", "핫 폴더에서 받은 사진 수")
+        self.m_pairs = {res: REGISTRY.counter("hotfolder_pairs_total", "핫 폴더 검사 결과 수", result=res)
+                        for res in ("OK", "NG", "ERROR", "UNPAIRED")}
+        self.m_queued = REGISTRY.gauge("hotfolder_queued", "짝이 맞아 검사를 기다리는 제품 수")
+        self.m_latency = REGISTRY.histogram("hotfolder_latency_seconds", "짝 완성 ~ 검사/이동 완료",
+                                            buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        os.makedirs(self.watch_dir, exist_ok=True)
+        os.makedirs(self.processed_dir, exist_ok=True)
+        try:
+            self.inotify = Inotify(self.watch_dir)
+        except OSError as e:
+            print(f"❌ [HotFolder] 폴더 감시를 시작할 수 없습니다: {e}")
+            return False
+        self.tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._watch()))
+        self.tasks.append(asyncio.create_task(self._expire_unpaired()))
+        print(f"📂 [HotFolder] 감시 시작: {self.watch_dir} -> {self.processed_dir} (동시 검사 {self.workers}개)")
+        return True
+
+    def stop(self):
+        if self.inotify is not None:
+            self.loop.remove_reader(self.inotify.fd)
+            self.inotify.close()
+            self.inotify = None
+        for task in self.tasks:
+            task.cancel()
+
+    # --- 파일 수집 ---
+    def _on_readable(self):
+        # add_reader는 읽을 게 남아 있으면 계속 불림 -> 이벤트를 다 처리할 때까지 감시를 뗌
+        self.loop.remove_reader(self.inotify.fd)
+        self._readable.set()
+
+    async def _watch(self):
+        """ inotify 이벤트 -> 짝 맞추기 -> 검사 대기열 (대기열이 차면 여기서 기다림) """
+        await self.rescan()   # 서버가 꺼져 있는 동안 들어온 파일
+        while self.inotify is not None:
+            self.loop.add_reader(self.inotify.fd, self._on_readable)
+            await self._readable.wait()
+            self._readable.clear()
+            while self.inotify is not None:
+                events = self.inotify.read()
+                if not events:
+                    break
+                for mask, name in events:
+                    if mask & IN_Q_OVERFLOW:
+                        print("⚠️ [HotFolder] 이벤트 큐 초과 - 폴더를 다시 훑습니다.")
+                        await self.rescan()
+                    elif name and not mask & (IN_ISDIR | IN_IGNORED):
+                        await self.add_file(os.path.join(self.watch_dir, name))
+
+    def _list_files(self):
+        return [entry.path for entry in sorted(os.scandir(self.watch_dir), key=lambda e: e.name) if entry.is_file()]
+
+    async def rescan(self):
+        for path in await scheduler.run("io", self._list_files):
+            await self.add_file(path)
+
+    async def add_file(self, path):
+        m = self.pattern.match(os.path.basename(path))
+        if not m or path in self.claimed or not os.path.exists(path):
+            return   # 규칙에 안 맞는 파일(임시 파일 등)/이미 처리 중/이미 옮겨짐
+        self.m_files.inc()
+        part, role = m.group("part"), m.group("role").lower()
+        entry = self.pending.setdefault(part, {"since": time.monotonic()})
+        entry[role] = path
+        if "top" in entry and "bottom" in entry:
+            del self.pending[part]
+            self.claimed.update((entry["top"], entry["bottom"]))
+            item = (part, entry["top"], entry["bottom"], time.monotonic())
+            if self.queue.full():
+                # 검사가 밀림 -> 자리가 날 때까지 새 파일을 받지 않음 (멈춘 동안은 짝 대기 시간에서 뺌)
+                stalled_at = time.monotonic()
+                self.stalled = True
+                try:
+                    await self.queue.put(item)
+                finally:
+                    self.stalled = False
+                paused = time.monotonic() - stalled_at
+                for waiting in self.pending.values():
+                    waiting["since"] += paused
+            else:
+                self.queue.put_nowait(item)
+            self.m_queued.set(self.queue.qsize())
+
+    async def _expire_unpaired(self):
+        """ 짝이 오지 않는 사진은 PROCESSED_DIR/unpaired/ 로 치움 """
+        while True:
+            await asyncio.sleep(max(1.0, self.pair_timeout / 4))
+            if self.stalled:
+                continue   # 짝 이벤트가 아직 커널 큐에 있을 수 있음
+            now = time.monotonic()
+            for part, entry in list(self.pending.items()):
+                if now - entry["since"] < self.pair_timeout:
+                    continue
+                del self.pending[part]
+                moved = []
+                for role in ("top", "bottom"):
+                    if role in entry and os.path.exists(entry[role]):
+                        moved.append(await scheduler.run("io", move_atomic, entry[role], os.path.join(self.processed_dir, "unpaired")))
+                self.m_pairs["UNPAIRED"].inc()
+                self._remember(part, "UNPAIRED", None, moved)
+                print(f"⚠️ [HotFolder] {part}: {self.pair_timeout:.0f}s 안에 짝이 오지 않아 unpaired로 이동")
+
+    # --- 검사 ---
+    async def _worker(self, worker_no):
+        while True:
+            part, top, bottom, paired_at = await self.queue.get()
+            self.m_queued.set(self.queue.qsize())
+            self.inflight += 1
+            try:
+                await self._inspect(part, top, bottom, paired_at)
+            except Exception as e:
+                print(f"❌ [HotFolder] {part} 처리 오류: {e}")
+            finally:
+                self.inflight -= 1
+                self.claimed.difference_update((top, bottom))
+
+    async def _inspect(self, part, top, bottom, paired_at):
+        try:
+            # 제품키/라인 ID를 판정 행에 같이 저장 (Measurements.part_id / station_id)
+            verdict = await scheduler.run_inspection(inspect_pair, top, bottom, part, self.station_id)
+        except Exception as e:
+            print(f"❌ [HotFolder] {part} 알고리즘 예외: {e}")
+            verdict = None
+        result = verdict["result"] if verdict else "ERROR"
+
+        day = datetime.datetime.now().strftime("%Y%m%d")
+        dest_dir = os.path.join(self.processed_dir, day if verdict else "failed")
+        moved = []
+        for path in (top, bottom):
+            moved.append(await scheduler.run("io", move_atomic, path, dest_dir))
+        self.m_pairs[result].inc()
+        self.m_latency.observe(time.monotonic() - paired_at)
+        self._remember(part, result, verdict, moved)
+        if verdict:
+            print(f"✅ [HotFolder] {part} -> {result} (ID: {verdict['measure_id']}, 코드: {verdict['fail_code']})")
+        else:
+            print(f"❌ [HotFolder] {part} 검사 실패 -> {dest_dir}")
+
+    def _remember(self, part, result, verdict, files=None):
+        self.recent.appendleft({
+            "part": part,
+            "result": result,
+            "measure_id": verdict["measure_id"] if verdict else None,
+            "fail_code": verdict["fail_code"] if verdict else None,
+            "files": files or [],
+            "at": datetime.datetime.now().isoformat(timespec="seconds"),
+        })
+
+    def status(self):
+        return {
+            "enabled": True,
+            "watching": self.inotify is not None,
+            "station_id": self.station_id,
+            "watch_dir": self.watch_dir,
+            "processed_dir": self.processed_dir,
+            "workers": self.workers,
+            "waiting_pair": len(self.pending),
+            "queued": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "stalled": self.stalled,
+            "inflight": self.inflight,
+            "results": {res: counter.value for res, counter in self.m_pairs.items()},
+            "latency": self.m_latency.snapshot(),
+            "recent": list(self.recent),
+        }
@@ -0,0 +1,315 @@
+import os
+import time
+import asyncio
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import cv2
+
+from frame_buffer import SETTLE_TIMEOUT
+from metrics import REGISTRY
+from mqtt_publisher import mqtt_publisher
+from resource_scheduler import scheduler
+from vali import config as cfg
+from vali.db_manager import save_trace
+from vali.run_inspection import inspect_pair
+from vali.trace_codec import encode_trace
+
+# 파이프라인 검사 설정
+MAX_INFLIGHT_INSPECTIONS = 2   # 촬영은 끝났고 계산 중인 제품의 최대 개수 (가득 차면 다음 CHECK는 자리가 날 때까지 대기)
+RECENT_RESULTS_SIZE = 100      # 제품 ID별 최근 판정 결과 보관 개수
+
+# 검사 단계별 소요 시간 (inspect_pair가 돌려주는 timings -> 히스토그램)
+INSPECTION_STAGES = ("init", "load_top", "ai_top", "calibrate", "analyze", "find_best_angle",
+                     "inspect", "ai_bottom", "save_images", "db_insert")
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+@dataclass
+class InspectionJob:
+    """ 촬영이 끝나 계산 대기/진행 중인 제품 1개 (part_id로 판정 결과를 연결) """
+    part_id: str
+    cam1_file: str
+    cam2_file: str
+    top_frame: Optional[dict] = None      # 촬영에 쓰인 프레임의 송출 정보 (송출 순번, 촬영 시각, 해상도)
+    bottom_frame: Optional[dict] = None
+    captured_at: float = field(default_factory=time.time)
+    verdict: Optional[dict] = None
+    cycle_started: float = 0.0            # CHECK 수신 시각 (time.monotonic, 타임라인 기준점)
+    marks: List[tuple] = field(default_factory=list)  # 기계 구간 [(이름, 시작, 끝)] (time.monotonic)
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+def _inspect_timed(cam1_file, cam2_file, part_id, station_id):
+    """ 검사 실행기 스레드에서 실제로 계산을 시작한 시각과 함께 실행 (실행기 대기 시간 분리용) """
+    started = time.monotonic()
+    return started, inspect_pair(cam1_file, cam2_file, part_id=part_id, station_id=station_id)
+
+
+def build_trace(job, compute_started, finished):
+    """
+    제품 1개의 단계 트리 (encode_trace 입력 형식, 오프셋은 CHECK 기준)
+    inspection
+      ├ mechanical : (hold) / shutter_up / settle_top / save_top / shutter_down / settle_bottom / save_bottom
+      │              hold = 계산 자리가 없어 CHECK를 붙잡아 둔 구간 (있을 때만)
+      ├ queue      : 촬영 완료 ~ 검사 실행기에서 계산 시작
+      └ compute    : inspect_pair 단계 (init, ai_top, find_best_angle, save_images, db_insert ...)
+    """
+    t0 = job.cycle_started
+    spans = [("inspection", None, 0.0, finished - t0),
+             ("mechanical", 0, 0.0, job.queued_at - t0)]
+    for name, start, end in job.marks:
+        spans.append((name, 1, start - t0, end - start))
+    spans.append(("queue", 0, job.queued_at - t0, compute_started - job.queued_at))
+    compute_idx = len(spans)
+    spans.append(("compute", 0, compute_started - t0, finished - compute_started))
+    for name, parent, start, duration in (job.verdict or {}).get("spans", []):
+        spans.append((name, compute_idx if parent is None else compute_idx + 1 + parent,
+                      compute_started - t0 + start, duration))
+    return spans
+
+
+class InspectionManager:
+    """
+    [파이프라인 검사]
+    셔터 동작 + 촬영(기계 구간)과 알고리즘 계산(연산 구간)을 분리합니다.
+    두 장을 찍는 즉시 기계 구간을 풀어 다음 CHECK를 받고, 계산은 백그라운드에서 진행합니다.
+    -> 라인 처리량이 (기계 + 계산)이 아니라 max(기계, 계산)으로 결정됩니다.
+
+    스테이션(라인)마다 하나씩 만들어지며, 자기 스테이션의 카메라/셔터 토픽만 사용합니다.
+    """
+    def __init__(self, station, temp_dir):
+        self.station = station
+        self.temp_dir = temp_dir
+        self.tag = f"[Inspect:{station.station_id}]"
+        self.is_inspecting = False
+        self.step = 0 # 0:대기 (is_inspecting이면 계산 자리 대기), 1:1차촬영대기, 2:2차촬영대기, 3:촬영 중 (늦게/중복으로 온 DONE 무시)
+        self.part_id = ""
+        self.cam1_file = ""
+        self.cam2_file = ""
+        self.top_frame = None
+        self.bottom_frame = None
+        self._part_seq = itertools.count(1)
+        self.inflight: Dict[str, InspectionJob] = {}            # 계산 중인 제품
+        self.results: "OrderedDict[str, InspectionJob]" = OrderedDict()  # 최근 판정 결과
+        self._tasks = set()
+        self._slot_freed = asyncio.Event()  # 계산이 끝나 자리가 났음 (대기 중인 CHECK 깨우기)
+        self._held_since = None             # 자리를 기다리는 CHECK의 수신 시각
+        self._cycle_started = 0.0
+        self._marks = []                 # 진행 중인 제품의 기계 구간 타임라인
+        self._shutter_sent = 0.0
+
+        sid = station.station_id
+        self.m_stage = {stage: REGISTRY.histogram("inspection_stage_seconds", "검사 알고리즘 단계별 소요 시간",
+                                                  buckets=STAGE_BUCKETS, station=sid, stage=stage)
+                        for stage in INSPECTION_STAGES}
+        self.m_mechanical = REGISTRY.histogram("inspection_cycle_seconds", "검사 구간별 소요 시간 (기계: CHECK ~ 2장 촬영, 계산: 알고리즘)",
+                                               buckets=STAGE_BUCKETS, station=sid, phase="mechanical")
+        self.m_compute = REGISTRY.histogram("inspection_cycle_seconds", "검사 구간별 소요 시간 (기계: CHECK ~ 2장 촬영, 계산: 알고리즘)",
+                                            buckets=STAGE_BUCKETS, station=sid, phase="compute")
+        self.m_settle = {role: REGISTRY.histogram("inspection_settle_seconds", "DONE 수신 ~ 안정 프레임 확보",
+                                                  station=sid, camera=role)
+                         for role in ("top", "bottom")}
+        self.m_results = {res: REGISTRY.counter("inspection_results_total", "검사 판정 수", station=sid, result=res)
+                          for res in ("OK", "NG", "ERROR")}
+        self.m_rejected = REGISTRY.counter("inspection_rejected_total", "촬영 진행 중에 들어와 거부한 CHECK 수", station=sid)
+        self.m_held = REGISTRY.histogram("inspection_check_hold_seconds", "계산 자리가 없어 CHECK를 붙잡아 둔 시간",
+                                         buckets=STAGE_BUCKETS, station=sid)
+
+    async def start_inspection(self):
+        if self.is_inspecting:
+            print(f"⚠️ {self.tag} 이미 검사가 진행 중입니다.")
+            self.m_rejected.inc()
+            return
+
+        # 제품별 상관 ID (촬영 파일명 + 판정 결과 연결용)
+        self.part_id = f"{time.strftime('%Y%m%d%H%M%S')}_{next(self._part_seq):04d}"
+        self.is_inspecting = True
+        self._cycle_started = time.monotonic()
+        self._marks = []
+
+        # 계산 중인 제품이 가득 차면 버리지 않고 자리가 날 때까지 셔터를 올리지 않음
+        # (셔터 시퀀스가 멈추므로 라인이 계산 속도에 맞춰 기다림 -> 검사 없이 지나가는 제품 없음)
+        if len(self.inflight) >= MAX_INFLIGHT_INSPECTIONS:
+            print(f"⏳ {self.tag} 계산 중인 제품이 {len(self.inflight)}개입니다. (최대 {MAX_INFLIGHT_INSPECTIONS}) "
+                  f"자리가 날 때까지 대기 (Part: {self.part_id})")
+            self._held_since = self._cycle_started
+            while len(self.inflight) >= MAX_INFLIGHT_INSPECTIONS:
+                self._slot_freed.clear()
+                await self._slot_freed.wait()
+            self.m_held.observe(time.monotonic() - self._held_since)
+            self._marks.append(("hold", self._held_since, time.monotonic()))
+            self._held_since = None
+
+        print(f"\n🚀 {self.tag} 정밀 검사 프로세스 시작! (Part: {self.part_id})")
+        self.step = 1
+        
+        print("   -> [Step 1] 셔터 UP 요청")
+        self.send_shutter("UP")
+        # 이제 UP_DONE이 올 때까지 대기
+
+    async def capture_settled(self, role, done_at):
+        """
+        DONE 이벤트(done_at) 이후 처음으로 흔들림이 멈춘 프레임(TimedFrame)을 기다려 반환합니다.
+        (고정 대기 대신 실제 영상이 안정되는 즉시 촬영, 이벤트 이전 프레임은 절대 사용 안 함)
+        """
+        shot, stable = await self.station.cameras[role].ring.wait_stable(done_at, SETTLE_TIMEOUT)
+        if shot is None:
+            return None
+        camera_index = self.station.cameras[role].index
+        wait_ms = (shot.ts - done_at) * 1000
+        self.m_settle[role].observe(max(0.0, shot.ts - done_at))
+        source_seq = shot.meta.get("seq") if shot.meta else None
+        if source_seq is not None:
+            print(f"      🎞️ Cam {camera_index} 송출 프레임 #{source_seq} 사용")
+        if stable:
+            print(f"      ⏱️ Cam {camera_index} 안정 프레임 확보 ({wait_ms:.0f}ms, diff={shot.diff:.2f})")
+        else:
+            print(f"      ⚠️ Cam {camera_index} {SETTLE_TIMEOUT}s 안에 안정되지 않음 -> 최신 프레임 사용 ({wait_ms:.0f}ms)")
+        return shot
+
+    @staticmethod
+    def save_shot(shot, path):
+        """ 촬영 프레임 저장 (원본 JPEG가 있으면 재인코딩 없이 그대로 기록) """
+        if shot.jpeg is not None:
+            with open(path, "wb") as f:
+                f.write(shot.jpeg)
+        else:
+            cv2.imwrite(path, shot.frame)
+
+    async def on_up_done(self, done_at=None):
+        if not self.is_inspecting or self.step != 1: return
+        self.step = 3
+
+        print(f"   -> [Step 2] 셔터 닫힘 확인. Camera {self.station.top.index} 촬영...")
+        done_at = done_at if done_at is not None else time.monotonic()
+        self._marks.append(("shutter_up", self._shutter_sent, done_at))
+        # 물리적 진동 안정화 대기 (프레임 간 차이로 판단)
+        shot = await self.capture_settled("top", done_at)
+        self._marks.append(("settle_top", done_at, time.monotonic()))
+        
+        # Camera 1 안정 프레임 캡처 및 저장
+        if shot is not None:
+            filename = f"ins_{self.station.station_id}_cam{self.station.top.index}_{self.part_id}.jpg"
+            self.cam1_file = os.path.join(self.temp_dir, filename)
+            save_started = time.monotonic()
+            await scheduler.run("io", self.save_shot, shot, self.cam1_file)
+            self._marks.append(("save_top", save_started, time.monotonic()))
+            self.top_frame = shot.meta
+            print(f"      📸 Cam {self.station.top.index} 저장 완료: {filename}")
+        else:
+            print(f"      ❌ Cam {self.station.top.index} 영상이 없습니다! (검사 실패)")
+            self.reset()
+            return
+
+        self.step = 2
+        print("   -> [Step 3] 셔터 DOWN 요청")
+        self.send_shutter("DOWN")
+        # 이제 DOWN_DONE이 올 때까지 대기
+
+    async def on_down_done(self, done_at=None):
+        if not self.is_inspecting or self.step != 2: return
+        self.step = 3
+
+        print(f"   -> [Step 4] 셔터 열림 확인. Camera {self.station.bottom.index} 촬영...")
+        done_at = done_at if done_at is not None else time.monotonic()
+        self._marks.append(("shutter_down", self._shutter_sent, done_at))
+        shot = await self.capture_settled("bottom", done_at)
+        self._marks.append(("settle_bottom", done_at, time.monotonic()))
+        
+        # Camera 2 안정 프레임 캡처 및 저장
+        if shot is not None:
+            filename = f"ins_{self.station.station_id}_cam{self.station.bottom.index}_{self.part_id}.jpg"
+            self.cam2_file = os.path.join(self.temp_dir, filename)
+            save_started = time.monotonic()
+            await scheduler.run("io", self.save_shot, shot, self.cam2_file)
+            self._marks.append(("save_bottom", save_started, time.monotonic()))
+            self.bottom_frame = shot.meta
+            print(f"      📸 Cam {self.station.bottom.index} 저장 완료: {filename}")
+        else:
+            print(f"      ❌ Cam {self.station.bottom.index} 영상이 없습니다! (검사 실패)")
+            self.reset()
+            return
+
+        # 3. 촬영 완료 -> 계산은 백그라운드로 넘기고 기계 구간은 바로 해제
+        self.m_mechanical.observe(time.monotonic() - self._cycle_started)
+        job = InspectionJob(self.part_id, self.cam1_file, self.cam2_file, self.top_frame, self.bottom_frame,
+                            cycle_started=self._cycle_started, marks=self._marks)
+        self.inflight[job.part_id] = job
+        task = asyncio.create_task(self.run_job(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        print(f"   -> [Step 5] 검사 알고리즘 예약 (Part: {job.part_id}, 계산 중 {len(self.inflight)}개)")
+
+        self.reset()
+        print("   -> [] 셔터 UP 요청")
+        self.send_shutter("UP")
+
+    async def run_job(self, job: InspectionJob):
+        """ 검사 알고리즘 실행 (전용 검사 실행기, 도는 동안 미리보기 추론은 감속) """
+        compute_started = time.monotonic()
+        try:
+            compute_started, job.verdict = await scheduler.run_inspection(_inspect_timed, job.cam1_file, job.cam2_file,
+                                                                          job.part_id, self.station.station_id)
+        except Exception as e:
+            print(f"❌ {self.tag} Part {job.part_id} 알고리즘 예외: {e}")
+            job.verdict = None
+        finally:
+            self.inflight.pop(job.part_id, None)
+            self._slot_freed.set()
+        finished = time.monotonic()
+        self.m_compute.observe(finished - compute_started)
+
+        if job.verdict:
+            for stage, seconds in job.verdict.get("timings", {}).items():
+                if stage in self.m_stage:
+                    self.m_stage[stage].observe(seconds)
+            self.m_results[job.verdict["result"]].inc()
+            await self.save_trace(job, build_trace(job, compute_started, finished))
+            print(f"✅ {self.tag} Part {job.part_id} 검사 성공 -> {job.verdict['result']} "
+                  f"(ID: {job.verdict['measure_id']}, 코드: {job.verdict['fail_code']})")
+        else:
+            print(f"❌ {self.tag} Part {job.part_id} 검사 실패 (알고리즘 오류)")
+            self.m_results["ERROR"].inc()
+
+        self.results[job.part_id] = job
+        while len(self.results) > RECENT_RESULTS_SIZE:
+            self.results.popitem(last=False)
+
+    async def save_trace(self, job, spans):
+        """ 단계 트리를 검사 결과 행(Measurements.trace_blob)에 기록 (/api/logs/{mid}/trace) """
+        try:
+            await scheduler.run("io", save_trace, cfg.DB_FILE, job.verdict["measure_id"], encode_trace(spans))
+        except Exception as e:
+            print(f"⚠️ {self.tag} Part {job.part_id} 타임라인 저장 실패: {e}")
+
+    def send_shutter(self, command):
+        """ 이 스테이션의 셔터 토픽으로 명령 발행 (공용 발행기, QoS 1) """
+        self._shutter_sent = time.monotonic()
+        mqtt_publisher.publish(self.station.shutter_topic, command, qos=1)
+
+    def status(self):
+        return {
+            "station_id": self.station.station_id,
+            "is_inspecting": self.is_inspecting,
+            "step": self.step,
+            "part_id": self.part_id or None,
+            "holding_check": self._held_since is not None,
+            "inflight": list(self.inflight.keys()),
+            "recent": [
+                {"part_id": job.part_id, "captured_at": job.captured_at, "verdict": job.verdict,
+                 "top_frame": job.top_frame, "bottom_frame": job.bottom_frame}
+                for job in reversed(self.results.values())
+            ],
+        }
+
+    def reset(self):
+        self.is_inspecting = False
+        self.step = 0
+        self.part_id = ""
+        self.cam1_file = ""
+        self.cam2_file = ""
+        self.top_frame = None
+        self.bottom_frame = None
+        print(f"⏹ {self.tag} 프로세스 종료 (대기 상태 복귀)\n")
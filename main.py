@@ -9,19 +9,31 @@ from typing import Dict, List
 import paho.mqtt.client as mqtt
 from functools import partial
 
-from fastapi import FastAPI, File, UploadFile, Form, WebSocket, WebSocketDisconnect, Depends
+from fastapi import FastAPI, File, UploadFile, Form, WebSocket, WebSocketDisconnect, Depends, HTTPException, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 
 # --- [모듈 임포트] ---
-from models import get_db
+from models import get_db, init_db, async_engine
+from metrics import render_prometheus, export_metrics
 from vali import run_inspection
 from routers import user_router, control_router, line_router, log_router
 from ai_core import AI_Analyzer
+from mqtt_publisher import mqtt_publisher
+from event_bus import event_bus, EventType
+from frame_buffer import make_settle_thumb
+from stations import StationRegistry
+from inspection_manager import InspectionManager
+from shm_frames import SHARED_MODE, FrameSharing
+from resource_scheduler import scheduler
+from view_tiers import VIEW_TIERS, DEFAULT_TIER, decode_flag, decode_scale_for, encode_tiers
+from viewer_session import ViewerSession, VIEWER_MAX_FPS
+from h264_stream import H264_AVAILABLE, H264_TIER, H264Encoder, H264ViewerSession
+from frame_recorder import FrameRecorder
+from hot_folder import HOT_FOLDER_ENABLED, HotFolderWatcher
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__))) # 현재 폴더 경로 추가
-from vali.run_inspection import run_algorithm
 
 # --- [설정 및 초기화] ---
 app = FastAPI()
@@ -42,192 +54,274 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # 상태 관리 (메모리)
 batch_store: Dict[str, dict] = {}
 
-# --- [상태 관리 전역 변수] ---
-CURRENT_SHUTTER_STATE = "UP"
-LAST_FRAMES: Dict[int, str] = {1: None, 2: None}     # 웹소켓 전송용 (Base64)
-LATEST_FRAME_CV: Dict[int, np.ndarray] = {1: None, 2: None} # 검사용 원본 (OpenCV객체)
-LAST_SAVE_TIME = {1: 0, 2: 0}
-SAVE_INTERVAL = 0.5 
-FRAME_COUNTERS: Dict[int, int] = {1: 0, 2: 0}
+# --- [상태 관리] ---
+# 라인(스테이션)별 카메라/토픽/검사 상태/프레임 버퍼 (stations.json 또는 기본 단일 라인 구성)
+stations = StationRegistry.from_config()
 
-# MQTT 설정
-MQTT_BROKER = "localhost" # 도커 서비스명 (로컬 실행 시 "localhost")
-MQTT_PORT = 1883
-MQTT_TOPIC_SHUTTER = "factory/shutter/command"  # 기존: 셔터 제어 (UP/DOWN)
-MQTT_TOPIC_COMMAND = "factory/command"
+# MQTT 설정 (토픽은 스테이션별 설정 사용)
+MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost") # 도커 서비스명 (로컬 실행 시 "localhost")
+MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 
 # 웹소켓 매니저
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {1: [], 2: []}
-    async def connect(self, websocket: WebSocket, camera_index: int):
+        # 카메라 번호 -> {시청자 웹소켓: 시청자 세션(현재 화질 tier, 전송 태스크, 지연 측정)}
+        self.active_connections: Dict[int, Dict[WebSocket, ViewerSession]] = {idx: {} for idx in stations.cameras}
+    async def connect(self, websocket: WebSocket, camera_index: int, tier: str = DEFAULT_TIER,
+                      adaptive: bool = True, max_fps: int = VIEWER_MAX_FPS, codec: str = "jpeg"):
         await websocket.accept()
         # 해당 카메라 방에 시청자 추가
         if camera_index not in self.active_connections:
-            self.active_connections[camera_index] = []
-        self.active_connections[camera_index].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, camera_index: int):
-        if camera_index in self.active_connections:
-            if websocket in self.active_connections[camera_index]:
-                self.active_connections[camera_index].remove(websocket)
+            self.active_connections[camera_index] = {}
+        if codec == "h264":
+            session = H264ViewerSession(websocket, camera_index, partial(self.request_keyframe, camera_index))
+            self.request_keyframe(camera_index)  # 새 시청자는 키프레임부터
+        else:
+            session = ViewerSession(websocket, camera_index, tier, adaptive, max_fps)
+        session.start()
+        self.active_connections[camera_index][websocket] = session
+        self._count_viewers(camera_index)
 
-    # 특정 카메라 방에 있는 사람들에게만 전송
-    async def broadcast_bytes(self, data: bytes, camera_index: int):
+    async def disconnect(self, websocket: WebSocket, camera_index: int):
         if camera_index in self.active_connections:
-            for connection in self.active_connections[camera_index]:
-                try:
-                    await connection.send_bytes(data)
-                except:
-                    pass
+            session = self.active_connections[camera_index].pop(websocket, None)
+            if session is not None:
+                await session.stop()
+            self._count_viewers(camera_index)
+
+    def _count_viewers(self, camera_index: int):
+        camera = stations.camera(camera_index)
+        if camera is not None:
+            camera.viewers.set(len(self.active_connections[camera_index]))
+
+    def request_keyframe(self, camera_index: int):
+        camera = stations.camera(camera_index)
+        if camera is not None and camera.h264 is not None:
+            camera.h264.request_keyframe()
+
+    def tiers_in_use(self, camera_index: int):
+        """ 이 카메라 시청자들의 현재 tier들 ("h264" 포함, 시청자 없는 tier는 인코딩 안 함) """
+        return {session.tier for session in self.active_connections.get(camera_index, {}).values() if not session.closed}
+
+    # 특정 카메라 방에서 해당 tier를 보는 사람들의 우편함에 넣기만 함 (전송은 시청자별 태스크)
+    # queued_at: 이 워커가 송출 큐에 넣은 시각 (시청자 지연 기준), capture_ts: 촬영 시각 (e2e 지표 전용)
+    def broadcast_bytes(self, data: bytes, camera_index: int, tier: str = DEFAULT_TIER,
+                        queued_at: float = None, capture_ts: float = None):
+        queued_at = queued_at if queued_at is not None else time.monotonic()
+        for session in self.active_connections.get(camera_index, {}).values():
+            if session.tier == tier:
+                session.offer(data, queued_at, capture_ts)
+
+    def broadcast_h264(self, camera_index: int, seq: int, data: bytes, is_key: bool,
+                       queued_at: float, capture_ts: float = None):
+        for session in self.active_connections.get(camera_index, {}).values():
+            if session.tier == "h264":
+                session.offer(seq, data, is_key, queued_at, capture_ts)
+
+    def stats(self):
+        return [session.stats() for sessions in self.active_connections.values() for session in sessions.values()]
 
 manager = ConnectionManager()
 
-# --- [검사 프로세스 관리자] ---
-class InspectionManager:
-    def __init__(self):
-        self.is_inspecting = False
-        self.step = 0 # 0:대기, 1:1차촬영대기, 2:2차촬영대기
-        self.cam1_file = ""
-        self.cam2_file = ""
-
-    async def start_inspection(self):
-        if self.is_inspecting:
-            print("⚠️ [Inspect] 이미 검사가 진행 중입니다.")
-            return
-        
-        print("\n🚀 [Inspect] 정밀 검사 프로세스 시작!")
-        self.is_inspecting = True
-        self.step = 1
-        
-        print("   -> [Step 1] 셔터 UP 요청")
-        send_mqtt("UP")
-        # 이제 UP_DONE이 올 때까지 대기
-
-    async def on_up_done(self):
-        if not self.is_inspecting or self.step != 1: return
-
-        print("   -> [Step 2] 셔터 닫힘 확인. Camera 1 촬영...")
-        await asyncio.sleep(0.5) # 물리적 진동 안정화 대기
-        
-        # Camera 1 최신 프레임 캡처 및 저장
-        if LATEST_FRAME_CV[1] is not None:
-            filename = f"ins_cam1_{int(time.time())}.jpg"
-            self.cam1_file = os.path.join(TEMP_DIR, filename)
-            cv2.imwrite(self.cam1_file, LATEST_FRAME_CV[1])
-            print(f"      📸 Cam 1 저장 완료: {filename}")
-        else:
-            print("      ❌ Cam 1 영상이 없습니다! (검사 실패)")
-            self.reset()
-            return
+# --- [멀티 워커 모드] 공유 메모리 프레임 버퍼 (SHARED_FRAMES=1 일 때만) ---
+frame_sharing = FrameSharing(list(stations.cameras)) if SHARED_MODE else None
+if frame_sharing is not None:
+    # 검사 계산은 리더에서, 미리보기 추론은 수집 워커에서 -> 검사 중 감속 여부를 공유 메모리로 전달
+    scheduler.shared_inspections = frame_sharing.inspections
+_background_tasks = []
 
-        self.step = 2
-        print("   -> [Step 3] 셔터 DOWN 요청")
-        send_mqtt("DOWN")
-        # 이제 DOWN_DONE이 올 때까지 대기
-
-    async def on_down_done(self):
-        if not self.is_inspecting or self.step != 2: return
-
-        print("   -> [Step 4] 셔터 열림 확인. Camera 2 촬영...")
-        await asyncio.sleep(0.5) 
-        
-        # Camera 2 최신 프레임 캡처 및 저장
-        if LATEST_FRAME_CV[2] is not None:
-            filename = f"ins_cam2_{int(time.time())}.jpg"
-            self.cam2_file = os.path.join(TEMP_DIR, filename)
-            cv2.imwrite(self.cam2_file, LATEST_FRAME_CV[2])
-            print(f"      📸 Cam 2 저장 완료: {filename}")
-        else:
-            print("      ❌ Cam 2 영상이 없습니다! (검사 실패)")
-            self.reset()
-            return
-
-        # 3. 최종 알고리즘 실행
-        print("   -> [Step 5] 검사 알고리즘 실행 (run_algorithm)")
-        
-        # run_algorithm은 동기 함수이므로 쓰레드로 실행
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, run_algorithm, self.cam1_file, self.cam2_file)
-        
-        if result == 1:
-            print("✅ [Inspect] 검사 성공 (DB 저장 완료)")
-        else:
-            print("❌ [Inspect] 검사 실패 (알고리즘 오류)")
-            
-        self.reset()
-        print("   -> [] 셔터 UP 요청")
-        send_mqtt("UP")
+# --- [송출 녹화] RECORD_CAMERAS 설정 시에만 (benchmarks/replay_source.py로 재생) ---
+# 카메라 폴더는 그 카메라를 수집하는 워커만 씀 (source_endpoint에서 attach/detach)
+recorder = FrameRecorder.from_env(stations.cameras)
 
-    def reset(self):
-        self.is_inspecting = False
-        self.step = 0
-        self.cam1_file = ""
-        self.cam2_file = ""
-        print("⏹ [Inspect] 프로세스 종료 (대기 상태 복귀)\n")
+# --- [핫 폴더 검사] HOT_FOLDER=1 일 때만, WATCH_DIR에 들어온 상부/하부 사진 쌍을 검사 (리더 워커) ---
+hot_folder = HotFolderWatcher() if HOT_FOLDER_ENABLED else None
 
-inspection_mgr = InspectionManager()
+# --- [스테이션(라인)별 검사 프로세스 관리자] ---
+for _station in stations:
+    _station.inspection = InspectionManager(_station, TEMP_DIR)
 
 
 # --- [Paho MQTT 설정] ---
 
-def send_mqtt(command):
-    """ MQTT 메시지 발행 헬퍼 """
-    try:
-        mqtt_client.publish(MQTT_TOPIC_SHUTTER, command)
-    except Exception as e:
-        print(f"❌ MQTT 전송 실패: {e}")
-
 def on_connect(client, userdata, flags, rc):
     print(f"📡 [MQTT] 브로커 연결 성공 (Code: {rc})")
-    # 명령 토픽 구독
-    client.subscribe(MQTT_TOPIC_COMMAND)
+    # 스테이션별 명령 토픽 구독 (재연결 시에도 다시 구독됨, QoS 1 -> CHECK/DONE 유실 방지)
+    client.subscribe([(topic, 1) for topic in stations.command_topics()])
 
 def on_message(client, userdata, msg):
-    global CURRENT_SHUTTER_STATE
+    """ paho 네트워크 스레드: 이벤트 버스 큐에 넣기만 하고 바로 리턴 """
     try:
         topic = msg.topic
         payload = msg.payload.decode().upper()
         print(f"📩 [MQTT] {topic} : {payload}")
 
-        # 비동기 함수 호출을 위한 루프 가져오기
-        loop = asyncio.get_event_loop()
-
-        if topic == MQTT_TOPIC_COMMAND:
-            if payload == "CHECK":
-                if loop.is_running():
-                    asyncio.run_coroutine_threadsafe(inspection_mgr.start_inspection(), loop)
-            
-            elif payload == "DOWN_DONE":
-                CURRENT_SHUTTER_STATE = "DOWN"
-                if loop.is_running():
-                    asyncio.run_coroutine_threadsafe(inspection_mgr.on_down_done(), loop)
-                    
-            elif payload == "UP_DONE":
-                CURRENT_SHUTTER_STATE = "UP"
-                if loop.is_running():
-                    asyncio.run_coroutine_threadsafe(inspection_mgr.on_up_done(), loop)
+        if topic in stations.by_command_topic:
+            event_bus.post_threadsafe(topic, payload)
 
     except Exception as e:
         print(f"❌ [MQTT] 에러: {e}")
 
+# --- [MQTT 이벤트 핸들러] (서버 이벤트 루프에서 실행, 토픽으로 스테이션 구분) ---
+async def handle_check(event):
+    station = stations.by_command_topic[event.topic]
+    await station.inspection.start_inspection()
+
+async def handle_up_done(event):
+    station = stations.by_command_topic[event.topic]
+    station.shutter_state = "UP"
+    await station.inspection.on_up_done(event.received_at)
+
+async def handle_down_done(event):
+    station = stations.by_command_topic[event.topic]
+    station.shutter_state = "DOWN"
+    await station.inspection.on_down_done(event.received_at)
+
+event_bus.subscribe(EventType.CHECK, handle_check)
+event_bus.subscribe(EventType.UP_DONE, handle_up_done)
+event_bus.subscribe(EventType.DOWN_DONE, handle_down_done)
+
 mqtt_client = mqtt.Client()
 mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
 
-@app.on_event("startup")
-async def startup_event():
+async def start_leader_services():
+    """ MQTT 구독 + 검사 상태머신 (멀티 워커 모드에서는 리더 워커 1개만 실행) """
+    # MQTT 이벤트 버스를 서버 이벤트 루프에 연결한 뒤 구독 시작
+    event_bus.bind(asyncio.get_running_loop())
+    _background_tasks.append(asyncio.create_task(event_bus.run()))
+    if frame_sharing is not None:
+        # 다른 워커가 수집한 프레임을 검사용 링버퍼로 가져옴
+        for idx, camera in stations.cameras.items():
+            _background_tasks.append(asyncio.create_task(frame_sharing.follow_raw(idx, camera.ring)))
+    if hot_folder is not None:
+        await hot_folder.start()
+    if frame_sharing is not None:
+        # 리더가 아닌 워커도 검사/MQTT/핫 폴더 상태를 조회할 수 있도록 공유 메모리에 주기적으로 올림
+        _background_tasks.append(asyncio.create_task(frame_sharing.publish_status(leader_status_snapshot)))
     try:
-        mqtt_client.connect(MQTT_BROKER, 1883, 60)
+        mqtt_client.reconnect_delay_set(min_delay=1, max_delay=30)
+        mqtt_client.connect_async(MQTT_BROKER, MQTT_PORT, 60)
         mqtt_client.loop_start()
     except:
         print("❌ MQTT 연결 실패")
 
+# 리더 워커에만 있는 상태 (리더가 아닌 워커는 리더가 공유 메모리에 올린 값으로 응답)
+LEADER_STATE = {
+    "inspection": lambda: [station.inspection.status() for station in stations],
+    "mqtt_events": lambda: event_bus.stats(),
+    "hotfolder": lambda: hot_folder.status() if hot_folder is not None else {"enabled": False},
+}
+
+def leader_status_snapshot():
+    return {key: get() for key, get in LEADER_STATE.items()}
+
+def leader_state(key, response: Response):
+    """ 리더 상태 key (단일 워커/리더 워커는 바로, 그 외 워커는 리더가 공유 메모리에 올린 값) """
+    if frame_sharing is None or frame_sharing.is_leader:
+        return LEADER_STATE[key]()
+    shared = frame_sharing.leader_status(key)
+    if shared is None:
+        raise HTTPException(status_code=503, detail="리더 워커 상태가 아직 공유되지 않았습니다.")
+    value, age = shared
+    response.headers["X-Leader-State-Age"] = f"{age:.3f}"   # 리더가 상태를 올린 뒤 지난 시간(초)
+    return value
+
+async def relay_shared_view(camera_index):
+    """ [멀티 워커 모드] 공유 메모리의 송출 프레임 -> 이 워커에 붙은 시청자들 """
+    camera = stations.camera(camera_index)
+    async def on_frame(tier, data, ts, seq):
+        queued_at = time.monotonic()   # 지연은 이 워커가 받은 시점부터 (ts=촬영 시각은 e2e 지표에만)
+        if tier == "h264":
+            manager.broadcast_h264(camera_index, seq, data[1:], data[0] == 1, queued_at, ts)
+            return
+        camera.last_frame = data
+        manager.broadcast_bytes(data, camera_index, tier, queued_at, ts)
+    await frame_sharing.follow_view(camera_index, partial(manager.tiers_in_use, camera_index), on_frame)
+
+@app.on_event("startup")
+async def startup_event():
+    scheduler.apply_thread_budgets()
+    mqtt_publisher.start()
+    if frame_sharing is None:
+        init_db()
+        await start_leader_services()
+        return
+
+    # 스키마 마이그레이션은 워커끼리 겹치지 않도록 순서대로
+    frame_sharing.init_lock.acquire(blocking=True)
+    try:
+        init_db()
+    finally:
+        frame_sharing.init_lock.release()
+    for idx in stations.cameras:
+        _background_tasks.append(asyncio.create_task(relay_shared_view(idx)))
+    _background_tasks.append(asyncio.create_task(frame_sharing.publish_metrics(export_metrics)))
+    _background_tasks.append(asyncio.create_task(frame_sharing.wait_for_leadership(start_leader_services)))
+    print(f"🧩 [Worker] PID {os.getpid()} 시작 (공유 메모리 프레임 모드, 워커 번호 {frame_sharing.worker_index})")
+
 @app.on_event("shutdown")
 async def shutdown_event():
+    for task in _background_tasks:
+        task.cancel()
     mqtt_client.loop_stop()
+    if hot_folder is not None:
+        hot_folder.stop()
+    mqtt_publisher.stop()
+    scheduler.shutdown()
+    if recorder is not None:
+        recorder.close()
+    if frame_sharing is not None:
+        frame_sharing.close()
+    await async_engine.dispose()
 # --- [API 엔드포인트] ---
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """ Prometheus 수집용 (멀티 워커 모드: 모든 워커의 값, 시계열마다 worker 라벨 = 워커 번호) """
+    if frame_sharing is None:
+        return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+    # 자기 값은 지금 값으로, 다른 워커 값은 각자 공유 메모리에 올린 값으로 (최대 METRICS_PUBLISH_INTERVAL 전)
+    sources = [({"worker": frame_sharing.worker_index}, export_metrics())]
+    sources += [({"worker": n}, exported) for n, exported in frame_sharing.worker_metrics()]
+    sources.sort(key=lambda source: source[0]["worker"])
+    return PlainTextResponse(render_prometheus(sources=sources), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/stations")
+def station_list():
+    """ 등록된 라인(스테이션) 구성: 카메라 번호, MQTT 토픽, 셔터 상태 """
+    return [station.describe() for station in stations]
+
+@app.get("/api/inspection/status")
+def inspection_status(response: Response):
+    """ 라인별 검사 상태: 기계 구간 진행 여부, 계산 중인 제품 ID, 제품 ID별 최근 판정 (리더 워커 기준) """
+    return leader_state("inspection", response)
+
+@app.get("/api/view/stats")
+def viewer_stats():
+    """ 시청자별 현재 화질/fps 상한/지연/처리량/건너뛴 프레임 수 """
+    return manager.stats()
+
+@app.get("/api/sources")
+def source_stats():
+    """ 카메라 송출별 수신/누락/순서 뒤바뀜, 시계 차이, 촬영~수신/촬영~시청자 지연 (수집 담당 워커 기준) """
+    return [camera.source.stats() for camera in stations.cameras.values()]
+
+@app.get("/api/recordings")
+def recording_stats():
+    """ 송출 녹화 상태 (카메라별 세그먼트 수/용량/버린 프레임, 수집 담당 워커 기준) """
+    return recorder.stats() if recorder is not None else {"enabled": False}
+
+@app.get("/api/hotfolder")
+def hot_folder_status(response: Response):
+    """ 핫 폴더 검사 상태 (짝 대기/검사 대기/진행 중 수, 결과별 수, 최근 처리 목록, 리더 워커 기준) """
+    return leader_state("hotfolder", response)
+
+@app.get("/api/mqtt/events")
+def mqtt_event_stats(response: Response):
+    """ MQTT 이벤트별 수신 수, 수신->핸들러 시작 지연, 핸들러 실행 시간 (리더 워커 기준) """
+    return leader_state("mqtt_events", response)
+
 
 
 
@@ -236,70 +330,155 @@ async def shutdown_event():
 ai_engine =AI_Analyzer()
 
 @app.websocket("/api/view/{camera_index}")
-async def viewer_endpoint(websocket: WebSocket, camera_index: int):
-    # 시청자가 들어올 때 "저는 n번 카메라 볼래요"라고 등록
-    await manager.connect(websocket, camera_index)
+async def viewer_endpoint(websocket: WebSocket, camera_index: int, tier: str = DEFAULT_TIER,
+                          adaptive: bool = True, fps: int = VIEWER_MAX_FPS, codec: str = "jpeg"):
+    if stations.camera(camera_index) is None or tier not in VIEW_TIERS or codec not in ("jpeg", "h264"):
+        await websocket.close(code=1008)  # 등록되지 않은 카메라 / 없는 화질 단계 / 지원하지 않는 코덱
+        return
+    if codec == "h264" and not H264_AVAILABLE:
+        print(f"⚠️ [View {camera_index}] H.264 요청 거부 (PyAV 미설치)")
+        await websocket.close(code=1003)
+        return
+    # 시청자가 들어올 때 "저는 n번 카메라를 이 화질로 볼래요"라고 등록
+    # (tier = 최대 화질, adaptive면 네트워크 상태에 따라 자동으로 낮춤)
+    # codec=h264 이면 카메라당 1개 H.264 스트림을 같이 받음 (Annex-B, 메시지 1개 = 프레임 1장)
+    await manager.connect(websocket, camera_index, tier, adaptive, max(1, min(fps, VIEWER_MAX_FPS)), codec)
     try:
         while True:
             # 클라이언트(시청자)가 보내는 데이터는 무시 (연결 유지용)
             await websocket.receive()
     except WebSocketDisconnect:
-        manager.disconnect(websocket, camera_index)
+        await manager.disconnect(websocket, camera_index)
     except Exception as e:
         print(f"⚠️ [View {camera_index}] 에러: {e}")
-        manager.disconnect(websocket, camera_index)
+        await manager.disconnect(websocket, camera_index)
+
+
+def decode_frame(data, scale=1.0):
+    """
+    JPEG 바이트 -> (OpenCV 프레임, 안정화 감지용 축소 흑백 이미지)
+    scale < 1 이면 JPEG 축소 디코딩 (미리보기/AI 추론용, 검사 촬영은 원본 JPEG를 그대로 저장)
+    """
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), decode_flag(scale))
+    if frame is None:
+        return None, None
+    return frame, make_settle_thumb(frame)
 
 
 @app.websocket("/ws/source/{camera_index}")
 async def source_endpoint(websocket: WebSocket, camera_index: int):
-    await websocket.accept()
-    print(f"🎥 [Source] 카메라 {camera_index} 송출 시작")
-    
-    loop = asyncio.get_event_loop()
+    camera = stations.camera(camera_index)
+    if camera is None:
+        print(f"⚠️ [Source] 등록되지 않은 카메라 {camera_index} - 연결 거부")
+        await websocket.close(code=1008)
+        return
+
+    # 멀티 워커 모드: 카메라당 수집 담당 워커는 1개 (다른 워커가 이미 받고 있으면 거부)
+    ingest_lock = frame_sharing.ingest_locks[camera_index] if frame_sharing is not None else None
+    if ingest_lock is not None and (ingest_lock.held or not ingest_lock.acquire()):
+        print(f"⚠️ [Source] 카메라 {camera_index} 는 이미 다른 연결이 송출 중 - 연결 거부")
+        await websocket.close(code=1013)
+        return
 
     try:
+        # accept 실패도 finally에서 수집 담당 락을 반납하도록 try 안에서
+        await websocket.accept()
+        print(f"🎥 [Source] 카메라 {camera_index} 송출 시작")
+        camera.source.reset()
+        if recorder is not None:
+            recorder.attach(camera_index)
+
         while True:
-            # 1. 수신
-            data = await websocket.receive_bytes()
-            if len(data) == 0: continue
+            # 1. 수신 (수신 시각 기록 -> 검사 촬영 시 이벤트 이후 프레임인지 판단)
+            raw = await websocket.receive_bytes()
+            received_at = time.monotonic()
+            if len(raw) == 0: continue
+
+            # 송출 헤더 해석 (순번/촬영 시각/해상도/코덱, 헤더 없는 기존 JPEG도 허용)
+            try:
+                meta, data = camera.source.accept(raw, received_at)
+            except ValueError as e:
+                print(f"⚠️ [Source] 카메라 {camera_index} 잘못된 프레임: {e}")
+                continue
+            if recorder is not None:
+                recorder.append(camera_index, raw, meta)
             
-            # 2. 디코딩
-            nparr = await loop.run_in_executor(None, np.frombuffer, data, np.uint8)
-            frame = await loop.run_in_executor(None, cv2.imdecode, nparr, cv2.IMREAD_COLOR)
+            # 시청 중인 화질 단계 (멀티 워커 모드: 모든 워커의 시청자 기준)
+            if frame_sharing is not None:
+                tiers = frame_sharing.demanded_tiers(camera_index)
+            else:
+                tiers = manager.tiers_in_use(camera_index)
+
+            want_h264 = "h264" in tiers and H264_AVAILABLE
+            jpeg_tiers = tiers - {"h264"}
+
+            # 2. 디코딩 (+ 안정화 감지용 축소 이미지) - 원본 tier 시청자가 없으면 축소 디코딩
+            scale = decode_scale_for(jpeg_tiers | ({H264_TIER} if want_h264 else set()))
+            frame, thumb = await scheduler.run("preview", decode_frame, data, scale, timer=camera.timers["decode"])
             
             if frame is None: continue
+            if meta.width == 0:
+                # 헤더 없는 송출기: 디코딩 결과로 원본 해상도 기록
+                meta.width, meta.height = round(frame.shape[1] / scale), round(frame.shape[0] / scale)
 
 
-            LATEST_FRAME_CV[camera_index] = frame
+            camera.latest_cv = frame
+            if frame_sharing is None:
+                # 검사 촬영은 원본 해상도 JPEG(data)를 그대로 파일로 저장
+                camera.ring.push(frame, thumb, received_at, jpeg=data, meta=meta.describe())
 
-            FRAME_COUNTERS[camera_index] += 1
+            camera.counter += 1
             final_img = frame 
 
-
-            if FRAME_COUNTERS[camera_index] % 3 == 0:
-                ai_result = await loop.run_in_executor(None, ai_engine.predict, frame)
-                if ai_result is not None:
-                     if isinstance(ai_result, tuple) and len(ai_result) >= 2:
-                        _, predicted_img = ai_result[:2]
-                        if predicted_img is not None:
-                            final_img = predicted_img
-            
-            if camera_index == 1 and FRAME_COUNTERS[camera_index] % 5 == 0:
-                 await loop.run_in_executor(None, ai_engine.predict, frame)
-
-
-            _, buffer = cv2.imencode('.jpg', final_img, [int(cv2.IMWRITE_JPEG_QUALITY), 60])
-            
-
-            byte_data = buffer.tobytes()
-
-
-            LAST_FRAMES[camera_index] = byte_data
-            
-
-            await manager.broadcast_bytes(byte_data, camera_index)
+            # 오버레이는 카메라별 풀에서 빌린 캔버스에 그림 (원본 frame은 링버퍼/촬영용이라 건드리지 않음)
+            with camera.pool.lease(frame.shape) as canvas:
+                # 미리보기 추론 (정밀 검사 계산 중에는 스케줄러가 빈도를 낮춤)
+                if scheduler.preview_infer_due(camera.counter):
+                    ai_result = await scheduler.run("preview", ai_engine.predict, frame, canvas, timer=camera.timers["infer"])
+                    if ai_result is not None:
+                         if isinstance(ai_result, tuple) and len(ai_result) >= 2:
+                            _, predicted_img = ai_result[:2]
+                            if predicted_img is not None:
+                                final_img = predicted_img
+                
+                if camera.role == "top" and camera.counter % 5 == 0 and not scheduler.inspection_active:
+                     await scheduler.run("preview", ai_engine.predict, frame, canvas, timer=camera.timers["infer"])
+
+                # 시청 중인 tier만 한 번씩 인코딩 (인코딩이 끝날 때까지 캔버스 반납 안 함)
+                encoded = await scheduler.run("preview", encode_tiers, final_img, jpeg_tiers, scale,
+                                              timer=camera.timers["encode"]) if jpeg_tiers else {}
+                packets = []
+                if want_h264:
+                    if camera.h264 is None:
+                        camera.h264 = H264Encoder(camera_index)
+                    packets = await scheduler.run("preview", camera.h264.encode, final_img, scale, timer=camera.timers["h264"])
+
+
+            publish_started = time.perf_counter()
+            if frame_sharing is not None:
+                # 시청자 전송/검사 촬영은 각 워커가 공유 메모리에서 읽어 처리 (bytes 변환 없이 바로 기록)
+                frame_sharing.publish(camera_index, encoded, data, thumb, meta, packets)
+                camera.timers["publish"].observe(time.perf_counter() - publish_started)
+                continue
+
+            # 시청자 지연은 송출 큐에 넣은 시각 기준, 촬영 시각(서버 시계 환산)은 e2e 지표에만 사용
+            queued_at = time.monotonic()
+            for seq, packet, is_key in packets:
+                manager.broadcast_h264(camera_index, seq, packet, is_key, queued_at, meta.server_capture_ts)
+
+            for tier, buffer in encoded.items():
+                # 인코딩 결과 배열을 memoryview로 그대로 전송 (bytes 복사 없음)
+                jpeg = buffer.reshape(-1).data
+                camera.last_frame = jpeg
+                manager.broadcast_bytes(jpeg, camera_index, tier, queued_at, meta.server_capture_ts)
+            camera.timers["publish"].observe(time.perf_counter() - publish_started)
 
     except WebSocketDisconnect:
         print(f"🔌 [Source] 카메라 {camera_index} 연결 끊김")
     except Exception as e:
         print(f"❌ [Source] 에러: {e}")
+    finally:
+        if recorder is not None:
+            recorder.detach(camera_index)
+        if ingest_lock is not None:
+            ingest_lock.release()
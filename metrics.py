@@ -0,0 +1,193 @@
+import bisect
+import threading
+
+# =========================================================
+# [경량 메트릭] 카운터 / 게이지 / 히스토그램
+# - observe/inc는 숫자 더하기만 합니다. (락/메모리 할당 없음 -> 영상 처리 루프에서 호출해도 부담 없음)
+# - GIL 하에서 리스트 원소 += 는 드물게 값이 한두 개 누락될 수 있지만 통계 용도로는 무시 가능
+# =========================================================
+
+# 기본 지연시간 버킷 (초 단위, 0.5ms ~ 10s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    __slots__ = ("name", "help", "labels", "value")
+
+    def __init__(self, name, help="", labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Gauge:
+    __slots__ = ("name", "help", "labels", "value")
+
+    def __init__(self, name, help="", labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.value = 0
+
+    def set(self, v):
+        self.value = v
+
+    def inc(self, n=1):
+        self.value += n
+
+    def dec(self, n=1):
+        self.value -= n
+
+
+class Histogram:
+    """ 고정 버킷 히스토그램 (버킷 배열은 생성 시 한 번만 할당) """
+    __slots__ = ("name", "help", "labels", "buckets", "counts", "sum", "count")
+
+    def __init__(self, name, help="", labels=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 마지막 칸 = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v):
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def quantile(self, q):
+        """ 버킷 경계 기준 근사 분위수 (예: q=0.95 -> p95) """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "avg": (self.sum / self.count) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Registry:
+    """
+    [메트릭 저장소] 이름 + 라벨 조합별로 메트릭을 한 번만 만들어 보관합니다.
+    조회(get-or-create)는 딕셔너리 키를 만들므로, 자주 호출되는 곳에서는
+    반환된 메트릭 객체를 변수에 들고 있다가 inc/observe만 호출하세요.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, help, dict(labels), **kwargs)
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", **labels):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def remove(self, metric):
+        """ 더 이상 쓰지 않는 메트릭 제거 (시청자처럼 왔다 가는 대상의 라벨별 메트릭용) """
+        key = (metric.name, tuple(sorted(metric.labels.items())))
+        with self._lock:
+            self._metrics.pop(key, None)
+
+    def metrics(self):
+        return list(self._metrics.values())
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _format_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _kind(metric):
+    return "counter" if isinstance(metric, Counter) else "gauge" if isinstance(metric, Gauge) else "histogram"
+
+
+def export_metrics(registry=None):
+    """ 메트릭 현재 값 -> JSON으로 옮길 수 있는 목록 (멀티 워커 모드에서 다른 워커로 넘길 때) """
+    registry = registry or REGISTRY
+    exported = []
+    for metric in registry.metrics():
+        item = {"name": metric.name, "kind": _kind(metric), "help": metric.help, "labels": dict(metric.labels)}
+        if item["kind"] == "histogram":
+            item.update(buckets=list(metric.buckets), counts=list(metric.counts), sum=metric.sum, count=metric.count)
+        else:
+            item["value"] = metric.value
+        exported.append(item)
+    return exported
+
+
+def render_prometheus(registry=None, sources=None):
+    """
+    Prometheus 텍스트 형식(0.0.4)으로 변환 (/metrics 요청 시에만 실행 -> 측정 경로에는 비용 없음)
+    sources: [(모든 시계열에 붙일 라벨, export_metrics() 결과)] -> 여러 워커의 메트릭을 한 번에 출력
+             (없으면 registry 하나만)
+    """
+    if sources is None:
+        sources = [({}, export_metrics(registry))]
+    families = {}
+    for extra, exported in sources:
+        for item in exported:
+            families.setdefault(item["name"], []).append((extra, item))
+
+    lines = []
+    for name in sorted(families):
+        group = families[name]
+        first = group[0][1]
+        kind = first["kind"]
+        if first["help"]:
+            lines.append(f"# HELP {name} {first['help']}")
+        lines.append(f"# TYPE {name} {kind}")
+        for extra, item in group:
+            labels = dict(item["labels"], **extra)
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(item['value'])}")
+                continue
+            cumulative = 0
+            for bound, count in zip(item["buckets"] + [float("inf")], item["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, {'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(item['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {item['count']}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
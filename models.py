@@ -1,7 +1,8 @@
-from sqlalchemy import create_engine, Column, Integer, Float, String, Text , ForeignKey, DateTime
+from sqlalchemy import create_engine, event, Column, Integer, Float, String, Text , ForeignKey, DateTime, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, deferred
 from sqlalchemy.sql import func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 import os
 
 # --- [1] 데이터베이스 연결 설정 ---
@@ -21,6 +22,36 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# --- [1-2] 비동기 엔진 (FastAPI 라우터용) ---
+# 라우터가 스레드풀 워커를 쿼리 내내 점유하지 않도록 aiosqlite 기반 비동기 세션을 사용합니다.
+# (영상 디코딩/추론이 기본 실행기를 쓰므로 대시보드 조회와 스레드를 다투지 않게 분리)
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))        # 상시 유지 커넥션 수
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))  # 순간 부하 시 추가 허용 커넥션 수
+DB_BUSY_TIMEOUT_MS = 5000                                 # 쓰기 잠금 대기 시간
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=10,
+)
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    # WAL: 검사 결과 INSERT(vali)와 조회가 서로 막지 않도록 읽기/쓰기 동시 진행 허용
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+# 스키마 마이그레이션 (불량 유형 컬럼/인덱스 등) - 서버 시작 시 1회 호출
+def init_db():
+    from vali.db_manager import migrate_schema
+    migrate_schema(DB_PATH)
+
 # DB 세션 의존성 함수 (FastAPI에서 Depends로 사용)
 def get_db():
     db = SessionLocal()
@@ -29,6 +60,11 @@ def get_db():
     finally:
         db.close()
 
+# 비동기 DB 세션 의존성 함수 (async 라우터에서 Depends로 사용)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # --- [2] 테이블 정의 ---
 
 class User(Base):
@@ -77,11 +113,34 @@ class Measurement(Base):
     # FK: Product 테이블 참조
     product_id = Column(Integer, ForeignKey("Product.product_id"))
     
-    measured_contour = Column(String)
+    measured_contour = Column(String)       # (구버전) JSON 문자열 외곽선
+    # 바이너리 외곽선 (vali/contour_codec.py 포맷) - 상세 조회 때만 로딩되도록 deferred
+    contour_blob = deferred(Column(LargeBinary))
+    # 검사 타임라인 (vali/trace_codec.py 포맷) - 타임라인 조회 때만 로딩
+    trace_blob = deferred(Column(LargeBinary))
     model_score = Column(Float)
     hole_offset = Column(Float)
     area_size = Column(Float)
     fail_reason = Column(String)
 
+    # 불량 유형 플래그 (fail_reason "xyz" 코드를 자리별로 분해, 0/1)
+    # 실제 컬럼 추가/백필/인덱스 생성은 vali.db_manager.migrate_schema()가 담당
+    defect_shape = Column(Integer, default=0)
+    defect_hole = Column(Integer, default=0)
+    defect_rust = Column(Integer, default=0)
+
+    # 제품 상관 ID (검사 프로세스의 part_id -> 판정 행 연결) / 검사한 라인(스테이션) ID - 이전 행은 NULL
+    part_id = Column(String)
+    station_id = Column(String)
+
+    __table_args__ = (
+        Index("ix_Measurements_defect_shape_date", "defect_shape", "measured_at"),
+        Index("ix_Measurements_defect_hole_date", "defect_hole", "measured_at"),
+        Index("ix_Measurements_defect_rust_date", "defect_rust", "measured_at"),
+        Index("ix_Measurements_measured_at", "measured_at"),
+        Index("ix_Measurements_part_id", "part_id"),
+        Index("ix_Measurements_station_date", "station_id", "measured_at"),
+    )
+
     # Product와의 관계 설정
     product = relationship("Product", back_populates="measurements")
\ No newline at end of file
@@ -0,0 +1,143 @@
+import os
+import time
+import uuid
+import threading
+import paho.mqtt.client as mqtt
+
+from metrics import REGISTRY
+
+# --- [MQTT 설정] ---
+MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost") # docker-compose 서비스명 (로컬 실행 시 "localhost")
+MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
+MQTT_MAX_INFLIGHT = 20     # QoS 1 응답(PUBACK) 대기 중인 메시지 최대 개수
+MQTT_MAX_QUEUED = 100      # 브로커 끊김/혼잡 시 쌓아둘 최대 메시지 수 (초과 시 즉시 실패)
+
+
+class MQTTPublisher:
+    """
+    [공용 MQTT 발행기] 서버 전체가 하나의 연결을 계속 유지하며 명령을 발행합니다.
+    - 호출마다 connect/disconnect 하지 않음 -> publish는 큐에 넣고 바로 리턴
+    - 프로세스별 고유 client_id -> 동시 요청끼리 브로커에서 서로 끊어내지 않음
+    - 자동 재연결, QoS 1 지원, in-flight/대기열 상한
+    - 발행 -> 브로커 응답(PUBACK)까지의 지연시간을 히스토그램으로 기록
+    """
+    def __init__(self, broker=MQTT_BROKER, port=MQTT_PORT, client_id=None,
+                 max_inflight=MQTT_MAX_INFLIGHT, max_queued=MQTT_MAX_QUEUED):
+        self.broker = broker
+        self.port = port
+        self.client_id = client_id or f"fastapi_pub_{os.getpid()}_{uuid.uuid4().hex[:6]}"
+        self.connected = False
+        self.started = False
+
+        self.client = mqtt.Client(client_id=self.client_id)
+        self.client.max_inflight_messages_set(max_inflight)
+        self.client.max_queued_messages_set(max_queued)
+        self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+
+        self._lock = threading.Lock()
+        self._pending = {}       # mid -> 발행 시각
+        self._acked_early = set() # publish() 리턴 전에 응답이 먼저 도착한 mid
+
+        self.ack_latency = REGISTRY.histogram("mqtt_publish_ack_seconds", "MQTT 발행 ~ 브로커 응답 지연시간")
+        self.published = REGISTRY.counter("mqtt_publish_total", "MQTT 발행 요청 수")
+        self.failed = REGISTRY.counter("mqtt_publish_failed_total", "MQTT 발행 실패 수")
+        self.inflight = REGISTRY.gauge("mqtt_publish_inflight", "응답 대기 중인 MQTT 메시지 수")
+
+    # --- 연결 관리 ---
+    def start(self):
+        with self._lock:
+            if self.started: return
+            self.started = True
+        # connect_async: 브로커가 꺼져 있어도 서버 시작을 막지 않고 백그라운드에서 재시도
+        self.client.connect_async(self.broker, self.port, 60)
+        self.client.loop_start()
+
+    def stop(self):
+        with self._lock:
+            if not self.started: return
+            self.started = False
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self.connected = (rc == 0)
+        print(f"📡 [MQTT Pub] 브로커 연결 {'성공' if rc == 0 else '실패'} (Code: {rc})")
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+        if rc != 0:
+            print(f"⚠️ [MQTT Pub] 연결 끊김 (Code: {rc}) - 자동 재연결 대기")
+
+    def _on_publish(self, client, userdata, mid):
+        # paho 내부 락을 잡은 상태로 호출되므로 여기서는 self._lock만 잠깐 사용합니다.
+        with self._lock:
+            sent_at = self._pending.pop(mid, None)
+            if sent_at is None:
+                self._acked_early.add(mid)
+            self.inflight.set(len(self._pending))
+        if sent_at is not None:
+            self.ack_latency.observe(time.perf_counter() - sent_at)
+
+    # --- 발행 ---
+    def publish(self, topic, payload, qos=1, wait_timeout=None):
+        """
+        메시지를 발행합니다. 기본은 큐에 넣고 바로 리턴(True/False).
+        wait_timeout(초)을 주면 브로커 응답까지 기다렸다가 결과를 리턴합니다.
+        """
+        if not self.started:
+            self.start()
+
+        sent_at = time.perf_counter()
+        try:
+            # (주의) paho 내부 락과 순서가 꼬이지 않도록 self._lock 밖에서 호출
+            info = self.client.publish(topic, payload, qos=qos)
+            # QoS 1 이상은 연결이 끊겨 있어도 대기열에 들어가고 재연결 후 전송됩니다.
+            queued = info.rc == mqtt.MQTT_ERR_SUCCESS or (qos > 0 and info.rc == mqtt.MQTT_ERR_NO_CONN)
+            if queued:
+                with self._lock:
+                    if info.mid in self._acked_early:
+                        self._acked_early.discard(info.mid)
+                        self.ack_latency.observe(time.perf_counter() - sent_at)
+                    else:
+                        self._pending[info.mid] = sent_at
+                    self.inflight.set(len(self._pending))
+        except Exception as e:
+            self.failed.inc()
+            print(f"❌ [MQTT Pub] 전송 실패: {e}")
+            return False
+
+        self.published.inc()
+        if not queued:
+            # QoS 0 + 미연결, 대기열 초과(MQTT_MAX_QUEUED) 등은 즉시 실패
+            self.failed.inc()
+            print(f"❌ [MQTT Pub] 전송 실패: {mqtt.error_string(info.rc)}")
+            return False
+
+        if wait_timeout:
+            try:
+                info.wait_for_publish(timeout=wait_timeout)
+            except (ValueError, RuntimeError):
+                pass
+            if not info.is_published():
+                self.failed.inc()
+                return False
+        return True
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "client_id": self.client_id,
+            "connected": self.connected,
+            "published": self.published.value,
+            "failed": self.failed.value,
+            "inflight": pending,
+            "ack_latency": self.ack_latency.snapshot(),
+        }
+
+
+# 서버 전체에서 공유하는 발행기 (main.py 시작/종료 이벤트에서 start/stop)
+mqtt_publisher = MQTTPublisher()
@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from metrics import REGISTRY
+
+# =========================================================
+# [CPU 자원 스케줄러] 작업 종류별 전용 실행기 + 스레드 예산
+#   - preview    : 실시간 송출 (디코딩 / 미리보기 AI 추론 / 인코딩)
+#   - inspection : 정밀 검사 알고리즘 (inspect_pair) -> 사이클 타임에 직결, 최우선
+#   - io         : 촬영 파일 저장 등 디스크 작업
+# 기본 실행기 하나를 같이 쓰면 미리보기 추론이 검사 계산을 밀어내므로 서로 분리하고,
+# 검사 계산이 도는 동안에는 미리보기 추론 빈도를 자동으로 낮춥니다.
+# =========================================================
+
+CPU_CORES = os.cpu_count() or 4
+
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", max(2, CPU_CORES // 2)))
+INSPECTION_WORKERS = int(os.getenv("INSPECTION_WORKERS", 1))
+IO_WORKERS = int(os.getenv("IO_WORKERS", 2))
+
+# OpenCV / torch 내부 스레드 풀 크기 (둘 다 프로세스 전역 설정)
+CV_THREADS = int(os.getenv("CV_THREADS", max(1, CPU_CORES // 2)))
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", max(1, CPU_CORES // 2)))
+
+# 미리보기 AI 추론 주기 (N 프레임마다 1번)
+PREVIEW_INFER_EVERY = 3
+PREVIEW_INFER_EVERY_DURING_INSPECTION = 15   # 정밀 검사 계산 중에는 대폭 감소
+
+
+class ResourceScheduler:
+    def __init__(self):
+        self.executors = {
+            "preview": ThreadPoolExecutor(PREVIEW_WORKERS, thread_name_prefix="preview"),
+            "inspection": ThreadPoolExecutor(INSPECTION_WORKERS, thread_name_prefix="inspection"),
+            "io": ThreadPoolExecutor(IO_WORKERS, thread_name_prefix="io"),
+        }
+        self.queued = {kind: REGISTRY.gauge("executor_queue_depth", "실행기 대기+실행 중 작업 수", executor=kind)
+                       for kind in self.executors}
+        self.wait_time = {kind: REGISTRY.histogram("executor_wait_seconds", "작업 제출 -> 실행 시작 대기 시간", executor=kind)
+                          for kind in self.executors}
+        self.active_inspections = 0
+        self.shared_inspections = None   # 멀티 워커 모드: 리더의 검사 계산 수 (shm_frames.SharedCounter, main.py에서 연결)
+        self.preview_skipped = REGISTRY.counter("preview_infer_throttled_total", "검사 중이라 건너뛴 미리보기 추론 수")
+
+    def apply_thread_budgets(self):
+        """ 라이브러리 내부 스레드 수 제한 (서버 시작 시 1회) """
+        cv2.setNumThreads(CV_THREADS)
+        try:
+            import torch
+            torch.set_num_threads(TORCH_THREADS)
+        except Exception as e:
+            print(f"⚠️ [Scheduler] torch 스레드 설정 실패: {e}")
+        print(f"🧮 [Scheduler] 코어 {CPU_CORES}개 | 실행기 preview={PREVIEW_WORKERS}, "
+              f"inspection={INSPECTION_WORKERS}, io={IO_WORKERS} | cv2={CV_THREADS}, torch={TORCH_THREADS} 스레드")
+
+    async def run(self, kind, func, *args, timer=None):
+        """
+        kind 실행기에서 동기 함수를 실행하고 결과를 기다립니다.
+        timer: 실행 시간(대기 제외)을 기록할 Histogram
+        """
+        gauge = self.queued[kind]
+        submitted = time.monotonic()
+        wait_hist = self.wait_time[kind]
+
+        def _job():
+            started = time.monotonic()
+            wait_hist.observe(started - submitted)
+            if timer is None:
+                return func(*args)
+            try:
+                return func(*args)
+            finally:
+                timer.observe(time.monotonic() - started)
+
+        gauge.inc()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executors[kind], _job)
+        finally:
+            gauge.dec()
+
+    # --- 정밀 검사 우선순위 ---
+    async def run_inspection(self, func, *args):
+        """ 정밀 검사 계산 실행 (도는 동안 미리보기 추론 감속) """
+        self.active_inspections += 1
+        self._share_inspections()
+        try:
+            return await self.run("inspection", func, *args)
+        finally:
+            self.active_inspections -= 1
+            self._share_inspections()
+
+    def _share_inspections(self):
+        """ 검사는 리더 워커에서만 돌므로, 송출을 받는 다른 워커도 감속할 수 있게 공유 메모리에 기록 """
+        if self.shared_inspections is not None:
+            self.shared_inspections.set(self.active_inspections)
+
+    @property
+    def inspection_active(self):
+        if self.active_inspections > 0:
+            return True
+        return self.shared_inspections is not None and self.shared_inspections.get() > 0
+
+    def preview_infer_due(self, frame_count):
+        """ 이번 프레임에 미리보기 AI 추론을 돌릴지 여부 """
+        if self.inspection_active:
+            due = frame_count % PREVIEW_INFER_EVERY_DURING_INSPECTION == 0
+            if not due and frame_count % PREVIEW_INFER_EVERY == 0:
+                self.preview_skipped.inc()
+            return due
+        return frame_count % PREVIEW_INFER_EVERY == 0
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+scheduler = ResourceScheduler()
@@ -1,28 +1,17 @@
 from fastapi import APIRouter, HTTPException
-import paho.mqtt.client as mqtt
+from mqtt_publisher import mqtt_publisher
 
 router = APIRouter(
     prefix="/api",
     tags=["Control"]
 )
 
-# MQTT 설정
-MQTT_BROKER = "localhost" # docker-compose 서비스명
-MQTT_PORT = 1883
+# MQTT 설정 (브로커 주소는 mqtt_publisher.py에서 관리)
 MQTT_TOPIC = "/factory/control" # 요청하신 토픽
 
 def send_mqtt_message(topic: str, message: str):
-    """ MQTT 브로커로 메시지를 전송하는 헬퍼 함수 """
-    try:
-        # 1회성 연결로 메시지 전송 (Publish)
-        client = mqtt.Client(client_id="fastapi_control_pub")
-        client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        client.publish(topic, message)
-        client.disconnect()
-        return True
-    except Exception as e:
-        print(f"❌ [Control Router] MQTT 전송 실패: {e}")
-        return False
+    """ MQTT 브로커로 메시지를 전송하는 헬퍼 함수 (공용 발행기 사용, QoS 1) """
+    return mqtt_publisher.publish(topic, message, qos=1)
 
 @router.post("/down")
 def trigger_down():
@@ -86,4 +75,9 @@ def trigger_down():
         "status": "success",
         "topic": MQTT_TOPIC,
         "message": "DEFECT sent"
-    }
\ No newline at end of file
+    }
+
+@router.get("/mqtt/stats")
+def mqtt_stats():
+    """ 공용 MQTT 발행기 상태 (연결 여부, 발행/실패 수, 응답 대기 수, PUBACK 지연시간) """
+    return mqtt_publisher.stats()
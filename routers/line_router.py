@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException
-import paho.mqtt.client as mqtt
+from mqtt_publisher import mqtt_publisher
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -8,22 +8,12 @@ router = APIRouter(
 )
 
 # --- [MQTT 설정] ---
-# main.py와 동일한 브로커 정보 사용
-MQTT_BROKER = "localhost"
-MQTT_PORT = 1883
+# 브로커 정보는 공용 발행기(mqtt_publisher.py)에서 관리
 MQTT_TOPIC = "/factory/control"  # 라인 제어용 토픽
 
 def send_mqtt_command(topic: str, message: str):
-    try:
-        # 1회성 연결로 메시지 전송 (Publish)
-        client = mqtt.Client(client_id="fastapi_control_pub")
-        client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        client.publish(topic, message)
-        client.disconnect()
-        return True
-    except Exception as e:
-        print(f"❌ [Control Router] MQTT 전송 실패: {e}")
-        return False
+    # 서버 공용 발행기로 전송 (연결 유지, QoS 1)
+    return mqtt_publisher.publish(topic, message, qos=1)
 
 # --- [API 엔드포인트] ---
 
@@ -1,14 +1,24 @@
 import base64
+import json
 import os
+import stat
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status, Response
-from sqlalchemy.orm import Session
-from sqlalchemy import func, case, and_
+from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+from sqlalchemy import select, func, case, and_
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from models import Product, Measurement, get_db
+import numpy as np
+
+from models import Product, Measurement, get_async_db
+from vali.contour_codec import encode_contour, contour_to_dict, contour_to_json
+from vali.trace_codec import trace_to_tree, stage_durations
+from thumbnail_cache import thumbnail_cache, THUMB_DEFAULT_SIZE
 
 # API 주소 프리픽스 (/api/login이 됨)
 router = APIRouter(prefix="/api", tags=["LOG"])
@@ -40,6 +50,8 @@ class LogDetailResponse(BaseModel):
     hole_offset: Optional[float]
     area_size: Optional[float]
     fail_reason: Optional[str]
+    part_id: Optional[str] = None
+    station_id: Optional[str] = None
     
     # ORM 객체(SQLAlchemy model)를 Pydantic 모델로 변환 허용
     class Config:
@@ -63,21 +75,53 @@ class DefectCountItem(BaseModel):
     rust: int
     total_ng: int
 
+# [요청] 불량 유형별 기간 조회
+class DefectLogRequest(BaseModel):
+    defectType: str  # "shape" | "hole" | "rust"
+    startDate: str   # "yyyy-MM-dd"
+    endDate: str     # "yyyy-MM-dd"
+
+# [응답] 불량 유형별 조회 아이템
+class DefectLogItem(BaseModel):
+    mid: int
+    measured_at: Optional[str]
+    result: str
+    fail_reason: Optional[str]
+    hole_offset: Optional[float]
+
 # [응답] 전체 통계 응답 (C# ServerStats와 매핑)
 class StatisticsResponse(BaseModel):
     daily_data: List[DailyStatItem]
     counts: DefectCountItem
 
+# 타임라인 요약 조회 최대 행 수 (기간 안에서 최신 순)
+TRACE_SUMMARY_LIMIT = 5000
+
+# 요청 값 -> 불량 유형 플래그 컬럼 매핑 ("center"는 WPF 통계 카드 이름)
+DEFECT_TYPE_COLUMNS = {
+    "shape": Measurement.defect_shape,
+    "hole": Measurement.defect_hole,
+    "center": Measurement.defect_hole,
+    "rust": Measurement.defect_rust,
+}
+
 @router.post("/logs", response_model=List[LogResponse])
-def get_logs(req: LogRequest, db: Session = Depends(get_db)):
-    logs = db.query(Measurement).join(Product)\
-             .filter(Measurement.measured_at.like(f"{req.startDate}%"))\
-             .order_by(Measurement.measure_id.desc())\
-             .all()
+async def get_logs(req: LogRequest, db: AsyncSession = Depends(get_async_db)):
+    # 목록에 필요한 컬럼만 조회 (외곽선 등 큰 컬럼은 읽지 않음)
+    logs = (await db.execute(
+        select(
+            Measurement.measure_id,
+            Measurement.measured_at,
+            Measurement.inspection_result,
+            Product.product_name
+        ).join(Product, Measurement.product_id == Product.product_id)
+         .filter(Measurement.measured_at.like(f"{req.startDate}%"))
+         .order_by(Measurement.measure_id.desc())
+    )).all()
 
     results = []
     for log in logs:
-        p_name = log.product.product_name if log.product else "Unknown"
+        p_name = log.product_name if log.product_name else "Unknown"
         measured_date_str = ""
         if log.measured_at:
 
@@ -95,17 +139,22 @@ def get_logs(req: LogRequest, db: Session = Depends(get_db)):
         ))
     return results
 
+def _result_image_path(stored_path):
+    """ DB에 저장된 결과 이미지 경로 -> 서버 로컬 파일 경로 """
+    if not stored_path:
+        return None
+    return os.path.join("results", stored_path.replace("\\", "/"))
+
 # --- [6] 이미지 상세 조회 (WPF 연동용) ---
 @router.get("/logs/{mid}/images", response_model=ImageResponse)
-def get_log_images(mid: int, db: Session = Depends(get_db)):
-    log = db.query(Measurement).filter(Measurement.measure_id == mid).first()
+async def get_log_images(mid: int, db: AsyncSession = Depends(get_async_db)):
+    log = (await db.execute(
+        select(Measurement).filter(Measurement.measure_id == mid)
+    )).scalars().first()
     
     if not log:
         raise HTTPException(status_code=400, detail="Log not found")
 
-    cam1_clean = log.cam1_path.replace("\\", "/") if log.cam1_path else None
-    cam2_clean = log.cam2_path.replace("\\", "/") if log.cam2_path else None
-
     def encode_img_from_path(path_str):
         """파일 경로에서 이미지를 읽어 Base64 문자열로 인코딩."""
         if not path_str or not os.path.exists(path_str):
@@ -118,27 +167,238 @@ def get_log_images(mid: int, db: Session = Depends(get_db)):
         except Exception:
             return None 
 
+    # 파일 읽기/인코딩은 이벤트 루프를 막지 않도록 스레드풀에서 처리
     return ImageResponse(
-        img1_base64=encode_img_from_path(os.path.join("results",cam1_clean)),
-        img2_base64=encode_img_from_path(os.path.join("results",cam2_clean))
+        img1_base64=await run_in_threadpool(encode_img_from_path, _result_image_path(log.cam1_path)),
+        img2_base64=await run_in_threadpool(encode_img_from_path, _result_image_path(log.cam2_path))
+    )
+
+def _stat_file(path):
+    """ 파일 정보 (없거나 일반 파일이 아니면 None) - 느린/네트워크 저장소일 수 있으므로 스레드풀에서 호출 """
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+def _thumbnail_with_stat(path, size):
+    """ 썸네일 생성/조회 + 파일 정보를 스레드풀 호출 한 번에 """
+    thumb_path = thumbnail_cache.get(path, size)
+    return thumb_path, _stat_file(thumb_path)
+
+def _image_file_response(request: Request, path: str, st: os.stat_result):
+    """
+    JPEG 파일을 그대로 스트리밍합니다.
+    FileResponse가 ETag/Last-Modified 헤더와 Range(206) 요청을 처리하고,
+    여기서는 If-None-Match / If-Modified-Since 조건부 요청에 304로 응답합니다.
+    st: 미리 스레드풀에서 구한 파일 정보 (이벤트 루프에서 stat 하지 않고, 전송할 때도 다시 stat 하지 않음)
+    """
+    response = FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": "private, max-age=86400"},
+                            stat_result=st)
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    not_modified = (
+        (if_none_match and response.headers["etag"] in [tag.strip() for tag in if_none_match.split(",")])
+        or (not if_none_match and if_modified_since == response.headers["last-modified"])
     )
+    if not_modified:
+        return Response(status_code=304, headers={
+            "ETag": response.headers["etag"],
+            "Last-Modified": response.headers["last-modified"],
+            "Cache-Control": response.headers["cache-control"],
+        })
+    return response
+
+async def _find_log_image(db: AsyncSession, mid: int, cam: int):
+    """ 결과 이미지 경로와 파일 정보 -> (path, stat_result) """
+    if cam not in (1, 2):
+        raise HTTPException(status_code=400, detail="cam은 1(상부) 또는 2(하부)만 가능합니다.")
+
+    log = (await db.execute(
+        select(Measurement).filter(Measurement.measure_id == mid)
+    )).scalars().first()
+    if not log:
+        raise HTTPException(status_code=404, detail="Log not found")
+
+    path = _result_image_path(log.cam1_path if cam == 1 else log.cam2_path)
+    st = await run_in_threadpool(_stat_file, path)   # 존재 확인 + stat을 한 번에
+    if st is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return path, st
+
+@router.get("/logs/{mid}/images/{cam}")
+async def get_log_image_raw(mid: int, cam: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """ 결과 이미지 원본(JPEG)을 Base64 없이 그대로 내려줍니다. (브라우저 캐시/Range 지원) """
+    path, st = await _find_log_image(db, mid, cam)
+    return _image_file_response(request, path, st)
+
+@router.get("/logs/{mid}/images/{cam}/thumb")
+async def get_log_image_thumb(mid: int, cam: int, request: Request, size: int = THUMB_DEFAULT_SIZE, db: AsyncSession = Depends(get_async_db)):
+    """ 결과 이미지 썸네일 (최초 요청 시 1회 생성 후 캐시) """
+    if not 32 <= size <= 1024:
+        raise HTTPException(status_code=400, detail="size는 32~1024 사이여야 합니다.")
+
+    path, _ = await _find_log_image(db, mid, cam)
+    thumb_path, st = await run_in_threadpool(_thumbnail_with_stat, path, size)
+    if st is None:
+        raise HTTPException(status_code=500, detail="썸네일 생성 실패")
+    return _image_file_response(request, thumb_path, st)
 
 @router.get("/logsdetail", response_model=LogDetailResponse)
-def get_log_detail(mid: int, db: Session = Depends(get_db)):
+async def get_log_detail(mid: int, db: AsyncSession = Depends(get_async_db)):
     """
     특정 로그(mid)의 상세 정보를 반환합니다. (이미지 경로는 제외)
     """
-    log = db.query(Measurement).filter(Measurement.measure_id == mid).first()
+    log = (await db.execute(
+        select(Measurement).options(undefer(Measurement.contour_blob)).filter(Measurement.measure_id == mid)
+    )).scalars().first()
     
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
         
     # Pydantic 모델(LogDetailResponse)이 알아서 cam1_path, cam2_path를 걸러내고
     # 정의된 필드만 JSON으로 변환해줍니다.
-    return log
+    detail = LogDetailResponse.model_validate(log)
+
+    # 외곽선이 바이너리로 저장된 경우 기존 WPF 형식(JSON 문자열)으로 풀어서 내려줍니다.
+    if log.contour_blob:
+        detail.measured_contour = contour_to_json(log.contour_blob)
+    return detail
+
+@router.get("/logs/{mid}/contour")
+async def get_log_contour(mid: int, format: str = "json", db: AsyncSession = Depends(get_async_db)):
+    """
+    외곽선 좌표만 따로 조회합니다.
+    - format=json : {"x": [...], "y": [...]}
+    - format=bin  : 저장된 바이너리 그대로 (application/octet-stream, 포맷은 vali/contour_codec.py)
+    """
+    log = (await db.execute(
+        select(Measurement).options(undefer(Measurement.contour_blob)).filter(Measurement.measure_id == mid)
+    )).scalars().first()
+    if not log:
+        raise HTTPException(status_code=404, detail="Log not found")
+
+    blob = log.contour_blob
+    if not blob and log.measured_contour and log.measured_contour != "{}":
+        # 아직 변환되지 않은 구버전 JSON 행 (깨진 JSON은 마이그레이션처럼 빈 외곽선으로 취급)
+        try:
+            legacy = json.loads(log.measured_contour)
+            blob = encode_contour(legacy.get("x", []), legacy.get("y", []))
+        except (ValueError, TypeError, AttributeError):
+            blob = b""
+
+    if format == "bin":
+        return Response(content=blob or b"", media_type="application/octet-stream")
+    if format != "json":
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 형식: {format}")
+
+    return contour_to_dict(blob) if blob else {"x": [], "y": []}
     
+@router.get("/logs/{mid}/trace")
+async def get_log_trace(mid: int, format: str = "json", db: AsyncSession = Depends(get_async_db)):
+    """
+    검사 1건의 단계별 타임라인 (CHECK ~ 촬영 ~ 알고리즘 단계 ~ DB 저장)
+    - format=json : [{"name", "start_ms", "duration_ms", "children": [...]}]
+    - format=bin  : 저장된 바이너리 그대로 (포맷은 vali/trace_codec.py)
+    """
+    blob = (await db.execute(
+        select(Measurement.trace_blob).filter(Measurement.measure_id == mid)
+    )).scalar_one_or_none()
+    if not blob:
+        raise HTTPException(status_code=404, detail="Trace not found")
+
+    if format == "bin":
+        return Response(content=blob, media_type="application/octet-stream")
+    if format != "json":
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 형식: {format}")
+    return {"measure_id": mid, "spans": trace_to_tree(blob)}
+
+def _summarize_traces(blobs):
+    """ 타임라인 BLOB 목록 -> 단계별 p50/p95/p99 (ms) """
+    samples = {}
+    for blob in blobs:
+        try:
+            durations = stage_durations(blob)
+        except Exception:
+            continue  # 깨진 BLOB은 건너뜀
+        for name, seconds in durations.items():
+            samples.setdefault(name, []).append(seconds * 1000)
+
+    stages = {}
+    for name, values in samples.items():
+        arr = np.asarray(values)
+        p50, p95, p99 = np.percentile(arr, (50, 95, 99))
+        stages[name] = {"count": len(values), "p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2),
+                        "p99_ms": round(float(p99), 2), "max_ms": round(float(arr.max()), 2)}
+    return stages
+
+@router.get("/traces/summary")
+async def get_trace_summary(minutes: int = 60, start: Optional[str] = None, end: Optional[str] = None,
+                            db: AsyncSession = Depends(get_async_db)):
+    """
+    기간 안 검사들의 단계별 소요 시간 분포 (p50/p95/p99, ms)
+    - start/end 를 주면 그 기간 ("yyyy-MM-dd HH:mm:ss" 또는 "yyyy-MM-dd")
+    - 없으면 최근 minutes 분
+    """
+    if start is None:
+        if minutes <= 0:
+            raise HTTPException(status_code=400, detail="minutes는 1 이상이어야 합니다.")
+        start = (datetime.now() - timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S")
+    if end is None:
+        end = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    elif len(end) == 10:
+        end += " 23:59:59"
+
+    blobs = (await db.execute(
+        select(Measurement.trace_blob).filter(
+            and_(Measurement.measured_at >= start, Measurement.measured_at <= end, Measurement.trace_blob.isnot(None))
+        ).order_by(Measurement.measured_at.desc()).limit(TRACE_SUMMARY_LIMIT)
+    )).scalars().all()
+
+    stages = await run_in_threadpool(_summarize_traces, blobs)
+    return {"start": start, "end": end, "inspections": len(blobs), "stages": stages}
+
+@router.post("/logs/defects", response_model=List[DefectLogItem])
+async def get_defect_logs(req: DefectLogRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    특정 불량 유형(shape/hole/rust)의 NG 로그를 기간으로 조회합니다.
+    (defect_* + measured_at 복합 인덱스만 타므로 fail_reason 문자열을 파싱하지 않습니다)
+    """
+    flag_col = DEFECT_TYPE_COLUMNS.get(req.defectType.lower())
+    if flag_col is None:
+        raise HTTPException(status_code=400, detail=f"알 수 없는 불량 유형: {req.defectType}")
+
+    start_dt = req.startDate + " 00:00:00"
+    end_dt = req.endDate + " 23:59:59"
+
+    rows = (await db.execute(select(
+        Measurement.measure_id,
+        Measurement.measured_at,
+        Measurement.inspection_result,
+        Measurement.fail_reason,
+        Measurement.hole_offset
+    ).filter(
+        and_(flag_col == 1, Measurement.measured_at >= start_dt, Measurement.measured_at <= end_dt)
+    ).order_by(
+        Measurement.measured_at.desc()
+    ))).all()
+
+    return [
+        DefectLogItem(
+            mid=row.measure_id,
+            measured_at=str(row.measured_at) if row.measured_at else None,
+            result=row.inspection_result or "",
+            fail_reason=row.fail_reason,
+            hole_offset=row.hole_offset
+        )
+        for row in rows
+    ]
+
 @router.post("/statistics", response_model=StatisticsResponse)
-def get_statistics(req: StatisticsRequest, db: Session = Depends(get_db)):
+async def get_statistics(req: StatisticsRequest, db: AsyncSession = Depends(get_async_db)):
     """
     선택한 기간(startDate ~ endDate) 동안의:
     1. 일별 검사 수량 및 불량 수량 (그래프용)
@@ -152,7 +412,7 @@ def get_statistics(req: StatisticsRequest, db: Session = Depends(get_db)):
     
     date_col = func.strftime('%Y-%m-%d', Measurement.measured_at).label("date")
     
-    daily_stats = db.query(
+    daily_stats = (await db.execute(select(
         date_col,
         func.count(Measurement.measure_id).label("total"),
         func.sum(case((Measurement.inspection_result == 'NG', 1), else_=0)).label("defect")
@@ -162,7 +422,7 @@ def get_statistics(req: StatisticsRequest, db: Session = Depends(get_db)):
         date_col
     ).order_by(
         date_col.asc()
-    ).all()
+    ))).all()
 
     daily_data_list = []
     for row in daily_stats:
@@ -175,35 +435,24 @@ def get_statistics(req: StatisticsRequest, db: Session = Depends(get_db)):
     # =========================================================
     # [Query 2] 불량 유형별 집계 (Defect Counts) - 하단 카드용
     # =========================================================
-    # NG 항목만 조회하여 fail_reason을 분석합니다.
-    ng_logs = db.query(Measurement.fail_reason).filter(
+    # fail_reason 문자열 대신 유형별 플래그 컬럼(defect_*)을 바로 합산합니다.
+    counts = (await db.execute(select(
+        func.count(Measurement.measure_id).label("total_ng"),
+        func.sum(Measurement.defect_shape).label("shape"),
+        func.sum(Measurement.defect_hole).label("center"),
+        func.sum(Measurement.defect_rust).label("rust")
+    ).filter(
         and_(
             Measurement.measured_at >= start_dt, 
             Measurement.measured_at <= end_dt,
             Measurement.inspection_result == 'NG'
         )
-    ).all()
-
-    count_shape = 0
-    count_center = 0
-    count_rust = 0
-    total_ng = len(ng_logs)
+    ))).one()
 
-    # fail_reason 문자열을 분석하여 카운팅 (C# 로직에 맞춰 키워드 분류)
-    # 실제 DB에 저장되는 fail_reason 텍스트에 맞춰 키워드를 수정하세요.
-    for log in ng_logs:
-        reason = (log.fail_reason or "").upper()
-        
-        if "SHAPE" in reason or "CONTOUR" in reason or "SIZE" in reason or "WIDTH" in reason:
-            count_shape += 1
-        elif "CENTER" in reason or "HOLE" in reason or "OFFSET" in reason:
-            count_center += 1
-        elif "RUST" in reason or "STAIN" in reason or "COLOR" in reason:
-            count_rust += 1
-        else:
-            # 기타 불량은 가장 가까운 유형이나 별도 처리가 필요하면 추가
-            # 현재는 분류되지 않은 경우 shape로 퉁치거나 무시할 수 있음
-            count_shape += 1 # 기본값 처리 예시
+    count_shape = counts.shape or 0
+    count_center = counts.center or 0
+    count_rust = counts.rust or 0
+    total_ng = counts.total_ng or 0
 
     counts_data = DefectCountItem(
         shape=count_shape,
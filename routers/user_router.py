@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status, Response
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from models import User, get_db
+from models import User, get_async_db
 from security import Hash, create_access_token, verify_token
 
 # API 주소 프리픽스 (/api/login이 됨)
@@ -20,18 +22,20 @@ class UserLogin(BaseModel):
 
 # --- [1] 회원가입 ---
 @router.post("/signup")
-def signup(request: UserSignup, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.login_id == request.id).first():
+async def signup(request: UserSignup, db: AsyncSession = Depends(get_async_db)):
+    exists = (await db.execute(select(User).filter(User.login_id == request.id))).scalars().first()
+    if exists:
         raise HTTPException(status_code=401, detail="이미 존재하는 ID입니다.")
 
+    # bcrypt 해싱은 CPU 작업이라 이벤트 루프를 막지 않도록 스레드풀에서 실행
     new_user = User(
         login_id=request.id,
-        password_hash=Hash.bcrypt(request.pw),
+        password_hash=await run_in_threadpool(Hash.bcrypt, request.pw),
         user_name=request.name,
         role=request.role # User 권한
     )
     db.add(new_user)
-    db.commit()
+    await db.commit()
     
     return {
         "status" : "success",
@@ -41,11 +45,11 @@ def signup(request: UserSignup, db: Session = Depends(get_db)):
 
 # --- [2] 로그인 (수정됨) ---
 @router.post("/login")
-def login(login_data: UserLogin,response: Response ,db: Session = Depends(get_db)):
+async def login(login_data: UserLogin,response: Response ,db: AsyncSession = Depends(get_async_db)):
     # 1. 유저 확인
-    user = db.query(User).filter(User.login_id == login_data.id).first()
+    user = (await db.execute(select(User).filter(User.login_id == login_data.id))).scalars().first()
     
-    if not user or not Hash.verify(login_data.pw, user.password_hash):
+    if not user or not await run_in_threadpool(Hash.verify, login_data.pw, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_UNAUTHORIZED,
             detail="아이디 또는 비밀번호 오류"
@@ -0,0 +1,402 @@
+import os
+import json
+import time
+import fcntl
+import struct
+import asyncio
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from frame_buffer import SETTLE_THUMB_SIZE
+from metrics import REGISTRY
+from view_tiers import TIER_NAMES
+
+# =========================================================
+# [멀티 워커 모드] 공유 메모리 프레임 버퍼 + 리더 선출
+#
+#   SHARED_FRAMES=1 uvicorn main:app --workers 4
+#
+# - 카메라 송출(/ws/source/N)을 받은 워커가 그 카메라의 수집(ingest) 담당이 되어
+#   공유 메모리 링버퍼에 프레임을 씁니다. (카메라당 담당 워커는 파일 락으로 1개만)
+#     · view 링: 시청자에게 보낼 JPEG (AI 오버레이 포함, 화질 tier별로 1개씩)
+#     · raw 링 : 원본 JPEG + 안정화 감지용 축소 흑백 이미지 (검사 촬영용)
+# - 모든 워커가 view 링을 읽어 자기에게 붙은 시청자들에게 전송합니다.
+#   각 워커는 시청자가 있는 tier를 demand 영역에 표시하고, 수집 워커는 표시된 tier만 인코딩합니다.
+# - 리더 락을 잡은 워커 1개만 MQTT 구독 + 검사 상태머신(InspectionManager)을 실행하고,
+#   raw 링을 읽어 자기 FrameRing을 채웁니다. 리더가 죽으면 다른 워커가 락을 이어받습니다.
+#   리더는 검사/MQTT/핫 폴더 상태를 status 링에 주기적으로 올리고, 다른 워커는 그 값으로 응답합니다.
+# - 워커마다 번호(worker 락 0..SHM_WORKER_SLOTS-1 중 처음 잡은 것)를 받아 자기 메트릭을 metrics 링에 올림
+#   -> /metrics는 어느 워커가 받든 살아 있는 모든 워커의 메트릭을 worker 라벨을 붙여 응답
+# - 공유 메모리 생성/정리는 init 락 안에서만: 처음 뜬 워커가 만들고(이전 실행이 남긴 것은 지우고 새로),
+#   마지막으로 내려가는 워커가 지웁니다. (users 락: 살아 있는 워커마다 공유 락 1개)
+# =========================================================
+
+SHARED_MODE = os.getenv("SHARED_FRAMES", "0") == "1"
+SHM_PREFIX = os.getenv("SHARED_FRAMES_PREFIX", "factory")
+SHM_SLOTS = 4                       # 링버퍼 슬롯 수 (읽는 쪽은 항상 최신 슬롯만 사용)
+SHM_VIEW_SLOT_BYTES = 2 * 1024 * 1024
+SHM_RAW_SLOT_BYTES = 4 * 1024 * 1024
+SHM_POLL_INTERVAL = 0.005           # 읽는 쪽 폴링 간격(초)
+TIER_DEMAND_WINDOW = 2.0            # 이 시간 안에 표시된 tier만 '시청 중'으로 간주(초)
+STREAM_NAMES = TIER_NAMES + ("h264",)  # JPEG 화질 단계들 + H.264 스트림 (슬롯 = [키프레임 여부 1바이트] + 패킷)
+SHM_STATUS_SLOT_BYTES = 1024 * 1024  # 리더 상태(JSON) 슬롯 크기
+STATUS_PUBLISH_INTERVAL = 0.5        # 리더가 상태를 올리는 간격(초)
+SHM_WORKER_SLOTS = int(os.getenv("SHARED_WORKER_SLOTS", 16))   # 최대 워커 수 (워커 번호 = 메트릭 worker 라벨)
+SHM_METRICS_SLOT_BYTES = 1024 * 1024  # 워커 메트릭(JSON) 슬롯 크기
+METRICS_PUBLISH_INTERVAL = 1.0        # 워커가 메트릭을 올리는 간격(초)
+METRICS_STALE_SECONDS = 10.0          # 이 시간 동안 갱신이 없는 워커(비정상 종료)의 메트릭은 응답에서 뺌
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCK_DIR = os.path.join(BASE_DIR, "data")
+THUMB_BYTES = SETTLE_THUMB_SIZE[0] * SETTLE_THUMB_SIZE[1]
+
+_MAGIC = b"FRMRING1"
+_HEADER = struct.Struct("<8sIIQ")    # magic, 슬롯 수, 슬롯 크기, 마지막으로 쓴 순번
+_HEADER_SIZE = 64
+_SLOT = struct.Struct("<QdI")        # 순번, 수신 시각(time.monotonic), 데이터 길이
+_SLOT_HDR_SIZE = 32
+_RAW_META = struct.Struct("<qdHH")   # raw 슬롯 앞머리: 송출 순번(-1=없음), 촬영 시각, 해상도
+
+
+def _open_shm(name, size):
+    """ 공유 메모리 연결 (없으면 0으로 채워진 새 세그먼트 생성) """
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        shm = shared_memory.SharedMemory(name=name)
+    # 수명은 직접 관리 (워커 하나가 종료될 때 resource_tracker가 지워버리지 않도록, 삭제는 FrameSharing.close)
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def _unlink_shm(name):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    shm.unlink()   # 연결 때 resource_tracker에 등록된 이름도 여기서 같이 해제됨
+    return True
+
+
+class SharedFrameRing:
+    """
+    [공유 메모리 링버퍼] 쓰는 프로세스 1개, 읽는 프로세스 여러 개.
+    슬롯 순번을 '쓰기 전 0 -> 쓴 뒤 n'으로 바꾸고, 읽는 쪽은 복사 전후 순번을 비교해
+    쓰는 도중의 슬롯을 읽지 않도록 합니다. (seqlock 방식, 락 없음)
+    """
+    def __init__(self, name, slots=SHM_SLOTS, slot_bytes=SHM_VIEW_SLOT_BYTES):
+        """ 생성/연결은 FrameSharing의 init 락 안에서 (만든 워커가 헤더를 다 쓰기 전에 다른 워커가 읽지 않도록) """
+        self.name = name
+        size = _HEADER_SIZE + slots * (_SLOT_HDR_SIZE + slot_bytes)
+        self.shm = _open_shm(name, size)
+        if self.shm.buf[:len(_MAGIC)] != _MAGIC:
+            _HEADER.pack_into(self.shm.buf, 0, _MAGIC, slots, slot_bytes, 0)   # 새로 만든 세그먼트
+        _, self.slots, self.slot_bytes, _ = _HEADER.unpack_from(self.shm.buf, 0)
+        self.stride = _SLOT_HDR_SIZE + self.slot_bytes
+        self.too_large = REGISTRY.counter("shm_frame_too_large_total", "슬롯보다 커서 버린 프레임 수", ring=name)
+
+    @property
+    def write_seq(self):
+        return _HEADER.unpack_from(self.shm.buf, 0)[3]
+
+    def write(self, parts, ts=None):
+        """ 바이트 조각들을 이어 붙여 다음 슬롯에 씁니다. (수집 담당 워커만 호출) """
+        length = sum(len(p) for p in parts)
+        if length > self.slot_bytes:
+            self.too_large.inc()
+            return False
+
+        seq = self.write_seq + 1
+        off = _HEADER_SIZE + (seq % self.slots) * self.stride
+        buf = self.shm.buf
+        _SLOT.pack_into(buf, off, 0, 0.0, 0)           # 쓰는 중 표시
+        pos = off + _SLOT_HDR_SIZE
+        for p in parts:
+            buf[pos:pos + len(p)] = p
+            pos += len(p)
+        _SLOT.pack_into(buf, off, seq, ts if ts is not None else time.monotonic(), length)
+        struct.pack_into("<Q", buf, 16, seq)           # 헤더의 마지막 순번 갱신
+        return True
+
+    def read_latest(self, after_seq=0):
+        """ after_seq보다 새로운 최신 프레임 -> (seq, ts, bytes), 없으면 None """
+        for _ in range(3):
+            seq = self.write_seq
+            if seq <= after_seq:
+                return None
+            off = _HEADER_SIZE + (seq % self.slots) * self.stride
+            s1, ts, length = _SLOT.unpack_from(self.shm.buf, off)
+            data = bytes(self.shm.buf[off + _SLOT_HDR_SIZE: off + _SLOT_HDR_SIZE + length])
+            s2 = _SLOT.unpack_from(self.shm.buf, off)[0]
+            if s1 == s2 == seq:
+                return seq, ts, data
+        return None  # 계속 덮어써지는 중이면 이번 폴링은 건너뜀
+
+    def close(self):
+        self.shm.close()
+
+
+class TierDemand:
+    """ [공유 메모리] 카메라별 tier 시청 여부 (tier마다 마지막 표시 시각 1개, 여러 워커가 덮어써도 무방) """
+    def __init__(self, name):
+        self.name = name
+        self.shm = _open_shm(name, 8 * len(STREAM_NAMES))   # 새 세그먼트는 0으로 채워져 있음 (= 시청 없음)
+        self.times = np.ndarray((len(STREAM_NAMES),), np.float64, buffer=self.shm.buf)
+
+    def mark(self, tiers):
+        now = time.monotonic()
+        for tier in tiers:
+            self.times[STREAM_NAMES.index(tier)] = now
+
+    def active(self):
+        cutoff = time.monotonic() - TIER_DEMAND_WINDOW
+        return {tier for i, tier in enumerate(STREAM_NAMES) if self.times[i] > cutoff}
+
+    def close(self):
+        del self.times
+        self.shm.close()
+
+
+class SharedCounter:
+    """ [공유 메모리] 정수 1개 (리더가 쓰고 모든 워커가 읽음, 8바이트 정렬 쓰기라 락 없음) """
+    def __init__(self, name):
+        self.name = name
+        self.shm = _open_shm(name, 8)   # 새 세그먼트는 0
+        self.cell = np.ndarray((1,), np.int64, buffer=self.shm.buf)
+
+    def get(self):
+        return int(self.cell[0])
+
+    def set(self, value):
+        self.cell[0] = value
+
+    def close(self):
+        del self.cell
+        self.shm.close()
+
+
+class FileLock:
+    """ 프로세스 간 배타 락 (fcntl.flock, 잡은 프로세스가 죽으면 OS가 자동 해제) """
+    def __init__(self, name):
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        self.path = os.path.join(LOCK_DIR, f"{name}.lock")
+        self.fd = None
+
+    def acquire(self, blocking=False, shared=False):
+        """ shared=True: 공유 락 (여러 프로세스가 동시에 잡음, 배타 락과는 배타) """
+        if self.fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(fd, mode if blocking else mode | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        if not shared:
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+    @property
+    def held(self):
+        return self.fd is not None
+
+
+class FrameSharing:
+    """ 카메라별 공유 링버퍼(tier별 view/raw) 묶음 + 수집 담당 락 """
+    def __init__(self, camera_indices):
+        self.ingest_locks = {i: FileLock(f"{SHM_PREFIX}_ingest_cam{i}") for i in camera_indices}
+        self.leader_lock = FileLock(f"{SHM_PREFIX}_leader")
+        self.init_lock = FileLock(f"{SHM_PREFIX}_init")   # 공유 메모리 생성/삭제, DB 마이그레이션 등 시작 작업 직렬화
+        self.users_lock = FileLock(f"{SHM_PREFIX}_users") # 살아 있는 워커마다 공유 락 (아무도 없으면 배타 락이 잡힘)
+
+        self.init_lock.acquire(blocking=True)
+        try:
+            if self.users_lock.acquire():
+                # 살아 있는 워커가 없음 -> 이전 실행이 (비정상 종료로) 남긴 세그먼트는 지우고 새로 만듦
+                self.users_lock.release()
+                stale = [name for name in self.segment_names(camera_indices) if _unlink_shm(name)]
+                if stale:
+                    print(f"🧹 [Shared] 이전 실행이 남긴 공유 메모리 {len(stale)}개 정리")
+            self.users_lock.acquire(blocking=True, shared=True)
+            # 워커 번호: 비어 있는 worker 락 중 처음 것 (워커가 죽으면 OS가 풀어 새 워커가 같은 번호를 이어받음)
+            self.worker_locks = [FileLock(f"{SHM_PREFIX}_worker{n}") for n in range(SHM_WORKER_SLOTS)]
+            self.worker_index = next((n for n, lock in enumerate(self.worker_locks) if lock.acquire()), None)
+            if self.worker_index is None:
+                raise RuntimeError(f"워커 수가 SHARED_WORKER_SLOTS({SHM_WORKER_SLOTS})를 넘습니다.")
+            # 실제 메모리는 쓰여진 페이지만 사용하므로 시청자 없는 tier 링은 비용이 거의 없음
+            self.view = {i: {tier: SharedFrameRing(f"{SHM_PREFIX}_cam{i}_view_{tier}", slot_bytes=SHM_VIEW_SLOT_BYTES)
+                             for tier in STREAM_NAMES} for i in camera_indices}
+            self.demand = {i: TierDemand(f"{SHM_PREFIX}_cam{i}_demand") for i in camera_indices}
+            self.raw = {i: SharedFrameRing(f"{SHM_PREFIX}_cam{i}_raw", slot_bytes=SHM_RAW_SLOT_BYTES) for i in camera_indices}
+            self.status = SharedFrameRing(f"{SHM_PREFIX}_status", slot_bytes=SHM_STATUS_SLOT_BYTES)
+            # 리더에서 돌고 있는 정밀 검사 계산 수 (수집 워커가 미리보기 추론 감속에 사용)
+            self.inspections = SharedCounter(f"{SHM_PREFIX}_inspections")
+            self.metrics = [SharedFrameRing(f"{SHM_PREFIX}_metrics_w{n}", slots=2, slot_bytes=SHM_METRICS_SLOT_BYTES)
+                            for n in range(SHM_WORKER_SLOTS)]
+        finally:
+            self.init_lock.release()
+
+    @staticmethod
+    def segment_names(camera_indices):
+        names = [f"{SHM_PREFIX}_status", f"{SHM_PREFIX}_inspections"]
+        names += [f"{SHM_PREFIX}_metrics_w{n}" for n in range(SHM_WORKER_SLOTS)]
+        for i in camera_indices:
+            names += [f"{SHM_PREFIX}_cam{i}_view_{tier}" for tier in STREAM_NAMES]
+            names += [f"{SHM_PREFIX}_cam{i}_demand", f"{SHM_PREFIX}_cam{i}_raw"]
+        return names
+
+    @property
+    def is_leader(self):
+        return self.leader_lock.held
+
+    # --- 수집 담당 워커 ---
+    def demanded_tiers(self, camera_index):
+        """ 어느 워커에서든 시청 중인 tier들 """
+        return self.demand[camera_index].active()
+
+    def publish(self, camera_index, view_jpegs, raw_jpeg, thumb, meta, h264_packets=()):
+        """
+        view_jpegs: {tier: bytes 또는 cv2.imencode 결과 배열} (복사 없이 공유 메모리로)
+        h264_packets: [(seq, 패킷, 키프레임 여부)] -> 패킷마다 슬롯 1개 (읽는 쪽은 슬롯 순번으로 누락 감지)
+        meta: frame_protocol.FrameMeta (view 슬롯 시각 = 촬영 시각, raw 슬롯 시각 = 수신 시각)
+        """
+        view_ts = meta.server_capture_ts
+        for tier, jpeg in view_jpegs.items():
+            if isinstance(jpeg, np.ndarray):
+                jpeg = jpeg.reshape(-1)   # imencode 결과가 (N, 1)이어도 바이트 순서대로 1차원으로
+            self.view[camera_index][tier].write((jpeg,), view_ts)
+        for _, packet, is_key in h264_packets:
+            self.view[camera_index]["h264"].write((b"\x01" if is_key else b"\x00", packet), view_ts)
+        # raw 슬롯 = [송출 헤더 정보] + [축소 흑백 이미지(고정 크기)] + [원본 JPEG]
+        head = _RAW_META.pack(meta.seq if meta.seq is not None else -1,
+                              meta.capture_ts if meta.capture_ts is not None else float("nan"),
+                              meta.width, meta.height)
+        self.raw[camera_index].write((head, thumb.reshape(-1), raw_jpeg), meta.received_at)
+
+    # --- 모든 워커: 시청자 전송 ---
+    async def follow_view(self, camera_index, local_tiers, on_frame):
+        """ local_tiers(): 이 워커에서 시청 중인 tier들 / on_frame(tier, data, 수신 시각, 슬롯 순번) """
+        rings = self.view[camera_index]
+        demand = self.demand[camera_index]
+        last = {tier: ring.write_seq for tier, ring in rings.items()}
+        while True:
+            tiers = local_tiers()
+            demand.mark(tiers)
+            sent = False
+            for tier, ring in rings.items():
+                if tier not in tiers:
+                    last[tier] = ring.write_seq   # 시청 시작 시 예전 프레임을 보내지 않도록
+                    continue
+                got = ring.read_latest(last[tier])
+                if got is None:
+                    continue
+                last[tier], ts, data = got
+                await on_frame(tier, data, ts, last[tier])
+                sent = True
+            if not sent:
+                await asyncio.sleep(SHM_POLL_INTERVAL)
+
+    # --- 리더 워커: 검사용 FrameRing 채우기 ---
+    async def follow_raw(self, camera_index, frame_ring):
+        ring = self.raw[camera_index]
+        last = ring.write_seq
+        while True:
+            got = ring.read_latest(last)
+            if got is None:
+                await asyncio.sleep(SHM_POLL_INTERVAL)
+                continue
+            last, ts, data = got
+            seq, capture_ts, width, height = _RAW_META.unpack_from(data, 0)
+            meta = {"seq": seq if seq >= 0 else None, "capture_ts": None if capture_ts != capture_ts else capture_ts,
+                    "width": width, "height": height}
+            start = _RAW_META.size
+            thumb = np.frombuffer(data, np.uint8, count=THUMB_BYTES, offset=start).reshape(SETTLE_THUMB_SIZE[1], SETTLE_THUMB_SIZE[0])
+            # 리더는 원본을 디코딩하지 않음 (안정화 감지는 thumb, 촬영은 JPEG 그대로 저장)
+            frame_ring.push(None, thumb, ts, jpeg=data[start + THUMB_BYTES:], meta=meta)
+
+    # --- 리더 상태 공유 (리더가 아닌 워커도 검사/MQTT/핫 폴더 상태 조회에 응답) ---
+    async def publish_status(self, snapshot, interval=STATUS_PUBLISH_INTERVAL):
+        """ [리더] snapshot() -> {키: JSON 변환 가능한 값} 을 주기적으로 status 링에 올림 """
+        while True:
+            data = json.dumps(snapshot(), ensure_ascii=False, default=str).encode("utf-8")
+            if not self.status.write((data,)):
+                print(f"⚠️ [Shared] 리더 상태가 {len(data)} bytes로 슬롯보다 큽니다. (공유 생략)")
+            await asyncio.sleep(interval)
+
+    def leader_status(self, key):
+        """ 리더가 마지막으로 올린 상태 중 key -> (값, 경과 초), 아직 없으면 None """
+        got = self.status.read_latest(0)
+        if got is None:
+            return None
+        _, ts, data = got
+        return json.loads(data).get(key), time.monotonic() - ts
+
+    # --- 워커별 메트릭 공유 (/metrics는 어느 워커가 받든 모든 워커의 값) ---
+    async def publish_metrics(self, export, interval=METRICS_PUBLISH_INTERVAL):
+        """ [모든 워커] export() -> 메트릭 목록 (metrics.export_metrics) 을 주기적으로 자기 metrics 링에 올림 """
+        ring = self.metrics[self.worker_index]
+        while True:
+            data = json.dumps(export(), default=str).encode("utf-8")
+            if not ring.write((data,)):
+                print(f"⚠️ [Shared] 워커 메트릭이 {len(data)} bytes로 슬롯보다 큽니다. (공유 생략)")
+            await asyncio.sleep(interval)
+
+    def worker_metrics(self):
+        """ 다른 워커들이 마지막으로 올린 메트릭 -> [(워커 번호, 메트릭 목록)] (오래 갱신 없는 워커는 제외) """
+        now = time.monotonic()
+        found = []
+        for n, ring in enumerate(self.metrics):
+            if n == self.worker_index:
+                continue
+            got = ring.read_latest(0)
+            if got is None or now - got[1] > METRICS_STALE_SECONDS:
+                continue
+            found.append((n, json.loads(got[2])))
+        return found
+
+    async def wait_for_leadership(self, on_elected, interval=2.0):
+        """ 리더 락을 잡을 때까지 주기적으로 시도하고, 잡으면 on_elected()를 실행합니다. """
+        while not self.leader_lock.acquire():
+            await asyncio.sleep(interval)
+        print(f"👑 [Leader] PID {os.getpid()} 가 MQTT/검사 담당 리더로 선출되었습니다.")
+        self.inspections.set(0)   # 이전 리더가 계산 도중 죽었으면 남아 있는 값
+        await on_elected()
+
+    def close(self):
+        """ 락 반납 + 공유 메모리 연결 해제 (마지막으로 내려가는 워커는 세그먼트 삭제 -> /dev/shm 누수 방지) """
+        if self.leader_lock.held:
+            self.inspections.set(0)   # 계산 중에 내려가도 다른 워커의 미리보기가 계속 감속되지 않도록
+        self.metrics[self.worker_index].write((b"[]",))   # 내려간 워커의 메트릭은 바로 응답에서 빠지도록
+        for lock in self.ingest_locks.values():
+            lock.release()
+        self.leader_lock.release()
+        self.worker_locks[self.worker_index].release()
+        rings = [ring for tiers in self.view.values() for ring in tiers.values()]
+        rings += list(self.raw.values()) + list(self.demand.values()) + [self.status, self.inspections] + self.metrics
+        for ring in rings:
+            ring.close()
+
+        self.init_lock.acquire(blocking=True)
+        try:
+            self.users_lock.release()
+            if self.users_lock.acquire():
+                for ring in rings:
+                    _unlink_shm(ring.name)
+                self.users_lock.release()
+                print(f"🧹 [Shared] 마지막 워커 종료 - 공유 메모리 {len(rings)}개 삭제")
+        finally:
+            self.init_lock.release()
@@ -0,0 +1,138 @@
+import os
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from frame_buffer import FrameRing
+from buffer_pool import FrameBufferPool
+from frame_protocol import SourceTracker
+from metrics import REGISTRY
+
+# =========================================================
+# [스테이션 레지스트리]
+# 스테이션(검사 라인) = 카메라 2대(상부/하부) + MQTT 토픽 + 검사 상태머신 + 프레임 버퍼
+# 서버 하나가 여러 라인을 동시에 구동할 수 있도록 라인별 상태를 서로 분리합니다.
+#
+# 설정: STATION_CONFIG 환경변수(JSON 파일 경로) 또는 프로젝트 폴더의 stations.json
+# 예)
+# [
+#   {"station_id": "line1", "top_camera": 1, "bottom_camera": 2,
+#    "command_topic": "factory/command", "shutter_topic": "factory/shutter/command"},
+#   {"station_id": "line2", "top_camera": 3, "bottom_camera": 4,
+#    "command_topic": "factory/line2/command", "shutter_topic": "factory/line2/shutter/command"}
+# ]
+# 설정 파일이 없으면 기존 단일 라인(카메라 1, 2) 구성으로 동작합니다.
+# =========================================================
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATION_CONFIG_FILE = os.getenv("STATION_CONFIG", os.path.join(BASE_DIR, "stations.json"))
+
+DEFAULT_STATIONS = [
+    {
+        "station_id": "line1",
+        "top_camera": 1,
+        "bottom_camera": 2,
+        "command_topic": "factory/command",
+        "shutter_topic": "factory/shutter/command",
+    }
+]
+
+
+class CameraState:
+    """ 카메라 1대의 실시간 상태 (웹소켓 송출용 마지막 프레임, 검사용 원본, 링버퍼) """
+    def __init__(self, index: int, station_id: str, role: str):
+        self.index = index
+        self.station_id = station_id
+        self.role = role                          # "top" | "bottom"
+        self.last_frame = None                    # 웹소켓 전송용 (JPEG, bytes 또는 memoryview)
+        self.latest_cv: Optional[np.ndarray] = None  # 검사용 원본 (OpenCV객체)
+        self.counter = 0                          # 수신 프레임 수
+        self.ring = FrameRing()                   # 최근 프레임 (수신 시각 포함)
+        self.pool = FrameBufferPool(f"cam{index}")  # AI 오버레이 캔버스 재사용
+        self.h264 = None                          # H.264 인코더 (H.264 시청자가 생기면 만듦)
+        self.source = SourceTracker(index)        # 송출 순번/누락/시계 차이
+        # 송출 처리 단계별 소요 시간 (실행기 대기 시간 제외)
+        self.timers = {stage: REGISTRY.histogram("frame_stage_seconds", "카메라 프레임 처리 단계별 소요 시간",
+                                                 camera=str(index), stage=stage)
+                       for stage in ("decode", "infer", "encode", "h264", "publish")}
+        self.viewers = REGISTRY.gauge("viewers", "카메라별 접속 시청자 수", camera=str(index))
+
+
+class Station:
+    def __init__(self, station_id: str, top_camera: int, bottom_camera: int,
+                 command_topic: str, shutter_topic: str):
+        self.station_id = station_id
+        self.command_topic = command_topic
+        self.shutter_topic = shutter_topic
+        self.shutter_state = "UP"
+        self.cameras: Dict[str, CameraState] = {
+            "top": CameraState(top_camera, station_id, "top"),
+            "bottom": CameraState(bottom_camera, station_id, "bottom"),
+        }
+        self.inspection = None  # InspectionManager (main.py에서 연결)
+
+    @property
+    def top(self) -> CameraState:
+        return self.cameras["top"]
+
+    @property
+    def bottom(self) -> CameraState:
+        return self.cameras["bottom"]
+
+    def describe(self):
+        return {
+            "station_id": self.station_id,
+            "top_camera": self.top.index,
+            "bottom_camera": self.bottom.index,
+            "command_topic": self.command_topic,
+            "shutter_topic": self.shutter_topic,
+            "shutter_state": self.shutter_state,
+        }
+
+
+class StationRegistry:
+    def __init__(self, configs: List[dict]):
+        self.stations: Dict[str, Station] = {}
+        self.cameras: Dict[int, CameraState] = {}
+        self.by_command_topic: Dict[str, Station] = {}
+
+        for conf in configs:
+            station = Station(
+                conf["station_id"], int(conf["top_camera"]), int(conf["bottom_camera"]),
+                conf["command_topic"], conf["shutter_topic"]
+            )
+            if station.station_id in self.stations:
+                raise ValueError(f"스테이션 ID 중복: {station.station_id}")
+            if station.command_topic in self.by_command_topic:
+                raise ValueError(f"명령 토픽 중복: {station.command_topic}")
+            for cam in station.cameras.values():
+                if cam.index in self.cameras:
+                    raise ValueError(f"카메라 번호 중복: {cam.index}")
+                self.cameras[cam.index] = cam
+
+            self.stations[station.station_id] = station
+            self.by_command_topic[station.command_topic] = station
+
+    @classmethod
+    def from_config(cls, path=STATION_CONFIG_FILE):
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                configs = json.load(f)
+            print(f"🏭 [Station] 설정 로드: {path} ({len(configs)}개 라인)")
+        else:
+            configs = DEFAULT_STATIONS
+        return cls(configs)
+
+    def camera(self, camera_index: int) -> Optional[CameraState]:
+        return self.cameras.get(camera_index)
+
+    def station_of(self, camera_index: int) -> Optional[Station]:
+        cam = self.cameras.get(camera_index)
+        return self.stations[cam.station_id] if cam else None
+
+    def command_topics(self):
+        return list(self.by_command_topic.keys())
+
+    def __iter__(self):
+        return iter(self.stations.values())
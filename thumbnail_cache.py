@@ -0,0 +1,130 @@
+import os
+import struct
+import hashlib
+import threading
+import cv2
+
+# --- [썸네일 캐시 설정] ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+THUMB_DIR = os.path.join(BASE_DIR, "static", "thumb_cache")
+THUMB_MAX_BYTES = 200 * 1024 * 1024   # 캐시 전체 용량 한도 (초과 시 오래 안 쓴 것부터 삭제)
+THUMB_DEFAULT_SIZE = 320              # 긴 변 기준 픽셀
+THUMB_QUALITY = 80
+
+# JPEG 축소 디코딩 (배율, 플래그) - 큰 배율부터 시도
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(path):
+    """ JPEG 헤더(SOF)만 읽어서 (가로, 세로) 반환 (JPEG가 아니거나 헤더가 깨졌으면 None) """
+    with open(path, "rb") as f:
+        data = f.read(64 * 1024)
+    if data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 9 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:   # 채움 바이트
+            pos += 1
+            continue
+        length = struct.unpack_from(">H", data, pos + 2)[0]
+        if marker in _JPEG_SOF:
+            h, w = struct.unpack_from(">HH", data, pos + 5)
+            return w, h
+        pos += 2 + length
+    return None
+
+
+def thumb_decode_flag(src_path, size):
+    """ 축소 디코딩해도 긴 변이 size 이상 남는 가장 큰 배율의 플래그 (원본이 작으면 원본 디코딩) """
+    dims = jpeg_size(src_path)
+    if dims is None:
+        return cv2.IMREAD_COLOR
+    long_side = max(dims)
+    for factor, flag in _REDUCED_FLAGS:
+        if long_side // factor >= size:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+class ThumbnailCache:
+    """
+    [썸네일 캐시] 원본 결과 이미지로 썸네일을 한 번만 만들어 디스크에 보관합니다.
+    - 키: 원본 경로 + 수정시각 + 크기 (원본이 바뀌면 자동으로 새로 생성)
+    - 용량 한도를 넘으면 가장 오래 조회되지 않은 파일부터 지웁니다. (LRU)
+    """
+    def __init__(self, cache_dir=THUMB_DIR, max_bytes=THUMB_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.is_file()
+        )
+
+    def _key(self, src_path, size):
+        st = os.stat(src_path)
+        raw = f"{os.path.abspath(src_path)}|{st.st_mtime_ns}|{st.st_size}|{size}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, src_path, size=THUMB_DEFAULT_SIZE):
+        """ 썸네일 파일 경로를 반환합니다. (없으면 생성, 원본이 없으면 None) """
+        if not src_path or not os.path.exists(src_path):
+            return None
+
+        thumb_path = os.path.join(self.cache_dir, f"{self._key(src_path, size)}.jpg")
+        if os.path.exists(thumb_path):
+            os.utime(thumb_path, None)  # LRU 갱신용 (조회 시각 기록)
+            return thumb_path
+
+        # 원본이 썸네일보다 훨씬 크면 JPEG 축소 디코딩으로 바로 읽어 디코딩 비용을 줄입니다.
+        img = cv2.imread(src_path, thumb_decode_flag(src_path, size))
+        if img is None:
+            return None
+        h, w = img.shape[:2]
+        scale = size / max(h, w)
+        if scale < 1.0:
+            img = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+        ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), THUMB_QUALITY])
+        if not ok:
+            return None
+
+        # 임시 파일에 쓰고 rename -> 동시에 같은 썸네일을 요청해도 깨진 파일을 읽지 않음
+        tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buf)
+
+        with self.lock:
+            # 같은 썸네일을 동시에 만든 경우 먼저 넣은 쪽만 용량에 더함 (덮어쓰기는 크기 그대로)
+            added = not os.path.exists(thumb_path)
+            os.replace(tmp_path, thumb_path)
+            if added:
+                self.total_bytes += len(buf)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return thumb_path
+
+    def _evict(self):
+        """ 용량 한도의 90%까지 오래된 썸네일부터 삭제 (lock 안에서 호출) """
+        entries = [e for e in os.scandir(self.cache_dir) if e.is_file() and e.name.endswith(".jpg")]
+        entries.sort(key=lambda e: e.stat().st_mtime)
+
+        total = sum(e.stat().st_size for e in entries)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+            except OSError:
+                pass
+        self.total_bytes = total
+
+
+thumbnail_cache = ThumbnailCache()
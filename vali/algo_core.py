@@ -2,6 +2,37 @@ import cv2
 import numpy as np
 from vali import config as cfg
 
+def resample_by_arclength(pts, n, start_idx=0):
+    """
+    [리샘플링] 닫힌 외곽선을 호 길이(arc length) 기준으로 n개 등간격 점으로 다시 뽑습니다.
+    start_idx 점에서 출발하므로 그 점은 결과의 0번에 정확히 그대로 남습니다.
+    """
+    pts = np.roll(np.asarray(pts, dtype=np.float64).reshape(-1, 2), -start_idx, axis=0)
+    closed = np.vstack([pts, pts[:1]])
+
+    # 누적 호 길이 (0 ~ 전체 둘레)
+    seg = np.sqrt(np.sum(np.diff(closed, axis=0)**2, axis=1))
+    cum = np.concatenate(([0.0], np.cumsum(seg)))
+    if cum[-1] == 0: return pts[:1].repeat(n, axis=0)
+
+    targets = np.linspace(0, cum[-1], n, endpoint=False)
+    x = np.interp(targets, cum, closed[:, 0])
+    y = np.interp(targets, cum, closed[:, 1])
+    return np.column_stack((x, y))
+
+def polygon_edge_distances(pts, poly):
+    """
+    [거리 계산] 점들(N x 2)과 닫힌 다각형 변 사이의 최단 거리를 한 번에 구합니다.
+    abs(cv2.pointPolygonTest(poly, 점, True))와 같은 값을 점마다 파이썬 반복 없이 계산합니다.
+    """
+    pts = np.asarray(pts, dtype=np.float64).reshape(-1, 1, 2)
+    a = np.asarray(poly, dtype=np.float64).reshape(-1, 2)
+    ab = np.roll(a, -1, axis=0) - a                        # 변 벡터 (마지막 점 -> 첫 점까지)
+    ap = pts - a                                           # (N, 변 개수, 2)
+    t = np.clip(np.sum(ap * ab, axis=2) / np.maximum(np.sum(ab * ab, axis=1), 1e-12), 0.0, 1.0)
+    diff = ap - t[..., None] * ab                          # 각 변 위 가장 가까운 점까지
+    return np.sqrt(np.min(np.sum(diff * diff, axis=2), axis=1))
+
 class NutInspector:
     def __init__(self):
         """
@@ -97,10 +128,23 @@ class NutInspector:
         peri = cv2.arcLength(largest_cnt, True)
         approx = cv2.approxPolyDP(largest_cnt, cfg.APPROX_EPSILON * peri, True)
         
+        # 9. (옵션) 고정 개수 리샘플링
+        # 점 개수가 제품마다 달라지면 이후 단계(각도 탐색, 정렬, 저장, 그래프)의 비용도 들쭉날쭉합니다.
+        # 중심에서 가장 먼 점(각도 탐색 기준점)을 출발점으로 삼아 그대로 보존하고,
+        # 원본 좌표는 approx_full에 남겨 최종 판정 때 최대 편차를 원본 해상도로 다시 찾습니다.
+        approx_full = None
+        n = cfg.CONTOUR_RESAMPLE_N
+        if n and len(approx) > n:
+            pts = approx.reshape(-1, 2)
+            far_idx = int(np.argmax((pts[:, 0] - cx)**2 + (pts[:, 1] - cy)**2))
+            approx_full = approx
+            approx = resample_by_arclength(pts, n, far_idx).reshape(-1, 1, 2)
+        
         return {
             "mask": mask,         # 구멍 찾기용 원본 마스크
             "cnt": largest_cnt,   # 너트 덩어리
-            "approx": approx,     # 수천 개의 정밀 좌표 점
+            "approx": approx,     # 수천 개의 정밀 좌표 점 (리샘플링 시 N개)
+            "approx_full": approx_full, # 리샘플링 전 원본 좌표 (리샘플링 안 하면 None)
             "center": (cx, cy),   # 중심점
             "area": cv2.contourArea(largest_cnt) # 면적
         }
@@ -159,6 +203,20 @@ class NutInspector:
                 
         return best_angle
 
+    def _find_worst_point(self, approx, cx, cy, cos_v, sin_v):
+        """
+        [내부 함수] 원본 해상도 외곽선에서 템플릿과 가장 많이 벗어난 점(이미지 좌표)을 찾습니다.
+        점마다 pointPolygonTest를 부르지 않고 배열 연산 한 번으로 계산합니다. (점이 수천 개여도 파이썬 반복 없음)
+        """
+        pts = approx.reshape(-1, 2).astype(np.float64)
+        px = pts[:, 0] - cx
+        py = cy - pts[:, 1]
+        nx = px * cos_v - py * sin_v
+        ny = px * sin_v + py * cos_v
+        
+        dists = polygon_edge_distances(np.column_stack((nx, -ny)), self.template_pts)
+        return pts[int(np.argmax(dists))]
+
     def inspect(self, data, angle):
         """
         [3차 분석] 찾은 각도로 최종 회전시키고, 진짜 불량인지 판정합니다.
@@ -171,6 +229,14 @@ class NutInspector:
         cos_v, sin_v = np.cos(rad), np.sin(rad)
         
         pts = approx.reshape(-1, 2)
+        
+        # (리샘플링 사용 시) 원본 해상도에서 최대 편차 점을 찾아 가장 가까운 리샘플 점과 바꿉니다.
+        # 점 개수는 N개 그대로, 최악 오차(max_dist)는 원본과 똑같이 유지됩니다.
+        if data.get('approx_full') is not None:
+            worst = self._find_worst_point(data['approx_full'], cx, cy, cos_v, sin_v)
+            pts = pts.astype(np.float64)   # 원본(data['approx'])은 건드리지 않도록 복사
+            pts[int(np.argmin(np.sum((pts - worst)**2, axis=1)))] = worst
+        
         pts_c = pts - [cx, cy]; pts_c[:, 1] *= -1
         
         rot_x, rot_y = [], []
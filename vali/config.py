@@ -19,6 +19,9 @@ RESULT_DIR_TOP = "/static/results_top"
 RESULT_DIR_BOTTOM = "/static/results_bottom"
 # 검사 기준
 APPROX_EPSILON = 0.0001
+# 외곽선 고정 점 개수 (호 길이 기준 등간격 리샘플링, 0이면 사용 안 함 = 원본 해상도)
+# 최대 편차 점은 원본 해상도에서 먼저 찾아 결과에 그대로 포함시킵니다.
+CONTOUR_RESAMPLE_N = 0
 CROP_MARGIN = 20
 AI_CONF_THRES = 0.5
 # [단위 변환] 1mm당 픽셀 수 (실측값)
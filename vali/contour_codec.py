@@ -0,0 +1,96 @@
+import json
+import struct
+import numpy as np
+
+# =========================================================
+# [외곽선 바이너리 포맷]
+# measured_contour를 JSON float 리스트 대신 BLOB으로 압축 저장합니다.
+#
+# 헤더 (8바이트): magic "CT" | version(1) | encoding(1) | 점 개수(uint32)
+#   - ENC_F32 : float32 x[n] + float32 y[n]
+#   - ENC_Q16 : scale(uint16) + 첫 점 int32 (x0, y0) + int16 델타 dx[n-1], dy[n-1]
+#               (좌표 * scale 을 정수로 양자화, 기본 1/64 px 해상도)
+# 델타가 int16 범위를 넘으면 자동으로 ENC_F32로 저장합니다.
+# =========================================================
+
+MAGIC = b"CT"
+VERSION = 1
+ENC_F32 = 1
+ENC_Q16 = 2
+
+QUANT_SCALE = 64  # 1px을 64등분 (최대 양자화 오차 1/128 px)
+
+_HEADER = struct.Struct("<2sBBI")
+_Q16_HEADER = struct.Struct("<Hii")
+
+
+def encode_contour(x, y, quantize=True):
+    """ 외곽선 좌표(x, y)를 바이너리로 인코딩합니다. """
+    x = np.asarray(x, dtype=np.float64).ravel()
+    y = np.asarray(y, dtype=np.float64).ravel()
+    n = len(x)
+
+    if quantize and n > 0:
+        qx = np.rint(x * QUANT_SCALE).astype(np.int64)
+        qy = np.rint(y * QUANT_SCALE).astype(np.int64)
+        dx, dy = np.diff(qx), np.diff(qy)
+        lim = np.iinfo(np.int16)
+        in_range = (
+            abs(int(qx[0])) < 2**31 and abs(int(qy[0])) < 2**31
+            and (n == 1 or (dx.min() >= lim.min and dx.max() <= lim.max
+                            and dy.min() >= lim.min and dy.max() <= lim.max))
+        )
+        if in_range:
+            return b"".join((
+                _HEADER.pack(MAGIC, VERSION, ENC_Q16, n),
+                _Q16_HEADER.pack(QUANT_SCALE, int(qx[0]), int(qy[0])),
+                dx.astype("<i2").tobytes(),
+                dy.astype("<i2").tobytes(),
+            ))
+
+    return b"".join((
+        _HEADER.pack(MAGIC, VERSION, ENC_F32, n),
+        x.astype("<f4").tobytes(),
+        y.astype("<f4").tobytes(),
+    ))
+
+
+def decode_contour(blob):
+    """ 바이너리 BLOB을 (x, y) numpy 배열로 복원합니다. """
+    magic, version, enc, n = _HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"지원하지 않는 외곽선 포맷입니다 (magic={magic!r}, version={version})")
+
+    off = _HEADER.size
+    if enc == ENC_F32:
+        x = np.frombuffer(blob, dtype="<f4", count=n, offset=off)
+        y = np.frombuffer(blob, dtype="<f4", count=n, offset=off + 4 * n)
+        return x.astype(np.float64), y.astype(np.float64)
+
+    if enc == ENC_Q16:
+        if n == 0:
+            return np.zeros(0), np.zeros(0)
+        scale, x0, y0 = _Q16_HEADER.unpack_from(blob, off)
+        off += _Q16_HEADER.size
+        dx = np.frombuffer(blob, dtype="<i2", count=n - 1, offset=off)
+        dy = np.frombuffer(blob, dtype="<i2", count=n - 1, offset=off + 2 * (n - 1))
+        qx = np.concatenate(([x0], x0 + np.cumsum(dx, dtype=np.int64)))
+        qy = np.concatenate(([y0], y0 + np.cumsum(dy, dtype=np.int64)))
+        return qx / scale, qy / scale
+
+    raise ValueError(f"알 수 없는 외곽선 인코딩입니다 (encoding={enc})")
+
+
+def is_contour_blob(data):
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:2]) == MAGIC
+
+
+def contour_to_dict(blob):
+    """ BLOB -> 기존 JSON과 같은 {"x": [...], "y": [...]} 형태 """
+    x, y = decode_contour(blob)
+    return {"x": x.tolist(), "y": y.tolist()}
+
+
+def contour_to_json(blob):
+    return json.dumps(contour_to_dict(blob))
+
@@ -3,6 +3,238 @@ import json
 import datetime
 import numpy as np
 from vali import config as cfg
+from vali.contour_codec import encode_contour, contour_to_dict
+
+# 불량 유형별 플래그 컬럼 (fail_reason "xyz" 코드의 각 자리와 1:1 대응)
+DEFECT_COLUMNS = ("defect_shape", "defect_hole", "defect_rust")
+
+# 이미 마이그레이션을 끝낸 DB 경로 (프로세스당 1회만 실행)
+_MIGRATED_DBS = set()
+
+# 한 번만 하면 되는 데이터 변환 단계 (PRAGMA user_version에 기록, 이미 지난 단계는 재시작 때 건너뜀)
+SCHEMA_VERSION_CONTOURS = 1   # 외곽선 JSON -> contour_blob 변환 + VACUUM
+
+def migrate_schema(db_path):
+    """
+    [스키마 마이그레이션] Measurements 테이블을 최신 구조로 맞춥니다.
+
+    1. 테이블이 없으면 새로 만듭니다.
+    2. 불량 유형 컬럼(defect_shape/hole/rust)이 없으면 추가하고,
+       기존 행은 fail_reason 코드("101" 등)를 분해해서 채워 넣습니다.
+    3. 유형별 + 날짜 범위 조회용 복합 인덱스를 만듭니다.
+    """
+    if db_path in _MIGRATED_DBS:
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # 컬럼 설명:
+    # measured_center: 중심점 좌표, measured_contour: 외곽선 점들 (JSON 문자열)
+    # area_size: 면적(mm2), hole_offset: 편심량(mm)
+    # defect_*: 불량 유형 플래그 (0/1, fail_reason 코드의 각 자리)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Measurements (
+            measure_id INTEGER PRIMARY KEY AUTOINCREMENT, 
+            measured_at TEXT DEFAULT CURRENT_TIMESTAMP, 
+            inspection_result TEXT, 
+            cam1_path TEXT, 
+            cam2_path TEXT, 
+            measured_center TEXT, 
+            product_id INTEGER, 
+            measured_contour TEXT, 
+            model_score REAL, 
+            hole_offset REAL, 
+            area_size REAL, 
+            fail_reason TEXT, 
+            defect_shape INTEGER DEFAULT 0, 
+            defect_hole INTEGER DEFAULT 0, 
+            defect_rust INTEGER DEFAULT 0, 
+            contour_blob BLOB, 
+            trace_blob BLOB, 
+            part_id TEXT, 
+            station_id TEXT, 
+            FOREIGN KEY (product_id) REFERENCES Product (product_id)
+        )
+    ''')
+
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(Measurements)")}
+    added = [col for col in DEFECT_COLUMNS if col not in existing]
+    for col in added:
+        cursor.execute(f"ALTER TABLE Measurements ADD COLUMN {col} INTEGER DEFAULT 0")
+
+    if added:
+        # 기존 행 백필: "xyz" 코드의 1/2/3번째 자리를 각각의 컬럼으로 분해
+        cursor.execute('''
+            UPDATE Measurements SET
+                defect_shape = (substr(fail_reason, 1, 1) = '1'),
+                defect_hole  = (substr(fail_reason, 2, 1) = '1'),
+                defect_rust  = (substr(fail_reason, 3, 1) = '1')
+            WHERE fail_reason GLOB '[01][01][01]'
+        ''')
+        print(f"🛠️ [DB] 불량 유형 컬럼 추가 및 백필 완료: {', '.join(added)}")
+
+    if "contour_blob" not in existing:
+        cursor.execute("ALTER TABLE Measurements ADD COLUMN contour_blob BLOB")
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION_CONTOURS:
+        # 전체 테이블 LIKE 검색이라 DB마다 한 번만 (변환이 끝나면 버전 기록)
+        converted = _migrate_contours(conn)
+        if converted:
+            # 비운 JSON 공간을 파일에서 실제로 반납 (트랜잭션 밖에서만 가능)
+            conn.commit()
+            conn.execute("VACUUM")
+            print("🛠️ [DB] VACUUM 완료 (외곽선 변환으로 빈 공간 반납)")
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION_CONTOURS}")
+    if "trace_blob" not in existing:
+        # 검사 타임라인 (vali/trace_codec.py 포맷, 타임라인 기록 이전 행은 NULL)
+        cursor.execute("ALTER TABLE Measurements ADD COLUMN trace_blob BLOB")
+    if "part_id" not in existing:
+        # 제품 상관 ID (InspectionManager의 part_id, 핫 폴더는 파일 이름의 제품 키) - 이전 행은 NULL
+        cursor.execute("ALTER TABLE Measurements ADD COLUMN part_id TEXT")
+    if "station_id" not in existing:
+        # 검사한 라인(스테이션) ID - 여러 라인을 한 서버에서 돌릴 때 결과 구분용, 이전 행은 NULL
+        cursor.execute("ALTER TABLE Measurements ADD COLUMN station_id TEXT")
+
+    # 유형 플래그 + 날짜 복합 인덱스 (유형별 기간 조회가 인덱스만으로 끝나도록)
+    for col in DEFECT_COLUMNS:
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_Measurements_{col}_date ON Measurements ({col}, measured_at)"
+        )
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_Measurements_measured_at ON Measurements (measured_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_Measurements_part_id ON Measurements (part_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_Measurements_station_date ON Measurements (station_id, measured_at)")
+
+    conn.commit()
+    conn.close()
+    _MIGRATED_DBS.add(db_path)
+
+def migrate_reinspection_schema(db_path):
+    """
+    [재검사 테이블] 과거 검사를 새 기준/모델로 다시 판정한 결과 (vali/reinspect.py)
+    원본 Measurements는 건드리지 않고, 실행(run_id)마다 따로 쌓아 버전별로 비교합니다.
+    - ReinspectionRuns: 실행 1건 = 기준값/모델 스냅샷 + 대상 조건 + 진행 상황
+    - Reinspections   : (run_id, measure_id)당 1행 -> 이미 있는 행은 이어하기에서 건너뜀 (체크포인트)
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ReinspectionRuns (
+            run_id TEXT PRIMARY KEY, 
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP, 
+            finished_at TEXT, 
+            status TEXT, 
+            config_json TEXT, 
+            filter_json TEXT, 
+            total INTEGER DEFAULT 0, 
+            done INTEGER DEFAULT 0, 
+            changed INTEGER DEFAULT 0, 
+            failed INTEGER DEFAULT 0, 
+            elapsed_sec REAL DEFAULT 0
+        )
+    ''')
+    # measure_id는 Measurements 참조 (원본 행이 지워져도 재검사 기록은 남도록 FK 제약은 두지 않음)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Reinspections (
+            run_id TEXT NOT NULL, 
+            measure_id INTEGER NOT NULL, 
+            inspected_at TEXT, 
+            image_source TEXT, 
+            inspection_result TEXT, 
+            fail_reason TEXT, 
+            defect_shape INTEGER DEFAULT 0, 
+            defect_hole INTEGER DEFAULT 0, 
+            defect_rust INTEGER DEFAULT 0, 
+            area_size REAL, 
+            hole_offset REAL, 
+            model_score REAL, 
+            contour_blob BLOB, 
+            original_result TEXT, 
+            original_reason TEXT, 
+            changed INTEGER DEFAULT 0, 
+            error TEXT, 
+            elapsed_ms REAL, 
+            PRIMARY KEY (run_id, measure_id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_Reinspections_run_changed ON Reinspections (run_id, changed)")
+    conn.commit()
+    conn.close()
+
+def _migrate_contours(conn, batch_size=500):
+    """
+    [외곽선 마이그레이션] JSON 문자열(measured_contour)로 저장된 기존 외곽선을
+    바이너리(contour_blob)로 변환하고 JSON 컬럼은 비웁니다. (배치 단위 처리)
+    """
+    cursor = conn.cursor()
+    converted = 0
+    while True:
+        rows = cursor.execute('''
+            SELECT measure_id, measured_contour FROM Measurements
+            WHERE contour_blob IS NULL AND measured_contour LIKE '{"x"%'
+            LIMIT ?
+        ''', (batch_size,)).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for mid, text in rows:
+            try:
+                contour = json.loads(text)
+                blob = encode_contour(contour.get('x', []), contour.get('y', []))
+            except Exception:
+                blob = b""  # 깨진 JSON은 빈 BLOB으로 표시하고 원본은 남겨둡니다.
+                updates.append((blob, text, mid))
+                continue
+            updates.append((blob, None, mid))
+
+        cursor.executemany(
+            "UPDATE Measurements SET contour_blob = ?, measured_contour = ? WHERE measure_id = ?",
+            updates
+        )
+        conn.commit()
+        converted += len(rows)
+
+    if converted:
+        print(f"🛠️ [DB] 외곽선 {converted}건을 바이너리로 변환했습니다.")
+    return converted
+
+def save_trace(db_path, measure_id, blob):
+    """
+    [검사 타임라인 저장] 검사 결과 행에 단계별 구간 트리(trace_blob)를 붙입니다.
+    (DB 저장 단계 자체도 타임라인에 넣기 위해 INSERT가 끝난 뒤 따로 기록)
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("UPDATE Measurements SET trace_blob = ? WHERE measure_id = ?", (blob, measure_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def make_fail_code(cv_data, ai_top, ai_bot):
+    """
+    [불량 코드] 검사 결과 -> 3자리 코드 "xyz" (x: 외곽선 형상, y: 구멍 편심, z: 녹, 1 = 불량)
+    (검사 저장과 재검사가 같은 규칙을 쓰도록 분리)
+    """
+    # 기본값은 "0" (정상)으로 둡니다.
+    code_shape = "0"  # 첫째 자리: 외곽선 형상
+    code_hole = "0"   # 둘째 자리: 구멍 편심
+    code_rust = "0"   # 셋째 자리: 녹(Rust)
+
+    # 1. CV 분석 결과가 있을 때만 형상/구멍 불량을 판단합니다.
+    if cv_data:
+        if cv_data['shape']['res'] == "FAIL": 
+            code_shape = "1"
+        if cv_data['hole']['res'] == "FAIL": 
+            code_hole = "1"
+        
+    # 2. AI 분석 결과 (녹) 판단
+    # 상부(Top)나 하부(Bot) 중 하나라도 NG가 나오면 불량 처리
+    if ai_top['res'] == "NG" or ai_bot['res'] == "NG":
+        code_rust = "1"
+        
+    # 3. 코드 조합 (예: 외곽선불량+녹불량 = "101")
+    return f"{code_shape}{code_hole}{code_rust}"
 
 class DataManager:
     def __init__(self):
@@ -12,13 +244,15 @@ class DataManager:
         """
         self.db_path = cfg.DB_FILE
         print(f"📂 DB 연결 주소: {self.db_path}")
+        migrate_schema(self.db_path)
 
-    def save_result(self, cv_data, ai_top, ai_bot, area, cam1_path, cam2_path, timestamp):
+    def save_result(self, cv_data, ai_top, ai_bot, area, cam1_path, cam2_path, timestamp, part_id=None, station_id=None):
         """
         [핵심 기능] 검사 결과를 DB에 저장합니다.
         
         1. 불량 사유를 '101' 같은 3자리 코드로 변환합니다.
         2. 픽셀(px) 단위가 아닌 밀리미터(mm) 단위 값을 저장합니다.
+        3. part_id: 제품 상관 ID, station_id: 검사한 라인 ID (판정 행 -> 라인의 제품 연결용, 없으면 NULL)
         """
         
         # (1) 제품 기준값(공차 등)을 DB 'Product' 테이블에 업데이트 (필수 절차)
@@ -28,50 +262,16 @@ class DataManager:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # (2) Measurements 테이블이 없으면 새로 만듭니다. (안전 장치)
-        # 컬럼 설명:
-        # measured_center: 중심점 좌표, measured_contour: 외곽선 점들 (JSON 문자열)
-        # area_size: 면적(mm2), hole_offset: 편심량(mm)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Measurements (
-                measure_id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                measured_at TEXT DEFAULT CURRENT_TIMESTAMP, 
-                inspection_result TEXT, 
-                cam1_path TEXT, 
-                cam2_path TEXT, 
-                measured_center TEXT, 
-                product_id INTEGER, 
-                measured_contour TEXT, 
-                model_score REAL, 
-                hole_offset REAL, 
-                area_size REAL, 
-                fail_reason TEXT, 
-                FOREIGN KEY (product_id) REFERENCES Product (product_id)
-            )
-        ''')
-        
-        # --- [Logic 1] 3자리 불량 코드 생성 ("000" ~ "111") ---
-        # 기본값은 "0" (정상)으로 둡니다.
-        code_shape = "0"  # 첫째 자리: 외곽선 형상
-        code_hole = "0"   # 둘째 자리: 구멍 편심
-        code_rust = "0"   # 셋째 자리: 녹(Rust)
+        # (2) Measurements 테이블 생성/컬럼 추가는 migrate_schema()에서 처리합니다.
 
-        # 1. CV 분석 결과가 있을 때만 형상/구멍 불량을 판단합니다.
-        if cv_data:
-            if cv_data['shape']['res'] == "FAIL": 
-                code_shape = "1"
-            if cv_data['hole']['res'] == "FAIL": 
-                code_hole = "1"
-            
-        # 2. AI 분석 결과 (녹) 판단
-        # 상부(Top)나 하부(Bot) 중 하나라도 NG가 나오면 불량 처리
-        if ai_top['res'] == "NG" or ai_bot['res'] == "NG":
-            code_rust = "1"
-            
-        # 3. 코드 조합 (예: 외곽선불량+녹불량 = "101")
-        fail_code = f"{code_shape}{code_hole}{code_rust}"
+        # --- [Logic 1] 3자리 불량 코드 생성 ("000" ~ "111", make_fail_code 참고) ---
+        fail_code = make_fail_code(cv_data, ai_top, ai_bot)
+        code_shape, code_hole, code_rust = fail_code
         
-        # 4. 최종 판정 (코드에 '1'이 하나라도 있으면 NG)
+        # 유형별 플래그 (인덱스 조회용 정수 컬럼)
+        defect_flags = (int(code_shape), int(code_hole), int(code_rust))
+
+        # 최종 판정 (코드에 '1'이 하나라도 있으면 NG)
         final_res = "NG" if "1" in fail_code else "OK"
         reason = fail_code  # DB에 저장될 사유는 이제 "101" 같은 코드입니다.
 
@@ -82,12 +282,9 @@ class DataManager:
             real_area = cv_data.get('area_mm2', 0.0)      # 면적 (mm^2)
             real_offset = cv_data['hole'].get('offset_mm', 0.0) # 편심량 (mm)
             
-            # 외곽선 좌표 (그래프 그리기용이므로 픽셀 단위 유지) -> JSON 문자열로 변환
-            # tolist(): numpy 배열은 DB에 바로 저장이 안 되어서 리스트로 바꿉니다.
-            contour_json = json.dumps({
-                "x": cv_data['shape']['x'].tolist(), 
-                "y": cv_data['shape']['y'].tolist()
-            })
+            # 외곽선 좌표 (그래프 그리기용이므로 픽셀 단위 유지) -> 바이너리(BLOB)로 압축
+            # (JSON float 리스트 대비 수 배 작음, 포맷은 contour_codec.py 참고)
+            contour_blob = encode_contour(cv_data['shape']['x'], cv_data['shape']['y'])
             
             # 중심점 및 기타 상세 정보 정리
             hole = cv_data['hole']
@@ -110,7 +307,7 @@ class DataManager:
             # 분석 실패 시 기본값(0)으로 채웁니다.
             real_area = 0.0
             real_offset = 0.0
-            contour_json = "{}"
+            contour_blob = None
             center_json = "{}"
 
         # AI 확신도 점수 (상/하부 중 더 높은 점수를 저장)
@@ -121,13 +318,17 @@ class DataManager:
         cursor.execute('''
             INSERT INTO Measurements 
             (product_id, measured_at, inspection_result, fail_reason, cam1_path, cam2_path,
-             measured_center, measured_contour, area_size, hole_offset, model_score)
-            VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+             measured_center, contour_blob, area_size, hole_offset, model_score,
+             defect_shape, defect_hole, defect_rust, part_id, station_id)
+            VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (timestamp, final_res, reason, cam1_path, cam2_path, 
-              center_json, contour_json, 
+              center_json, contour_blob, 
               float(real_area),    # [저장] 면적 (mm^2)
               float(real_offset),  # [저장] 편심량 (mm)
-              float(final_ai_score)))
+              float(final_ai_score),
+              *defect_flags,       # [저장] 불량 유형 플래그 (shape, hole, rust)
+              part_id,             # [저장] 제품 상관 ID
+              station_id))         # [저장] 라인(스테이션) ID
         
         # 저장된 행의 ID(번호)를 가져옵니다. (로그 출력용)
         lid = cursor.lastrowid
@@ -174,9 +375,12 @@ class DataManager:
         
         if not row: return None
         
-        # JSON 문자열로 저장된 좌표들을 다시 파이썬 리스트/딕셔너리로 복구
+        # 외곽선: 바이너리(contour_blob)가 있으면 디코딩, 없으면 예전 JSON 문자열을 복구
         try:
-            contour = json.loads(row['measured_contour']) if row['measured_contour'] else {}
+            if row['contour_blob']:
+                contour = contour_to_dict(row['contour_blob'])
+            else:
+                contour = json.loads(row['measured_contour']) if row['measured_contour'] else {}
             center = json.loads(row['measured_center']) if row['measured_center'] else {}
         except:
             contour, center = {}, {}
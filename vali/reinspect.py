@@ -0,0 +1,479 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import signal
+import hashlib
+import argparse
+import datetime
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import cv2
+
+from vali import config as cfg
+from vali.db_manager import migrate_schema, migrate_reinspection_schema, make_fail_code
+from vali.contour_codec import encode_contour
+
+# =========================================================
+# [일괄 재검사] 과거 검사(Measurements)를 현재 기준값/모델로 다시 판정합니다.
+# - 대상: 기간(--from/--to), 제품(--product), 원래 판정(--result)으로 선택
+# - 프로세스 풀(--workers)에서 CV + AI를 다시 실행 (워커마다 YOLO/보정 데이터를 한 번만 로드)
+# - 결과는 Reinspections 테이블에 실행(run_id)별로 저장 -> 원본 행/결과 이미지는 건드리지 않음
+# - 체크포인트: 결과를 주기적으로 커밋하므로 중단(Ctrl+C, 서버 재부팅) 후 --resume RUN_ID로 이어서 실행
+# - 보고: 진행 중 처리량/남은 시간, 끝나면 판정 변화(OK->NG 등)와 단계별 평균 시간
+#
+# 이미지: 서버 촬영 원본(static/temp_inspection/ins_*.jpg)이 남아 있으면 원본으로 (보정부터 다시),
+#         없으면 DB의 결과 이미지(cam1_path/cam2_path, 이미 렌즈 보정됨)로 검사합니다.
+#         결과 이미지에는 예전 녹 검출 박스가 그려져 있을 수 있어 AI 재판정은 원본 쪽이 정확합니다.
+#
+# 사용 예:
+#   python -m vali.reinspect --from 2026-07-01 --to 2026-10-01 --workers 8
+#   python -m vali.reinspect --from 2026-10-01 --set TOL_HOLE=4.0 --set LIMIT_FAIL=5.5
+#   python -m vali.reinspect --resume 20261019_013000_ab12cd34
+#   python -m vali.reinspect --report 20261019_013000_ab12cd34
+# =========================================================
+
+REPO_DIR = os.path.dirname(cfg.BASE_DIR)
+RAW_DIR = os.path.join(REPO_DIR, "static", "temp_inspection")   # 서버 촬영 원본 폴더 (main.py TEMP_DIR)
+CHUNK_SIZE = 8          # 워커에 한 번에 넘기는 제품 수 (프로세스 간 전달 비용 분산)
+PAGE_SIZE = 1000        # DB에서 한 번에 읽는 대상 수 (수개월치도 메모리 일정)
+COMMIT_EVERY = 5.0      # 결과 커밋(체크포인트) 간격(초)
+REPORT_EVERY = 10.0     # 진행 상황 출력 간격(초)
+
+# --set 으로 바꿀 수 있는 판정 기준 (실행 기록에 스냅샷으로 남음)
+TUNABLE = ("TOL_SHAPE", "TOL_HOLE", "LIMIT_WARNING", "LIMIT_FAIL", "AI_CONF_THRES",
+           "PIXELS_PER_MM", "APPROX_EPSILON", "CROP_MARGIN", "CONTOUR_RESAMPLE_N")
+
+_RESULT_NAME = re.compile(r"^result_(.+)_\d{14}(\.\w+)$")
+
+
+def resolve_path(path):
+    """ DB에 저장된 이미지 경로 -> 실제 파일 경로 (도커 기준 "/static/..." / 상대경로도 저장소 기준으로 찾아봄) """
+    if not path:
+        return None
+    path = path.replace("\\", "/")   # 윈도우에서 기록된 경로 (results_top\result_...jpg)
+    relative = path.lstrip("/")
+    for candidate in (path, os.path.join(REPO_DIR, relative), os.path.join(REPO_DIR, "static", relative)):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def raw_capture_for(result_path, raw_dir=RAW_DIR):
+    """ 결과 이미지 이름(result_{원본이름}_{시각}.jpg) -> 촬영 원본 경로 (없으면 None) """
+    if not result_path:
+        return None
+    m = _RESULT_NAME.match(os.path.basename(result_path.replace("\\", "/")))
+    if not m:
+        return None
+    raw = os.path.join(raw_dir, m.group(1) + m.group(2))
+    return raw if os.path.exists(raw) else None
+
+
+def pick_images(cam1_path, cam2_path, source="auto", raw_dir=RAW_DIR):
+    """ -> (top 경로, bottom 경로, "raw" | "result", 보정 완료 여부) 또는 None (이미지 없음) """
+    if source in ("auto", "raw"):
+        top = raw_capture_for(cam1_path, raw_dir)
+        if top:
+            return top, raw_capture_for(cam2_path, raw_dir), "raw", False
+        if source == "raw":
+            return None
+    top = resolve_path(cam1_path)
+    if not top:
+        return None
+    return top, resolve_path(cam2_path), "result", True
+
+
+def _model_fingerprint():
+    """ AI 모델 파일 식별값 (같은 이름으로 새 모델을 배포해도 실행 기록에서 구분되도록) """
+    if not os.path.exists(cfg.AI_MODEL_PATH):
+        return None
+    sha = hashlib.sha1()
+    with open(cfg.AI_MODEL_PATH, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return {"path": cfg.AI_MODEL_PATH, "sha1": sha.hexdigest(), "size": os.path.getsize(cfg.AI_MODEL_PATH)}
+
+
+def config_snapshot(overrides):
+    values = {name: overrides.get(name, getattr(cfg, name)) for name in TUNABLE}
+    return {"values": values, "overrides": overrides, "model": _model_fingerprint()}
+
+
+def parse_overrides(items):
+    overrides = {}
+    for item in items or []:
+        name, _, value = item.partition("=")
+        name = name.strip().upper()
+        if name not in TUNABLE:
+            raise ValueError(f"바꿀 수 없는 설정: {name} (가능: {', '.join(TUNABLE)})")
+        current = getattr(cfg, name)
+        overrides[name] = int(value) if isinstance(current, int) and not isinstance(current, bool) else float(value)
+    return overrides
+
+
+# --- [워커 프로세스] ---
+
+_worker = {}
+
+
+def _init_worker(overrides):
+    """ 워커 시작 시 1번: 기준값 적용 + 검사기/YOLO 로드 (제품마다 다시 만들지 않음) """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # Ctrl+C는 메인 프로세스가 받아서 정리
+    for name, value in overrides.items():
+        setattr(cfg, name, value)
+    cv2.setNumThreads(1)   # 병렬은 프로세스 단위로 (워커 안에서 스레드까지 늘리면 코어를 서로 뺏음)
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    from vali.algo_core import NutInspector
+    from vali.ai_inspector import AIInspector
+    from vali.run_inspection import analyze_pair, StageTimeline
+    _worker.update(cv=NutInspector(), ai=AIInspector(), analyze=analyze_pair, timeline=StageTimeline)
+
+
+def _reinspect_one(item):
+    measure_id, top, bot, source, calibrated, original_result, original_reason = item
+    timeline = _worker["timeline"]()
+    started = time.perf_counter()
+    row = {"measure_id": measure_id, "image_source": source, "original_result": original_result,
+           "original_reason": original_reason, "timings": {}}
+    try:
+        analyzed = _worker["analyze"](_worker["cv"], _worker["ai"], top, bot, timeline, calibrated)
+    except Exception as e:
+        analyzed = None
+        row["error"] = f"예외: {e}"
+    row["elapsed_ms"] = (time.perf_counter() - started) * 1000
+    row["timings"] = timeline.timings
+    if analyzed is None:
+        row.setdefault("error", "분석 실패 (이미지 읽기 실패 또는 너트 미검출)")
+        return row
+
+    res_cv, ai_top, ai_bot = analyzed["res_cv"], analyzed["ai_top"], analyzed["ai_bot"]
+    code = make_fail_code(res_cv, ai_top, ai_bot)
+    row.update(
+        inspection_result="NG" if "1" in code else "OK",
+        fail_reason=code,
+        defects=tuple(int(c) for c in code),
+        area_size=float(res_cv.get("area_mm2", 0.0)),
+        hole_offset=float(res_cv["hole"].get("offset_mm", 0.0)),
+        model_score=float(max(ai_top["conf"], ai_bot["conf"])),
+        contour_blob=encode_contour(res_cv["shape"]["x"], res_cv["shape"]["y"]),
+    )
+    return row
+
+
+def _reinspect_chunk(items):
+    return [_reinspect_one(item) for item in items]
+
+
+# --- [DB] ---
+
+def _where(filters):
+    clauses, params = [], []
+    if filters.get("from"):
+        clauses.append("measured_at >= ?")
+        params.append(filters["from"])
+    if filters.get("to"):
+        clauses.append("measured_at < ?")
+        params.append(filters["to"])
+    if filters.get("product") is not None:
+        clauses.append("product_id = ?")
+        params.append(filters["product"])
+    if filters.get("result"):
+        clauses.append("inspection_result = ?")
+        params.append(filters["result"])
+    return clauses, params
+
+
+def count_targets(conn, filters):
+    clauses, params = _where(filters)
+    sql = "SELECT COUNT(*) FROM Measurements" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+    total = conn.execute(sql, params).fetchone()[0]
+    return min(total, filters["limit"]) if filters.get("limit") else total
+
+
+def iter_targets(conn, filters):
+    """ 대상 행을 measure_id 순으로 페이지 단위 조회 (키셋 페이지네이션 -> 뒤쪽 페이지도 느려지지 않음) """
+    clauses, params = _where(filters)
+    limit = filters.get("limit") or 0
+    last_id, yielded = 0, 0
+    while True:
+        sql = ("SELECT measure_id, cam1_path, cam2_path, inspection_result, fail_reason FROM Measurements "
+               "WHERE " + " AND ".join(clauses + ["measure_id > ?"]) + " ORDER BY measure_id LIMIT ?")
+        rows = conn.execute(sql, params + [last_id, PAGE_SIZE]).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield row
+            yielded += 1
+            if limit and yielded >= limit:
+                return
+        last_id = rows[-1][0]
+
+
+def _done_ids(conn, run_id, first_id, last_id):
+    rows = conn.execute("SELECT measure_id FROM Reinspections WHERE run_id = ? AND measure_id BETWEEN ? AND ?",
+                        (run_id, first_id, last_id))
+    return {r[0] for r in rows}
+
+
+def store_rows(conn, run_id, rows):
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    values = []
+    for r in rows:
+        failed = "error" in r
+        changed = 0 if failed else int(r["inspection_result"] != r["original_result"]
+                                       or r["fail_reason"] != r["original_reason"])
+        shape, hole, rust = r.get("defects", (0, 0, 0))
+        values.append((run_id, r["measure_id"], now, r["image_source"], r.get("inspection_result"),
+                       r.get("fail_reason"), shape, hole, rust, r.get("area_size"), r.get("hole_offset"),
+                       r.get("model_score"), r.get("contour_blob"), r["original_result"], r["original_reason"],
+                       changed, r.get("error"), round(r["elapsed_ms"], 2)))
+    conn.executemany('''
+        INSERT OR REPLACE INTO Reinspections
+        (run_id, measure_id, inspected_at, image_source, inspection_result, fail_reason,
+         defect_shape, defect_hole, defect_rust, area_size, hole_offset, model_score, contour_blob,
+         original_result, original_reason, changed, error, elapsed_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', values)
+
+
+def update_run(conn, run_id, status, elapsed, finished=False):
+    done, changed, failed = conn.execute('''
+        SELECT COUNT(*), COALESCE(SUM(changed), 0), COALESCE(SUM(error IS NOT NULL), 0)
+        FROM Reinspections WHERE run_id = ?
+    ''', (run_id,)).fetchone()
+    conn.execute('''
+        UPDATE ReinspectionRuns SET status = ?, done = ?, changed = ?, failed = ?, elapsed_sec = ?,
+            finished_at = CASE WHEN ? THEN datetime('now', 'localtime') ELSE finished_at END
+        WHERE run_id = ?
+    ''', (status, done, changed, failed, round(elapsed, 1), int(finished), run_id))
+    conn.commit()
+
+
+def summarize_run(conn, run_id):
+    run = conn.execute("SELECT * FROM ReinspectionRuns WHERE run_id = ?", (run_id,)).fetchone()
+    if run is None:
+        return None
+    cols = [d[0] for d in conn.execute("SELECT * FROM ReinspectionRuns LIMIT 0").description]
+    summary = dict(zip(cols, run))
+    summary["config"] = json.loads(summary.pop("config_json") or "{}")
+    summary["filter"] = json.loads(summary.pop("filter_json") or "{}")
+    summary["transitions"] = {
+        f"{orig}->{new}": n for orig, new, n in conn.execute('''
+            SELECT original_result, COALESCE(inspection_result, 'ERROR'), COUNT(*) FROM Reinspections
+            WHERE run_id = ? GROUP BY 1, 2 ORDER BY 3 DESC
+        ''', (run_id,))
+    }
+    summary["reasons"] = {
+        f"{orig}->{new}": n for orig, new, n in conn.execute('''
+            SELECT original_reason, fail_reason, COUNT(*) FROM Reinspections
+            WHERE run_id = ? AND changed = 1 GROUP BY 1, 2 ORDER BY 3 DESC LIMIT 20
+        ''', (run_id,))
+    }
+    summary["image_source"] = dict(conn.execute(
+        "SELECT image_source, COUNT(*) FROM Reinspections WHERE run_id = ? GROUP BY 1", (run_id,)).fetchall())
+    if summary["elapsed_sec"]:
+        summary["parts_per_hour"] = round(summary["done"] / summary["elapsed_sec"] * 3600, 1)
+    return summary
+
+
+def print_summary(summary):
+    print(f"\n📋 [재검사] {summary['run_id']} ({summary['status']})")
+    print(f"   대상 {summary['total']}건 | 완료 {summary['done']} | 판정 변경 {summary['changed']} | 실패 {summary['failed']}")
+    if summary.get("parts_per_hour"):
+        print(f"   처리량 {summary['parts_per_hour']} 개/시간 (누적 {summary['elapsed_sec']:.0f}s)")
+    print(f"   이미지: {summary['image_source']}")
+    print(f"   판정 변화: {summary['transitions']}")
+    if summary["reasons"]:
+        print(f"   코드 변화(상위): {summary['reasons']}")
+    print(f"   기준값: {summary['config'].get('values')}")
+
+
+# --- [실행] ---
+
+def run(conn, run_id, filters, overrides, args, resumed_elapsed=0.0):
+    total = count_targets(conn, filters)
+    conn.execute("UPDATE ReinspectionRuns SET total = ?, status = 'running' WHERE run_id = ?", (total, run_id))
+    conn.commit()
+    already = conn.execute("SELECT COUNT(*) FROM Reinspections WHERE run_id = ?", (run_id,)).fetchone()[0]
+    print(f"🔁 [재검사] {run_id}: 대상 {total}건 (완료 {already}건 건너뜀), 워커 {args.workers}개")
+
+    started = time.monotonic()
+    last_commit = last_report = started
+    processed, missing, stage_sum = 0, 0, Counter()
+    buffer, pending = [], set()
+    status = "done"
+
+    def collect(futures):
+        nonlocal processed
+        for future in futures:
+            rows = future.result()
+            buffer.extend(rows)
+            processed += len(rows)
+            for row in rows:
+                stage_sum.update(row["timings"])
+
+    def checkpoint(state="running", finished=False):
+        nonlocal last_commit
+        if buffer:
+            store_rows(conn, run_id, buffer)
+            buffer.clear()
+        update_run(conn, run_id, state, resumed_elapsed + time.monotonic() - started, finished)
+        last_commit = time.monotonic()
+
+    def report():
+        nonlocal last_report
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, total - already - processed - missing)
+        eta = remaining / rate if rate > 0 else 0.0
+        print(f"   ⏳ {already + processed + missing}/{total} | {rate:.1f} 개/s ({rate * 3600:.0f} 개/시간) "
+              f"| 남은 시간 {datetime.timedelta(seconds=int(eta))}")
+        last_report = time.monotonic()
+
+    pool = ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(overrides,))
+    try:
+        chunk, page = [], []
+
+        def submit(items):
+            pending.add(pool.submit(_reinspect_chunk, items))
+
+        def flush_page():
+            """ 페이지 단위로 이미 끝난 행을 거르고 작업 제출 """
+            nonlocal missing
+            done = _done_ids(conn, run_id, page[0][0], page[-1][0])
+            for measure_id, cam1, cam2, result, reason in page:
+                if measure_id in done:
+                    continue
+                picked = pick_images(cam1, cam2, args.source, args.raw_dir)
+                if picked is None:
+                    missing += 1
+                    buffer.append({"measure_id": measure_id, "image_source": None, "original_result": result,
+                                   "original_reason": reason, "error": "이미지 없음", "elapsed_ms": 0.0})
+                    continue
+                chunk.append((measure_id, *picked, result, reason))
+                if len(chunk) >= CHUNK_SIZE:
+                    # 제출 대기 작업 수 제한 (워커당 2묶음) -> 대상이 수백만 건이어도 메모리 일정
+                    while len(pending) >= args.workers * 2:
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        pending.difference_update(finished)
+                        collect(finished)
+                        if time.monotonic() - last_commit >= COMMIT_EVERY:
+                            checkpoint()
+                        if time.monotonic() - last_report >= REPORT_EVERY:
+                            report()
+                    submit(list(chunk))
+                    chunk.clear()
+            page.clear()
+
+        for row in iter_targets(conn, filters):
+            page.append(row)
+            if len(page) >= PAGE_SIZE:
+                flush_page()
+        if page:
+            flush_page()
+        if chunk:
+            submit(list(chunk))
+
+        while pending:
+            finished, _ = wait(pending, timeout=REPORT_EVERY, return_when=FIRST_COMPLETED)
+            pending.difference_update(finished)
+            collect(finished)
+            if time.monotonic() - last_commit >= COMMIT_EVERY:
+                checkpoint()
+            if time.monotonic() - last_report >= REPORT_EVERY:
+                report()
+    except KeyboardInterrupt:
+        status = "interrupted"
+        print(f"\n⏸ [재검사] 중단 - 끝난 결과까지 저장합니다. 이어하기: python -m vali.reinspect --resume {run_id}")
+        for future in pending:
+            future.cancel()
+        done_futures = [f for f in pending if f.done() and not f.cancelled() and f.exception() is None]
+        collect(done_futures)
+    finally:
+        pool.shutdown(wait=status == "done", cancel_futures=True)
+
+    checkpoint(status, finished=status == "done")
+    elapsed = time.monotonic() - started
+    if processed:
+        print(f"\n⏱️ [재검사] 이번 실행 {processed}건 / {elapsed:.1f}s = {processed / elapsed:.2f} 개/s "
+              f"(이미지 {processed * 2 / elapsed:.1f} 장/s, 워커 {args.workers}개)")
+        stages = ", ".join(f"{name} {seconds / processed * 1000:.1f}ms" for name, seconds in stage_sum.most_common())
+        print(f"   단계별 평균: {stages}")
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="과거 검사 일괄 재판정 (결과는 Reinspections 테이블에 실행별로 저장)")
+    parser.add_argument("--from", dest="date_from", help="시작 일시 (포함, 예: 2026-07-01 또는 '2026-07-01 08:00:00')")
+    parser.add_argument("--to", dest="date_to", help="끝 일시 (미포함)")
+    parser.add_argument("--product", type=int, help="제품 ID (Measurements.product_id)")
+    parser.add_argument("--result", choices=("OK", "NG"), help="원래 판정이 이것인 검사만")
+    parser.add_argument("--limit", type=int, default=0, help="최대 대상 수 (0 = 전체)")
+    parser.add_argument("--set", action="append", metavar="NAME=VALUE", help=f"판정 기준 임시 변경 ({', '.join(TUNABLE)})")
+    parser.add_argument("--source", choices=("auto", "raw", "result"), default="auto",
+                        help="검사 이미지: auto = 촬영 원본 우선, 없으면 결과 이미지")
+    parser.add_argument("--raw-dir", default=RAW_DIR, help="촬영 원본 폴더")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="프로세스 수")
+    parser.add_argument("--run-id", help="실행 ID (기본: 시각 + 기준값 해시)")
+    parser.add_argument("--resume", metavar="RUN_ID", help="중단된 실행 이어하기 (대상 조건/기준값은 그 실행 기록을 따름)")
+    parser.add_argument("--report", metavar="RUN_ID", help="실행 결과 요약만 출력")
+    parser.add_argument("--db", default=cfg.DB_FILE, help="DB 파일 경로")
+    args = parser.parse_args(argv)
+
+    migrate_schema(args.db)
+    migrate_reinspection_schema(args.db)
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.report:
+            summary = summarize_run(conn, args.report)
+            if summary is None:
+                parser.error(f"실행 기록이 없습니다: {args.report}")
+            print_summary(summary)
+            return 0
+
+        resumed_elapsed = 0.0
+        if args.resume:
+            row = conn.execute("SELECT config_json, filter_json, elapsed_sec, status FROM ReinspectionRuns WHERE run_id = ?",
+                               (args.resume,)).fetchone()
+            if row is None:
+                parser.error(f"실행 기록이 없습니다: {args.resume}")
+            snapshot, filters, resumed_elapsed = json.loads(row[0]), json.loads(row[1]), row[2] or 0.0
+            run_id, overrides = args.resume, snapshot.get("overrides", {})
+            current = config_snapshot(overrides)
+            if current != snapshot:
+                print("⚠️ [재검사] 실행 시작 이후 config.py 기준값 또는 AI 모델이 바뀌었습니다. "
+                      "같은 실행 안에서 판정 기준이 섞입니다.")
+        else:
+            try:
+                overrides = parse_overrides(args.set)
+            except ValueError as e:
+                parser.error(str(e))
+            filters = {"from": args.date_from, "to": args.date_to, "product": args.product,
+                       "result": args.result, "limit": args.limit}
+            snapshot = config_snapshot(overrides)
+            digest = hashlib.sha1(json.dumps(snapshot, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+            run_id = args.run_id or f"{datetime.datetime.now():%Y%m%d_%H%M%S}_{digest}"
+            try:
+                conn.execute("INSERT INTO ReinspectionRuns (run_id, status, config_json, filter_json) VALUES (?, ?, ?, ?)",
+                             (run_id, "created", json.dumps(snapshot, ensure_ascii=False), json.dumps(filters)))
+                conn.commit()
+            except sqlite3.IntegrityError:
+                parser.error(f"이미 있는 실행 ID입니다: {run_id} (이어하려면 --resume)")
+
+        status = run(conn, run_id, filters, overrides, args, resumed_elapsed)
+        print_summary(summarize_run(conn, run_id))
+        return 0 if status == "done" else 130
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
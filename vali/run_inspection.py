@@ -1,8 +1,11 @@
 import sys
 import os
 import cv2
+import time
 import numpy as np
 import datetime
+import threading
+from contextlib import contextmanager
 from vali import config as cfg
 from .algo_core import NutInspector
 from .ai_inspector import AIInspector
@@ -52,49 +55,65 @@ def draw_and_save(img, filename, save_folder, cv_data, ai_data, text, timestamp_
         print(f"   ❌ 이미지 저장 실패: {e}")
         return ""
 
-def run_algorithm(top_path, bot_path):
+class StageTimeline:
     """
-    [핵심 함수] 사진 2장을 받아 검사 -> 저장
-    Return: 1 (성공), 0 (실패)
+    검사 단계별 소요 시간 기록
+    - timings: {단계 이름: 소요 시간(초)} (같은 이름은 합산)
+    - spans  : [(이름, 부모 번호, 시작 오프셋(초), 길이(초))] 검사 시작 기준, 중첩 단계는 부모 번호로 연결
+               (포맷/저장은 vali/trace_codec.py)
     """
-    print(f"\n>>> [System] 알고리즘 시작: Top={top_path}, Bot={bot_path}")
-    now = datetime.datetime.now()
-    timestamp_file = now.strftime("%Y%m%d%H%M%S")      # 파일명용 (예: 20251102120000)
-    timestamp_db = now.strftime("%Y-%m-%d %H:%M:%S")    # DB용 (예: 2025-11-02 12:00:00
-    # 0. 파일 존재 여부 확인
-    if not os.path.exists(top_path):
-        print(f"❌ 실패: Top 사진이 없습니다 -> {top_path}")
-        return 0
-    
-    # 1. 초기화
-    try:
-        inspector = NutInspector()
-        ai_inspector = AIInspector()
-        db_mgr = DataManager()
-    except Exception as e:
-        print(f"❌ 초기화 오류: {e}")
-        return 0
-    now = datetime.datetime.now()
-    timestamp_file = now.strftime("%Y%m%d%H%M%S")    # 파일명용 (20251102...)
-    timestamp_db = now.strftime("%Y-%m-%d %H:%M:%S")  # DB용 (2025-11-02...)
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.timings = {}
+        self.spans = []
+        self._stack = []
 
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        idx = len(self.spans)
+        self.spans.append((name, self._stack[-1] if self._stack else None, started - self.t0, 0.0))
+        self._stack.append(idx)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stack.pop()
+            self.spans[idx] = self.spans[idx][:3] + (elapsed,)
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+def analyze_pair(inspector, ai_inspector, top_path, bot_path, timeline, calibrated=False):
+    """
+    [판정 계산] 사진 2장 -> CV + AI 결과 (결과 이미지 저장/DB 기록 없음, inspect_pair와 재검사가 같이 사용)
+    calibrated=True: Top이 이미 렌즈 보정된 이미지(결과 이미지)라 보정을 건너뜀
+    Return: {"img_top_raw", "img_top_calib", "img_bot_raw", "data_cv", "res_cv", "ai_top", "ai_bot"}, None (실패)
+    """
     # ==========================================
     # [Step 1] Top 이미지 처리
     # ==========================================
-    img_top_raw = cv2.imread(top_path)
-    if img_top_raw is None: return 0
+    with timeline.stage("load_top"):
+        img_top_raw = cv2.imread(top_path)
+    if img_top_raw is None: return None
     
     # A. AI 검사
-    res_ai_top = ai_inspector.inspect(img_top_raw, "Top")
+    with timeline.stage("ai_top"):
+        res_ai_top = ai_inspector.inspect(img_top_raw, "Top")
 
     # B. CV 검사
-    img_top_calib = inspector.load_and_calibrate(top_path)
-    data_cv = inspector.analyze(img_top_calib)
+    if calibrated:
+        img_top_calib = img_top_raw   # 이미 보정된 결과 이미지 (재검사용)
+    else:
+        with timeline.stage("calibrate"):
+            img_top_calib = inspector.load_and_calibrate(top_path)
+    with timeline.stage("analyze"):
+        data_cv = inspector.analyze(img_top_calib)
     
     res_cv = None
     if data_cv:
-        angle = inspector.find_best_angle(data_cv)
-        res_cv = inspector.inspect(data_cv, angle)
+        with timeline.stage("find_best_angle"):
+            angle = inspector.find_best_angle(data_cv)
+        with timeline.stage("inspect"):
+            res_cv = inspector.inspect(data_cv, angle)
         
         # (!!!) [중요 수정] 데이터 상호 교환 (KeyError 방지)
         # 1. 그림 그릴 때 필요함: 1차 데이터(data_cv)에 구멍 정보(hole) 추가
@@ -105,7 +124,7 @@ def run_algorithm(top_path, bot_path):
         
     else:
         print("   ❌ CV 분석 실패 (너트 미검출)")
-        return 0 
+        return None 
 
     # ==========================================
     # [Step 2] Bottom 이미지 처리
@@ -118,11 +137,73 @@ def run_algorithm(top_path, bot_path):
     # (!!!) [수정 후] 'score'를 'conf'로 바꿔주세요! (AI 모듈과 이름 통일)
     res_ai_bot = {"found": False, "boxes": [], "conf": 0.0, "res": "No Image"}
     
-    if os.path.exists(bot_path):
-        img_bot_raw = cv2.imread(bot_path)
-        if img_bot_raw is not None:
-            res_ai_bot = ai_inspector.inspect(img_bot_raw, "Bottom")
+    if bot_path and os.path.exists(bot_path):
+        with timeline.stage("ai_bottom"):
+            img_bot_raw = cv2.imread(bot_path)
+            if img_bot_raw is not None:
+                res_ai_bot = ai_inspector.inspect(img_bot_raw, "Bottom")
+    
+    return {"img_top_raw": img_top_raw, "img_top_calib": img_top_calib, "img_bot_raw": img_bot_raw,
+            "data_cv": data_cv, "res_cv": res_cv, "ai_top": res_ai_top, "ai_bot": res_ai_bot}
+
+# 검사 실행기 스레드마다 1번만 만드는 검사기 (vali/reinspect.py의 _init_worker와 같은 방식)
+# -> 제품마다 템플릿/캘리브레이션/YOLO를 다시 읽거나 DB 스키마를 다시 확인하지 않음
+_worker = threading.local()
+
+def _worker_instances(timeline):
+    """ 이 스레드의 (NutInspector, AIInspector, DataManager) - 스레드에서 처음 검사할 때만 생성 """
+    instances = getattr(_worker, "instances", None)
+    if instances is None:
+        with timeline.stage("init_cv"):
+            inspector = NutInspector()
+        with timeline.stage("load_yolo"):
+            ai_inspector = AIInspector()
+        with timeline.stage("init_db"):
+            db_mgr = DataManager()
+        instances = _worker.instances = (inspector, ai_inspector, db_mgr)
+    return instances
+
+def run_algorithm(top_path, bot_path):
+    """
+    [핵심 함수] 사진 2장을 받아 검사 -> 저장
+    Return: 1 (성공), 0 (실패)
+    """
+    return 1 if inspect_pair(top_path, bot_path) else 0
+
+def inspect_pair(top_path, bot_path, part_id=None, station_id=None):
+    """
+    [검사 본체] run_algorithm과 같지만 판정 결과를 돌려줍니다.
+    part_id / station_id: 제품 상관 ID / 검사한 라인 ID (Measurements.part_id / station_id로 저장)
+    Return: {"measure_id", "fail_code", "result", "timings", "spans"} (성공), None (실패)
+            timings = {단계 이름: 소요 시간(초)}, spans = 단계 트리 (StageTimeline 참고)
+    """
+    timeline = StageTimeline()
+    print(f"\n>>> [System] 알고리즘 시작: Top={top_path}, Bot={bot_path}")
+    now = datetime.datetime.now()
+    timestamp_file = now.strftime("%Y%m%d%H%M%S")      # 파일명용 (예: 20251102120000)
+    timestamp_db = now.strftime("%Y-%m-%d %H:%M:%S")    # DB용 (예: 2025-11-02 12:00:00
+    # 0. 파일 존재 여부 확인
+    if not os.path.exists(top_path):
+        print(f"❌ 실패: Top 사진이 없습니다 -> {top_path}")
+        return None
     
+    # 1. 초기화 (스레드에서 처음 검사할 때만 실제로 생성)
+    try:
+        with timeline.stage("init"):
+            inspector, ai_inspector, db_mgr = _worker_instances(timeline)
+    except Exception as e:
+        print(f"❌ 초기화 오류: {e}")
+        return None
+    now = datetime.datetime.now()
+    timestamp_file = now.strftime("%Y%m%d%H%M%S")    # 파일명용 (20251102...)
+    timestamp_db = now.strftime("%Y-%m-%d %H:%M:%S")  # DB용 (2025-11-02...)
+
+    analyzed = analyze_pair(inspector, ai_inspector, top_path, bot_path, timeline)
+    if analyzed is None: return None
+    img_top_raw, img_top_calib, img_bot_raw = analyzed["img_top_raw"], analyzed["img_top_calib"], analyzed["img_bot_raw"]
+    data_cv, res_cv = analyzed["data_cv"], analyzed["res_cv"]
+    res_ai_top, res_ai_bot = analyzed["ai_top"], analyzed["ai_bot"]
+
     # ==========================================
     # [Step 3] 결과 이미지 생성 및 저장
     # ==========================================
@@ -130,32 +211,35 @@ def run_algorithm(top_path, bot_path):
     if res_cv and (res_cv['shape']['res'] == "FAIL" or res_cv['hole']['res'] == "FAIL"): temp_text = "NG"
 
     # Top 저장 (data_cv에는 이제 hole 정보가 들어있으므로 에러 안 남)
-    top_proc_path = draw_and_save(
-        img_top_calib if img_top_calib is not None else img_top_raw, 
-        os.path.basename(top_path), 
-        cfg.RESULT_DIR_TOP, # results_top 폴더
-        data_cv, 
-        res_ai_top, 
-        temp_text,
-        timestamp_file # (!!!) 시간 전달
-    )
-    
-    # Bottom 저장
-    bot_proc_path = ""
-    if img_bot_raw is not None:
-        bot_proc_path = draw_and_save(
-            img_bot_raw, 
-            os.path.basename(bot_path), 
-            cfg.RESULT_DIR_BOTTOM, # results_bottom 폴더
-            None, 
-            res_ai_bot, 
-            "",
-            timestamp_file # (!!!) 시간 전달
-        )
+    with timeline.stage("save_images"):
+        with timeline.stage("save_result_top"):
+            top_proc_path = draw_and_save(
+                img_top_calib if img_top_calib is not None else img_top_raw, 
+                os.path.basename(top_path), 
+                cfg.RESULT_DIR_TOP, # results_top 폴더
+                data_cv, 
+                res_ai_top, 
+                temp_text,
+                timestamp_file # (!!!) 시간 전달
+            )
+        
+        # Bottom 저장
+        bot_proc_path = ""
+        if img_bot_raw is not None:
+            with timeline.stage("save_result_bottom"):
+                bot_proc_path = draw_and_save(
+                    img_bot_raw, 
+                    os.path.basename(bot_path), 
+                    cfg.RESULT_DIR_BOTTOM, # results_bottom 폴더
+                    None, 
+                    res_ai_bot, 
+                    "",
+                    timestamp_file # (!!!) 시간 전달
+                )
 
     if not top_proc_path:
         print("❌ 결과 이미지 저장 실패")
-        return 0
+        return None
 
     # ==========================================
     # [Step 4] DB 저장
@@ -164,12 +248,15 @@ def run_algorithm(top_path, bot_path):
     
     try:
         # res_cv에는 이제 center 정보가 들어있으므로 에러 안 남
-        sid, txt = db_mgr.save_result(res_cv, res_ai_top, res_ai_bot, area, top_proc_path, bot_proc_path,timestamp_db)
+        with timeline.stage("db_insert"):
+            sid, txt = db_mgr.save_result(res_cv, res_ai_top, res_ai_bot, area, top_proc_path, bot_proc_path,timestamp_db,
+                                          part_id=part_id, station_id=station_id)
         print(f"✅ DB 저장 완료! (ID: {sid}) | 결과: {txt}")
-        return 1  # 성공!
+        return {"measure_id": sid, "fail_code": txt, "result": "NG" if "1" in txt else "OK",
+                "timings": timeline.timings, "spans": timeline.spans}  # 성공!
     except Exception as e:
         print(f"❌ DB 저장 실패: {e}")
-        return 0  # 실패!
+        return None  # 실패!
 
 
 # =========================================================
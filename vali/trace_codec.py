@@ -0,0 +1,91 @@
+import struct
+
+# =========================================================
+# [검사 타임라인 바이너리 포맷]
+# 검사 1건의 단계별 구간(span) 트리를 Measurements.trace_blob에 압축 저장합니다.
+#
+# 헤더 (6바이트): magic "TR" | version(1) | 이름 개수(uint8) | 구간 개수(uint16)
+# 이름 테이블   : [길이(uint8) + UTF-8 이름] * 이름 개수
+# 구간          : 이름 번호(uint8) | 부모 번호(uint8, 255=최상위) | 시작(uint32) | 길이(uint32)
+#                 (시작 = 검사 시작(CHECK) 기준 오프셋, 단위 마이크로초 -> 최대 약 71분)
+# 구간은 부모가 항상 자식보다 앞에 오는 순서(전위 순회)로 저장합니다.
+# =========================================================
+
+MAGIC = b"TR"
+VERSION = 1
+NO_PARENT = 255
+MAX_SPANS = 254
+
+_HEADER = struct.Struct("<2sBBH")
+_SPAN = struct.Struct("<BBII")
+_US_MAX = 2**32 - 1
+
+
+def _us(seconds):
+    return min(_US_MAX, max(0, int(round(seconds * 1_000_000))))
+
+
+def encode_trace(spans):
+    """
+    구간 리스트 -> 바이너리
+    spans: [(이름, 부모 번호 또는 None, 시작 오프셋(초), 길이(초)), ...]
+    """
+    spans = spans[:MAX_SPANS]
+    names = []
+    index = {}
+    body = []
+    for name, parent, start, duration in spans:
+        if name not in index:
+            index[name] = len(names)
+            names.append(name)
+        body.append(_SPAN.pack(index[name], NO_PARENT if parent is None else parent, _us(start), _us(duration)))
+
+    table = []
+    for name in names:
+        raw = name.encode("utf-8")[:255]
+        table.append(bytes((len(raw),)) + raw)
+    return b"".join([_HEADER.pack(MAGIC, VERSION, len(names), len(spans))] + table + body)
+
+
+def decode_trace(blob):
+    """ 바이너리 -> [(이름, 부모 번호 또는 None, 시작(초), 길이(초)), ...] """
+    magic, version, n_names, n_spans = _HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"지원하지 않는 타임라인 포맷입니다 (magic={magic!r}, version={version})")
+
+    off = _HEADER.size
+    names = []
+    for _ in range(n_names):
+        size = blob[off]
+        names.append(bytes(blob[off + 1:off + 1 + size]).decode("utf-8"))
+        off += 1 + size
+
+    spans = []
+    for _ in range(n_spans):
+        name_idx, parent, start, duration = _SPAN.unpack_from(blob, off)
+        off += _SPAN.size
+        spans.append((names[name_idx], None if parent == NO_PARENT else parent, start / 1e6, duration / 1e6))
+    return spans
+
+
+def trace_to_tree(blob):
+    """ BLOB -> 중첩 dict 트리 (API 응답용, 단위 ms) """
+    nodes = []
+    roots = []
+    for name, parent, start, duration in decode_trace(blob):
+        node = {"name": name, "start_ms": round(start * 1000, 3),
+                "duration_ms": round(duration * 1000, 3), "children": []}
+        nodes.append(node)
+        if parent is None or parent >= len(nodes) - 1:
+            roots.append(node)
+        else:
+            nodes[parent]["children"].append(node)
+    return roots
+
+
+def stage_durations(blob):
+    """ BLOB -> {구간 이름: 길이(초)} (같은 이름이 여러 번 나오면 합산) """
+    totals = {}
+    for name, _, _, duration in decode_trace(blob):
+        totals[name] = totals.get(name, 0.0) + duration
+    return totals
@@ -0,0 +1,72 @@
+import os
+
+import cv2
+
+# =========================================================
+# [시청 화질 단계(tier)] /api/view/{camera_index}?tier=low
+# - 같은 tier를 보는 시청자들은 한 번 인코딩한 JPEG를 함께 받습니다.
+# - 아무도 보지 않는 tier는 인코딩하지 않습니다.
+# - scale은 카메라 원본 해상도 기준 배율
+# =========================================================
+
+VIEW_TIERS = {
+    "full":     {"scale": 1.0,  "quality": 80},   # 원본 해상도 (이 tier 시청자가 있을 때만 원본 디코딩)
+    "high":     {"scale": 0.5,  "quality": 75},
+    "standard": {"scale": 0.5,  "quality": 60},   # 기본값
+    "low":      {"scale": 0.25, "quality": 45},   # 대시보드 썸네일 타일용
+}
+DEFAULT_TIER = "standard"
+TIER_NAMES = tuple(VIEW_TIERS.keys())
+
+# JPEG 축소 디코딩 플래그 (DCT 단계에서 줄여서 디코딩 -> 원본 디코딩 후 resize보다 훨씬 빠름)
+_DECODE_FLAGS = {
+    1.0: cv2.IMREAD_COLOR,
+    0.5: cv2.IMREAD_REDUCED_COLOR_2,
+    0.25: cv2.IMREAD_REDUCED_COLOR_4,
+    0.125: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def _preview_decode_scale(text):
+    """ 축소 디코딩이 지원하는 배율(1, 1/2, 1/4, 1/8)만 허용 (다른 값이면 오버레이 좌표 배율이 실제 디코딩과 어긋남) """
+    scale = float(text)
+    if scale not in _DECODE_FLAGS:
+        raise ValueError(f"PREVIEW_DECODE_SCALE={text} 은 지원하지 않는 배율입니다. (가능: 1, 0.5, 0.25, 0.125)")
+    return scale
+
+
+# 미리보기/AI 추론용 디코딩 배율 (YOLO가 어차피 입력 크기로 줄이므로 원본 디코딩 불필요)
+PREVIEW_DECODE_SCALE = _preview_decode_scale(os.getenv("PREVIEW_DECODE_SCALE", "0.5"))
+
+
+def decode_flag(scale):
+    return _DECODE_FLAGS[scale]
+
+
+def decode_scale_for(tiers):
+    """ 시청 중인 tier들에 필요한 디코딩 배율 (원본 tier 시청자가 없으면 축소 디코딩) """
+    needed = max([VIEW_TIERS[t]["scale"] for t in tiers] + [PREVIEW_DECODE_SCALE])
+    return 1.0 if needed > PREVIEW_DECODE_SCALE else PREVIEW_DECODE_SCALE
+
+
+def encode_tiers(img, tiers, source_scale):
+    """
+    img(디코딩 배율 source_scale인 프레임) -> {tier: JPEG 배열 (1차원 uint8)}
+    tier마다 딱 한 번만 인코딩합니다. 같은 해상도의 tier끼리는 축소 결과도 공유합니다.
+    """
+    resized = {}
+    encoded = {}
+    h, w = img.shape[:2]
+    for tier in tiers:
+        conf = VIEW_TIERS[tier]
+        factor = conf["scale"] / source_scale
+        if factor >= 1.0:
+            src = img   # 디코딩 해상도보다 키우지는 않음
+        else:
+            if factor not in resized:
+                size = (max(1, int(w * factor)), max(1, int(h * factor)))
+                resized[factor] = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+            src = resized[factor]
+        _, buffer = cv2.imencode('.jpg', src, [int(cv2.IMWRITE_JPEG_QUALITY), conf["quality"]])
+        encoded[tier] = buffer.reshape(-1)   # OpenCV 버전에 따라 (N, 1) 배열 -> 항상 1차원 (복사 없음)
+    return encoded
@@ -0,0 +1,217 @@
+import time
+import asyncio
+import itertools
+
+from metrics import REGISTRY
+from view_tiers import VIEW_TIERS
+
+# =========================================================
+# [시청자별 적응형 화질]
+# - 시청자마다 '최신 프레임 1장' 우편함 + 전송 태스크를 둡니다.
+#   전송이 밀리면 쌓지 않고 새 프레임으로 덮어쓰므로 지연이 누적되지 않습니다.
+#   (느린 시청자 1명이 같은 카메라의 다른 시청자/송출 루프를 붙잡지 않음)
+# - 전송 시간(처리량)과 지연(우편함에 들어와 보낼 수 있게 된 때 ~ 전송 완료)을 재서
+#   밀리면 화질 tier -> 프레임레이트 순으로 낮추고, 여유가 생기면 반대 순서로 올립니다.
+#   (서버 쪽 디코딩/추론/인코딩 시간, 카메라 시계 차이는 지연에 넣지 않음 -> 서버가 느려도
+#    네트워크가 멀쩡한 시청자의 화질을 낮추지 않음. 촬영 ~ 전송 완료는 frame_e2e_seconds로 따로 기록)
+# - 전송이 실패하면 세션을 닫힘으로 표시하고 웹소켓을 닫아 viewer_endpoint가 정리하게 합니다.
+# - 요청한 tier(?tier=)는 상한입니다. ?adaptive=0 이면 고정 tier/fps로 동작합니다.
+# =========================================================
+
+# 화질 순서 (낮음 -> 높음)
+TIER_ORDER = ("low", "standard", "high", "full")
+
+VIEWER_MAX_FPS = 30
+VIEWER_MIN_FPS = 2
+LAG_DEGRADE = 0.25        # 평균 지연이 이 값(초)을 넘으면 한 단계 낮춤
+LAG_RECOVER = 0.08        # 평균 지연이 이 값 미만으로 유지되면 한 단계 올림
+RECOVER_HOLD = 3.0        # 올리기 전에 여유 상태가 유지되어야 하는 시간(초)
+ADAPT_INTERVAL = 1.0      # 조정 판단 최소 간격(초)
+EWMA_ALPHA = 0.2
+
+_viewer_ids = itertools.count(1)
+
+
+class ViewerSession:
+    def __init__(self, websocket, camera_index, tier, adaptive=True, max_fps=VIEWER_MAX_FPS):
+        self.websocket = websocket
+        self.camera_index = camera_index
+        self.client_id = f"cam{camera_index}-v{next(_viewer_ids)}"
+        self.ceiling = tier                   # 요청한 최대 화질
+        self.tier = tier                      # 현재 화질
+        self.adaptive = adaptive
+        self.max_fps = max_fps
+        self.fps_limit = max_fps
+
+        self._pending = None                  # (data, 우편함에 넣은 시각, 촬영 시각 - 서버 시계 기준/없으면 None)
+        self._ready = asyncio.Event()
+        self._next_send = 0.0
+        self._task = None
+        self.closed = False                   # 전송 실패 (연결이 끊김, viewer_endpoint 정리 대기)
+
+        self.lag = 0.0                        # EWMA, 보낼 수 있게 된 때(우편함 도착/fps 간격) ~ 전송 완료(초)
+        self.throughput = 0.0                 # EWMA, bytes/s (전송 중 구간 기준)
+        self.frame_bytes = 0.0                # EWMA, 프레임 크기
+        self.sent = 0
+        self.dropped = 0
+        self._last_adapt = time.monotonic()
+        self._calm_since = None
+
+        labels = {"client": self.client_id, "camera": str(camera_index)}
+        self.m_lag = REGISTRY.gauge("viewer_lag_seconds", "시청자별 평균 전송 지연", **labels)
+        self.m_throughput = REGISTRY.gauge("viewer_throughput_bytes", "시청자별 측정 전송 처리량(bytes/s)", **labels)
+        self.m_tier = REGISTRY.gauge("viewer_tier_level", "시청자별 현재 화질 단계 (0=low ~ 3=full)", **labels)
+        self.m_fps = REGISTRY.gauge("viewer_fps_limit", "시청자별 프레임레이트 상한", **labels)
+        self.m_dropped = REGISTRY.counter("viewer_dropped_frames_total", "전송이 밀려 건너뛴 프레임 수", **labels)
+        self._metrics = (self.m_lag, self.m_throughput, self.m_tier, self.m_fps, self.m_dropped)
+        # 카메라별 촬영 ~ 전송 지연 (frame_protocol.SourceTracker와 공유, 세션 종료 후에도 유지)
+        self.m_e2e = REGISTRY.histogram("frame_e2e_seconds", "촬영 ~ 시청자 전송 완료 (최소 전송 시간 제외)",
+                                        camera=str(camera_index))
+        self.m_sent = REGISTRY.counter("viewer_frames_sent_total", "시청자에게 보낸 프레임 수 (카메라별 합계)",
+                                       camera=str(camera_index))
+        self._update_gauges()
+
+    # --- 송출 쪽 (이벤트 루프, 절대 기다리지 않음) ---
+    def offer(self, data, queued_at, capture_ts=None):
+        """ queued_at: 서버가 송출 큐에 넣은 시각 (지연/화질 조정 기준), capture_ts: 촬영 시각 (e2e 지표 전용) """
+        if self.closed:
+            return
+        if self._pending is not None:
+            self.dropped += 1
+            self.m_dropped.inc()
+        self._pending = (data, queued_at, capture_ts)
+        self._ready.set()
+
+    # --- 전송 태스크 ---
+    def start(self):
+        self._task = asyncio.create_task(self._send_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        for metric in self._metrics:
+            REGISTRY.remove(metric)
+
+    async def _send_loop(self):
+        while True:
+            await self._ready.wait()
+            # 프레임레이트 상한: 기다리는 동안 들어온 더 새 프레임을 보냄
+            delay = self._next_send - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._ready.clear()
+            if self._pending is None:
+                continue
+            data, queued_at, capture_ts = self._pending
+            self._pending = None
+            # fps 상한 때문에 기다린 시간은 지연에서 제외 (낮춘 fps가 다시 지연으로 잡히지 않도록)
+            ready_at = max(queued_at, self._next_send)
+
+            started = time.monotonic()
+            try:
+                await self.websocket.send_bytes(data)
+            except Exception as e:
+                await self._fail(e)
+                return
+            done = time.monotonic()
+            self._next_send = started + 1.0 / self.fps_limit
+            self._record(len(data), done - started, done - ready_at,
+                         None if capture_ts is None else done - capture_ts)
+            if self.adaptive:
+                self._adapt(done)
+
+    async def _fail(self, error):
+        """ 전송 실패 -> 더 받지 않고 웹소켓을 닫음 (receive가 끝나면서 viewer_endpoint가 disconnect 처리) """
+        self.closed = True
+        self._pending = None
+        print(f"⚠️ [View {self.client_id}] 전송 실패로 세션 종료: {error!r}")
+        try:
+            await self.websocket.close(code=1011)
+        except Exception:
+            pass
+
+    def _record(self, size, send_time, lag, e2e):
+        """ lag: 이 시청자 우편함 기준 지연 (화질 조정용), e2e: 촬영 ~ 전송 완료 (지표용) """
+        a = EWMA_ALPHA
+        self.sent += 1
+        self.m_sent.inc()
+        self.lag = lag if self.sent == 1 else (1 - a) * self.lag + a * lag
+        if e2e is not None:
+            self.m_e2e.observe(max(0.0, e2e))
+        self.frame_bytes = size if self.sent == 1 else (1 - a) * self.frame_bytes + a * size
+        if send_time > 0:
+            rate = size / send_time
+            self.throughput = rate if self.sent == 1 else (1 - a) * self.throughput + a * rate
+        self.m_lag.set(self.lag)
+        self.m_throughput.set(self.throughput)
+
+    def _tier_cost(self, tier):
+        conf = VIEW_TIERS[tier]
+        return conf["scale"] ** 2 * conf["quality"]
+
+    def _adapt(self, now):
+        if now - self._last_adapt < ADAPT_INTERVAL:
+            return
+
+        if self.lag > LAG_DEGRADE:
+            self._calm_since = None
+            self._last_adapt = now
+            level = TIER_ORDER.index(self.tier)
+            if level > 0:
+                self._set(tier=TIER_ORDER[level - 1])
+            elif self.fps_limit > VIEWER_MIN_FPS:
+                self._set(fps=max(VIEWER_MIN_FPS, self.fps_limit // 2))
+            return
+
+        if self.lag >= LAG_RECOVER:
+            self._calm_since = None
+            return
+        if self._calm_since is None:
+            self._calm_since = now
+            return
+        if now - self._calm_since < RECOVER_HOLD:
+            return
+
+        # 여유 상태 유지 -> 프레임레이트 먼저, 그다음 화질 (측정 처리량으로 감당 가능할 때만)
+        self._last_adapt = now
+        self._calm_since = now
+        if self.fps_limit < self.max_fps:
+            self._set(fps=min(self.max_fps, self.fps_limit * 2))
+            return
+        level = TIER_ORDER.index(self.tier)
+        if level < TIER_ORDER.index(self.ceiling):
+            nxt = TIER_ORDER[level + 1]
+            needed = self.frame_bytes * self._tier_cost(nxt) / self._tier_cost(self.tier) * self.fps_limit
+            if self.throughput == 0 or needed < self.throughput * 0.5:
+                self._set(tier=nxt)
+
+    def _set(self, tier=None, fps=None):
+        if tier is not None and tier != self.tier:
+            print(f"🎚️ [View {self.client_id}] 화질 {self.tier} -> {tier} (지연 {self.lag * 1000:.0f}ms)")
+            self.tier = tier
+            self._pending = None  # 다른 tier 프레임이 남아 있지 않도록
+        if fps is not None and fps != self.fps_limit:
+            print(f"🎚️ [View {self.client_id}] fps {self.fps_limit} -> {fps} (지연 {self.lag * 1000:.0f}ms)")
+            self.fps_limit = fps
+        self.lag = (LAG_DEGRADE + LAG_RECOVER) / 2 if self.lag > LAG_DEGRADE else self.lag  # 바뀐 설정으로 다시 측정
+        self._update_gauges()
+
+    def _update_gauges(self):
+        self.m_tier.set(TIER_ORDER.index(self.tier))
+        self.m_fps.set(self.fps_limit)
+
+    def stats(self):
+        return {
+            "client": self.client_id,
+            "camera": self.camera_index,
+            "tier": self.tier,
+            "ceiling": self.ceiling,
+            "adaptive": self.adaptive,
+            "fps_limit": self.fps_limit,
+            "lag_ms": round(self.lag * 1000, 1),
+            "throughput_kbps": round(self.throughput * 8 / 1000, 1),
+            "frame_kb": round(self.frame_bytes / 1024, 1),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "closed": self.closed,
+        }